@@ -0,0 +1,3 @@
+from myhumbleself import cli
+
+cli.main()
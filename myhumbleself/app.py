@@ -2,25 +2,47 @@ import argparse
 import logging
 import os
 import platform
+import signal
+import threading
 import time
 from pathlib import Path
-from statistics import mean
+from typing import TYPE_CHECKING
 
 # Hide warnings shown during search for cameras
 os.environ["OPENCV_LOG_LEVEL"] = "FATAL"
 
 import gi
-
-from myhumbleself import __version__, config, converters, video_handler
+import numpy as np
+
+# OpenCV is slow to import. Modules depending on it are imported in the background,
+# after the window is shown, see MyHumbleSelf.init_video_handler().
+from myhumbleself import (
+    __version__,
+    config,
+    governor,
+    latency,
+    metrics,
+    power,
+    profiling,
+    structures,
+    tracing,
+)
+
+if TYPE_CHECKING:
+    from myhumbleself import thumbnails, video_handler
 
 gi.require_version("Gdk", "4.0")
 gi.require_version("Gtk", "4.0")
 gi.require_version("Gio", "2.0")
 gi.require_version("GdkPixbuf", "2.0")
-from gi.repository import Gdk, GdkPixbuf, Gio, Gtk  # noqa: E402
+from gi.repository import Gdk, GdkPixbuf, Gio, GLib, Gtk  # noqa: E402
 
 logger = logging.getLogger(__name__)
 
+# Reference for the startup times. Close enough to the process start, as the imports
+# above are cheap.
+IMPORTED_AT = time.perf_counter()
+
 
 def init_logger(log_level: str = "WARNING") -> None:
     log_format = "%(asctime)s - %(levelname)-7s - %(name)s:%(lineno)d - %(message)s"
@@ -28,6 +50,28 @@ def init_logger(log_level: str = "WARNING") -> None:
     logging.basicConfig(format=log_format, datefmt=datefmt, level=log_level)
 
 
+def image_to_texture(image: np.ndarray) -> Gdk.Texture:
+    """Convert an RGBA image to a texture, which can be displayed by GTK.
+
+    Args:
+        image: RGBA image, as returned by VideoHandler.get_processed_frame().
+
+    Returns:
+        Texture containing a copy of the image data.
+    """
+    height, width, channels = image.shape
+    pixbuf = GdkPixbuf.Pixbuf.new_from_data(
+        image.tobytes(),
+        GdkPixbuf.Colorspace.RGB,
+        True,
+        8,
+        width,
+        height,
+        width * channels,
+    )
+    return Gdk.Texture.new_for_pixbuf(pixbuf)
+
+
 class MyHumbleSelf(Gtk.Application):
     def __init__(self, application_id: str, args: argparse.Namespace) -> None:
         super().__init__(application_id=application_id)
@@ -61,25 +105,172 @@ class MyHumbleSelf(Gtk.Application):
         self.up_button: Gtk.Button
         self.zoom_in_button: Gtk.Button
         self.zoom_out_button: Gtk.Button
+        self.spinner: Gtk.Spinner
+
+        # Created in the background, available once `self.ready` is True
+        self.video_handler: video_handler.VideoHandler
+        self.power_policy: power.PowerPolicy
+        self.thumbnails: thumbnails.ThumbnailCache[Gdk.Texture]
+        self.ready = False
+        # Seconds since import, until the window was shown & the first frame displayed
+        self.startup_times: dict[str, float] = {}
+
+        # Start profiling first, to also cover the threads started below
+        self.profile_seconds: float = args.profile or 30
+        self.profiler: profiling.Profiler | None = None
+        if args.profile or args.profile_memory:
+            self.profiler = profiling.Profiler(
+                output_dir=config.CONFIG_PATH,
+                cpu=args.profile is not None,
+                memory=args.profile_memory,
+            )
+            self.profiler.start()
 
         # Init values
         self.config = config.load()
-        self.fps: list[float] = [0]
-        self.fps_window = 50
         self.cam_item_prefix = "/dev/video"
+        self.camera_thumbnail_images: dict[int, Gtk.Image] = {}
+        self.thumbnail_refresh_id: int | None = None
         self.loglevel_debug = logger.getEffectiveLevel() == logging.DEBUG
         self.last_image_id = b""
-        self.video_handler = video_handler.VideoHandler(
-            cam_id=self.config["main"].getint("last_active_camera", 0),
+        self.last_upload = time.perf_counter()
+        self.metrics_file: Path | None = args.metrics_file
+        self.latency_selftest: float | None = args.latency_selftest
+        self.metrics = metrics.Registry(
+            enabled=bool(
+                args.metrics_file
+                or args.target_fps
+                or self.latency_selftest
+                or logger.getEffectiveLevel() <= logging.INFO
+            )
+        )
+
+        self.connect("activate", self.on_activate)
+        self.connect("shutdown", self.on_shutdown)
+        if self.metrics_file:
+            GLib.unix_signal_add(
+                GLib.PRIORITY_DEFAULT, signal.SIGUSR1, self.write_metrics
+            )
+
+        # Probing cameras, starting the capture and loading the detection model takes
+        # a while. Do it in parallel to building the window:
+        self.init_thread = threading.Thread(
+            target=self.init_video_handler, args=(args,), name="init", daemon=True
+        )
+        self.init_thread.start()
+
+    def init_video_handler(self, args: argparse.Namespace) -> None:
+        """Create the video handler. Runs in a background thread during startup.
+
+        Args:
+            args: Parsed command line arguments.
+        """
+        try:
+            handler = self._create_video_handler(args)
+        except Exception:
+            logger.exception("Failed to initialize the video handler.")
+            GLib.idle_add(self.quit)
+            return
+        self.video_handler = handler
+        self.power_policy = power.PowerPolicy(
+            handler,
+            release_after=args.release_camera_after,
+            metrics_registry=self.metrics,
+        )
+        self.init_thumbnails()
+        # GLib dispatches this after on_activate(), as the application activates
+        # before its main loop iterates.
+        GLib.idle_add(self.on_video_handler_ready)
+
+    def init_thumbnails(self) -> None:
+        """Start creating the thumbnails for the camera menu, from the probed frames."""
+        from myhumbleself import thumbnails
+
+        self.thumbnails = thumbnails.ThumbnailCache(
+            to_texture=image_to_texture,
+            on_update=lambda cam_id, texture: GLib.idle_add(
+                self.on_thumbnail_updated, cam_id, texture
+            ),
+        )
+        for cam_id, frame in self.video_handler.available_cameras.items():
+            self.thumbnails.request(cam_id, frame)
+
+    def _create_video_handler(
+        self, args: argparse.Namespace
+    ) -> "video_handler.VideoHandler":
+        from myhumbleself import camera, sinks, video_handler
+
+        # Created first, to fail before opening the camera, if the file is unsupported
+        recorder = (
+            sinks.Recorder(
+                args.record,
+                fps=args.record_fps,
+                drop_policy=structures.DropPolicy(args.record_policy),
+                metrics_registry=self.metrics,
+            )
+            if args.record
+            else None
+        )
+        handler = video_handler.VideoHandler(
+            cam_id=(
+                camera.DEMO_CAM_ID
+                if self.latency_selftest
+                else self.config["main"].getint("last_active_camera", 0)
+            ),
             shape_png_buffer=self._load_active_shape_png(),
             zoom_factor=self.config["main"].getfloat("zoom_factor", 1),
             offset_x=self.config["main"].getint("offset_x", 0),
             offset_y=self.config["main"].getint("offset_y", 0),
             follow_face=self.config["main"].getboolean("follow_face", True),
+            queue_size=args.queue_size,
+            drop_policy=structures.DropPolicy(args.drop_policy),
+            detect_in_process=args.detect_in_process,
+            quality_governor=(
+                governor.QualityGovernor(
+                    target_fps=args.target_fps, cpu_budget=args.cpu_budget
+                )
+                if args.target_fps
+                else None
+            ),
+            metrics_registry=self.metrics,
+            tracer=tracing.Tracer(path=args.trace),
+            stamp_frames=bool(self.latency_selftest),
+            device_dir=camera.DEVICE_DIR,
+            on_cameras_changed=lambda: GLib.idle_add(self.on_cameras_changed),
         )
+        if self.latency_selftest:
+            # Show the whole demo frame, so the stamped frame counter stays readable.
+            # The settings are not persisted.
+            handler.set_shape(self._load_active_shape_png("99-aspect-16-9.png"))
+            handler.set_view(zoom_factor=10, offset_x=0, offset_y=0)
+            handler.follow_face = False
+        handler.set_group_framing(args.group_framing)
+        for cam_id in args.inset:
+            handler.add_inset(
+                cam_id, shape_png_buffer=self._load_active_shape_png(args.inset_shape)
+            )
+        if recorder:
+            handler.add_sink(recorder)
+        return handler
 
-        self.connect("activate", self.on_activate)
-        self.connect("shutdown", self.on_shutdown)
+    def on_video_handler_ready(self) -> bool:
+        """Finish the UI parts depending on the video handler.
+
+        Returns:
+            False, to only be called once by GLib.idle_add().
+        """
+        self.camera_box = self.init_camera_box(self.video_handler.cam_id)
+        self.builder.get_object("camera_menu_button").get_popover().connect(
+            "show", self.on_camera_menu_shown
+        )
+        self.overlay.remove_overlay(self.spinner)
+        for widget in self.widgets_requiring_video_handler:
+            widget.set_sensitive(True)
+        self.ready = True
+        logger.info(
+            "Video handler ready after %.2fs.", time.perf_counter() - IMPORTED_AT
+        )
+        return False
 
     def on_activate(self, app: Gtk.Application) -> None:
         """Initialize window on application activation.
@@ -102,7 +293,6 @@ class MyHumbleSelf(Gtk.Application):
 
         self.shape_box = self.init_shape_box()
         self.follow_face_button = self.init_follow_face_button()
-        self.camera_box = self.init_camera_box()
         self.about_button = self.builder.get_object("about_button")
         self.about_button.connect("clicked", lambda _: self.show_about_dialog())
         self.debug_mode_button = self.builder.get_object("debug_mode_button")
@@ -139,9 +329,45 @@ class MyHumbleSelf(Gtk.Application):
         self.down_button = self.builder.get_object("down_button")
         self.down_button.connect("clicked", self.on_move_clicked, 0, 1)
 
+        self.init_placeholder()
         self.init_css()
 
+        motion_controller = Gtk.EventControllerMotion()
+        motion_controller.connect("motion", self.on_motion)
+        self.win.add_controller(motion_controller)
+        self.win.connect("realize", self.on_window_realize)
+        self.init_timers()
+
         self.win.present()
+        self.startup_times["window"] = time.perf_counter() - IMPORTED_AT
+        logger.info("Window shown after %.2fs.", self.startup_times["window"])
+
+    def init_timers(self) -> None:
+        """Schedule periodic and delayed tasks."""
+        GLib.timeout_add(500, self.update_power_state)
+        if self.latency_selftest:
+            GLib.timeout_add(int(self.latency_selftest * 1000), self.quit_selftest)
+        if self.profiler:
+            GLib.timeout_add(int(self.profile_seconds * 1000), self.stop_profiling)
+
+    def init_placeholder(self) -> None:
+        """Show a spinner and disable the controls, until the video handler is ready."""
+        self.spinner = Gtk.Spinner(
+            spinning=True,
+            halign=Gtk.Align.CENTER,
+            valign=Gtk.Align.CENTER,
+            width_request=48,
+            height_request=48,
+        )
+        self.overlay.add_overlay(self.spinner)
+        self.widgets_requiring_video_handler = [
+            self.follow_face_button,
+            self.builder.get_object("shape_menu_button"),
+            self.builder.get_object("controls_grid"),
+            self.debug_mode_button,
+        ]
+        for widget in self.widgets_requiring_video_handler:
+            widget.set_sensitive(False)
 
     def show_about_dialog(self) -> None:
         self.about = Gtk.AboutDialog()
@@ -168,9 +394,9 @@ class MyHumbleSelf(Gtk.Application):
         Returns:
             Button widget.
         """
-        image = converters.cv2_image_to_gtk_image(
-            self.video_handler.available_cameras[cam_id]
-        )
+        # The thumbnail is set once it is created, see on_thumbnail_updated()
+        image = Gtk.Image.new_from_paintable(self.thumbnails.get(cam_id))
+        self.camera_thumbnail_images[cam_id] = image
         label = Gtk.Label()
         label.set_text(f"{self.cam_item_prefix}{cam_id}")
 
@@ -183,28 +409,31 @@ class MyHumbleSelf(Gtk.Application):
         button.set_size_request(56, 56)
         button.set_has_frame(False)
         button.set_child(button_box)
-        button.connect("toggled", self.on_camera_toggled, cam_id)
         button.set_css_classes([*button.get_css_classes(), "camera-button"])
         return button
 
-    def init_camera_box(self) -> Gtk.FlowBox:
+    def init_camera_box(self, active_cam_id: int) -> Gtk.FlowBox:
         """Fill the camera menu's flow box with buttons for each camera.
 
-        Also hide the camera menu if only one camera is available.
+        Replaces existing buttons, e.g. after cameras were added or removed. Also hide
+        the camera menu if only one camera is available.
+
+        Args:
+            active_cam_id: Camera, whose button is activated.
 
         Returns:
             Widget containing the camera selection buttons.
         """
         camera_menu_button = self.builder.get_object("camera_menu_button")
         camera_box = self.builder.get_object("camera_box")
+        while child := camera_box.get_first_child():
+            camera_box.remove(child)
+        self.camera_thumbnail_images.clear()
+
         first_button = None
         for cam_id in self.video_handler.available_cameras:
             button = self.create_camera_menu_button(cam_id)
 
-            # Activate button if it was the last active camera
-            if cam_id == self.config["main"].getint("last_active_camera", 0):
-                button.set_active(True)
-
             if cam_id in [
                 self.video_handler.FALLBACK_CAM_ID,
                 self.video_handler.DEMO_CAM_ID,
@@ -217,6 +446,9 @@ class MyHumbleSelf(Gtk.Application):
             else:
                 button.set_group(first_button)
 
+            # Activate before connecting, to not switch & persist the camera again
+            button.set_active(cam_id == active_cam_id)
+            button.connect("toggled", self.on_camera_toggled, cam_id)
             camera_box.append(button)
 
         # Hide camera menu if only one camera (plus fallback) is available, except
@@ -228,6 +460,61 @@ class MyHumbleSelf(Gtk.Application):
 
         return camera_box
 
+    def on_cameras_changed(self) -> bool:
+        """Update the camera menu, after cameras were added or removed.
+
+        If the camera chosen last was plugged in again, switch back to it. If the
+        active camera was removed, the video handler already failed over.
+
+        Returns:
+            False, to only be called once by GLib.idle_add().
+        """
+        if not self.ready:
+            return False  # The camera menu gets created once ready
+        cameras = self.video_handler.available_cameras
+        for cam_id, frame in cameras.items():
+            if self.thumbnails.get(cam_id) is None:
+                self.thumbnails.request(cam_id, frame)
+
+        active_cam_id = self.video_handler.cam_id
+        last_active_cam_id = self.config["main"].getint("last_active_camera", 0)
+        if last_active_cam_id in cameras and last_active_cam_id != active_cam_id:
+            self.video_handler.set_camera(last_active_cam_id)
+            active_cam_id = last_active_cam_id
+        self.camera_box = self.init_camera_box(active_cam_id)
+        return False
+
+    def on_thumbnail_updated(self, cam_id: int, texture: Gdk.Texture) -> bool:
+        """Show a new thumbnail in the camera menu.
+
+        Returns:
+            False, to only be called once by GLib.idle_add().
+        """
+        if image := self.camera_thumbnail_images.get(cam_id):
+            image.set_from_paintable(texture)
+        return False
+
+    def on_camera_menu_shown(self, _: Gtk.Popover) -> None:
+        if self.thumbnail_refresh_id is None:
+            self.refresh_camera_thumbnail()
+            self.thumbnail_refresh_id = GLib.timeout_add(
+                1000, self.refresh_camera_thumbnail
+            )
+
+    def refresh_camera_thumbnail(self) -> bool:
+        """Update the thumbnail of the active camera, while the camera menu is open.
+
+        The other cameras can't capture in parallel, they keep the probed frame.
+
+        Returns:
+            True, to be called again by the GLib timeout, until the menu is closed.
+        """
+        if self.camera_box.get_mapped():
+            self.thumbnails.request(*self.video_handler.get_camera_frame())
+            return True
+        self.thumbnail_refresh_id = None
+        return False
+
     def init_shape_box(self) -> Gtk.FlowBox:
         """Setup widget for selecting shape overlay.
 
@@ -247,12 +534,13 @@ class MyHumbleSelf(Gtk.Application):
             button.set_size_request(56, 56)
             button.set_icon_name(f"{shape[:-4]}-symbolic")
             button.set_has_frame(False)
-            button.connect("toggled", self.on_shape_toggled, shape)
             button.set_css_classes([*button.get_css_classes(), "shape-button"])
 
-            # Activate stored shape:
+            # Activate stored shape. Before connecting, as the video handler already
+            # uses it, and might not be ready yet.
             if shape == self.config["main"].get("shape"):
                 button.set_active(True)
+            button.connect("toggled", self.on_shape_toggled, shape)
 
             # Set button group
             if first_button is None:
@@ -305,8 +593,8 @@ class MyHumbleSelf(Gtk.Application):
             button.set_tooltip_text("Follow face")
             button.set_icon_name("follow-face-symbolic")
 
-    def _load_active_shape_png(self) -> bytes:
-        shape = self.config["main"].get("shape")
+    def _load_active_shape_png(self, shape: str | None = None) -> bytes:
+        shape = shape or self.config["main"].get("shape")
         shape_png = self.resource.lookup_data(
             f"/com/github/dynobo/myhumbleself/shapes/{shape}",
             Gio.ResourceLookupFlags.NONE,
@@ -332,25 +620,122 @@ class MyHumbleSelf(Gtk.Application):
         self.video_handler.reset_view()
 
     def on_move_clicked(self, button: Gtk.Button, factor_x: int, factor_y: int) -> None:
-        self.video_handler.offset_x += factor_x * self.video_handler.MOVE_STEP
-        self.video_handler.offset_y += factor_y * self.video_handler.MOVE_STEP
+        self.video_handler.move_view(
+            x=factor_x * self.video_handler.MOVE_STEP,
+            y=factor_y * self.video_handler.MOVE_STEP,
+        )
         self.config.set_persistent("offset_x", self.video_handler.offset_x)
         self.config.set_persistent("offset_y", self.video_handler.offset_y)
 
     def on_zoom(self, _: Gtk.Button, factor_z: int) -> None:
         zoom = self.config["main"].getfloat("zoom_factor", 1)
         zoom -= self.video_handler.ZOOM_STEP * factor_z
-        self.video_handler.zoom_factor = max(zoom, self.video_handler.MIN_ZOOM_FACTOR)
+        self.video_handler.set_view(
+            zoom_factor=max(zoom, self.video_handler.MIN_ZOOM_FACTOR)
+        )
         self.config.set_persistent("zoom_factor", zoom)
 
     def on_shutdown(self, _: Gtk.Application) -> None:
-        self.video_handler.set_camera(None)
+        self.init_thread.join()
+        if hasattr(self, "video_handler"):  # Missing, if initialization failed
+            self.video_handler.stop()
+        if hasattr(self, "thumbnails"):
+            self.thumbnails.close()
+        self.config.flush()
+        if hasattr(self, "power_policy"):
+            self.power_policy.log_summary()
+        if self.metrics_file:
+            self.write_metrics()
+        if self.latency_selftest:
+            self.log_latency_selftest_result()
+        self.stop_profiling()
+
+    def stop_profiling(self) -> bool:
+        """Write the profiling report, if profiling is still running.
+
+        Returns:
+            False, to only be called once by the GLib timeout.
+        """
+        if self.profiler and self.profiler.running:
+            report_path = self.profiler.stop()
+            logger.warning("Profiling finished, see %s.", report_path)
+        return False
+
+    def quit_selftest(self) -> bool:
+        self.quit()
+        return False
+
+    def log_latency_selftest_result(self) -> None:
+        histogram = self.metrics.histogram("latency_seconds")
+        logger.info(
+            "Latency self-test: %s frames displayed, %s. "
+            "Stamped frame counter unreadable: %s, not matching: %s.",
+            histogram.count,
+            latency.describe(histogram),
+            self.metrics.counter("selftest_unreadable_frames").value,
+            self.metrics.counter("selftest_mismatched_frames").value,
+        )
+
+    def check_frame_stamp(self, image: np.ndarray) -> None:
+        """Verify the displayed image belongs to the frame its timestamp refers to.
+
+        Args:
+            image: Image just passed to the widget, stamped with the frame counter.
+        """
+        counter = latency.read_frame_counter(image)
+        if counter is None:
+            self.metrics.counter("selftest_unreadable_frames").inc()
+        elif counter != self.video_handler.last_composed_seq % 2**latency.COUNTER_BITS:
+            self.metrics.counter("selftest_mismatched_frames").inc()
+
+    def write_metrics(self) -> bool:
+        """Export the metrics, e.g. triggered via `kill -USR1 <pid>`.
+
+        Returns:
+            True, to keep the signal handler installed.
+        """
+        if self.metrics_file:
+            self.metrics.write(self.metrics_file)
+        return True
 
     def on_toggle_controls_clicked(self, btn: Gtk.Button) -> None:
         btn.set_icon_name(
             "controls-show-symbolic" if btn.get_active() else "controls-hide-symbolic"
         )
         self.toggle_presentation_mode(on=btn.get_active())
+        self.update_power_state()
+
+    def on_motion(self, *_: object) -> None:
+        if self.ready:
+            self.power_policy.notify_activity()
+
+    def on_window_realize(self, win: Gtk.ApplicationWindow) -> None:
+        win.get_surface().connect("notify::state", lambda *_: self.update_power_state())
+
+    def update_power_state(self) -> bool:
+        """Pass the current window state to the power policy.
+
+        Also called periodically, as the frame clock doesn't tick for hidden windows.
+
+        Returns:
+            True, to keep the periodic call going.
+        """
+        if not self.ready:
+            return True
+        surface = self.win.get_surface()
+        hidden_states = Gdk.ToplevelState.MINIMIZED
+        if hasattr(Gdk.ToplevelState, "SUSPENDED"):  # GTK >= 4.12
+            hidden_states |= Gdk.ToplevelState.SUSPENDED
+        is_visible = (
+            self.win.get_mapped()
+            and surface is not None
+            and not surface.get_state() & hidden_states
+        )
+        self.power_policy.set_window_state(
+            visible=is_visible,
+            controls_hidden=self.toggle_controls_button.get_active(),
+        )
+        return True
 
     def on_toggle_debug_position(self, button: Gtk.Button) -> None:
         debug_mode = button.get_active()
@@ -368,6 +753,14 @@ class MyHumbleSelf(Gtk.Application):
         Returns:
             True if the tick callback should continue to be called.
         """
+        if not self.ready:
+            return True
+        self.power_policy.notify_frame()
+        scale = widget.get_scale_factor()
+        self.video_handler.set_output_size(
+            widget.get_width() * scale, widget.get_height() * scale
+        )
+        self.video_handler.request_render()
         self.draw_image(widget)
         return True
 
@@ -392,8 +785,6 @@ class MyHumbleSelf(Gtk.Application):
         Args:
             widget: Tick owner widget.
         """
-        tick_before = time.perf_counter()
-
         image = self.video_handler.get_processed_frame()
 
         # Compare an approx. image hash with the last one to avoid unnecessary updates:
@@ -408,32 +799,40 @@ class MyHumbleSelf(Gtk.Application):
             self.zoom_out_button.set_sensitive(self.video_handler.can_zoom_out())
             self.zoom_in_button.set_sensitive(self.video_handler.can_zoom_in())
 
-            height, width, channels = image.shape
-            pixbuf = GdkPixbuf.Pixbuf.new_from_data(
-                image.tobytes(),
-                GdkPixbuf.Colorspace.RGB,
-                True,
-                8,
-                width,
-                height,
-                width * channels,
+            with (
+                self.metrics.timer("upload_seconds"),
+                self.video_handler.tracer.span(
+                    "upload", seq=self.video_handler.last_composed_seq
+                ),
+            ):
+                widget.set_paintable(image_to_texture(image))
+            self.metrics.histogram("latency_seconds").observe(
+                time.monotonic() - self.video_handler.last_composed_timestamp
             )
-            texture = Gdk.Texture.new_for_pixbuf(pixbuf)
-            widget.set_paintable(texture)
+            if self.latency_selftest:
+                self.check_frame_stamp(image)
+            if "first_frame" not in self.startup_times:
+                self.startup_times["first_frame"] = time.perf_counter() - IMPORTED_AT
+                logger.info(
+                    "First frame shown after %.2fs.", self.startup_times["first_frame"]
+                )
+
+            now = time.perf_counter()
+            self.metrics.histogram("display_interval_seconds").observe(
+                now - self.last_upload
+            )
+            self.last_upload = now
+        else:
+            self.metrics.counter("uploads_skipped").inc()
 
         if logger.getEffectiveLevel() <= logging.INFO:
+            capture_fps = self.metrics.histogram("capture_interval_seconds").rate()
+            display_fps = self.metrics.histogram("display_interval_seconds").rate()
             self.win.set_title(
-                f"MyHumbleSelf - "
-                f"FPS in/out: {mean(self.video_handler._camera.fps):.1f} "
-                f"/ {mean(self.fps):.1f}"
+                f"MyHumbleSelf - FPS in/out: {capture_fps:.1f} / {display_fps:.1f}, "
+                + latency.describe(self.metrics.histogram("latency_seconds"))
             )
 
-        tick_after = time.perf_counter()
-        fps = 1 / (tick_after - tick_before)
-        self.fps.append(fps)
-        if len(self.fps) > self.fps_window:
-            self.fps.pop(0)
-
     def get_system_info(self) -> str:
         xdg_session_type = os.environ.get("XDG_SESSION_TYPE", "").lower()
         has_wayland_display_env = bool(os.environ.get("WAYLAND_DISPLAY", ""))
@@ -479,9 +878,12 @@ class MyHumbleSelf(Gtk.Application):
         return "Unknown"
 
 
-def _parse_args() -> argparse.Namespace:
+def _parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     """Configure and process cli arguments.
 
+    Args:
+        argv: Arguments to parse. Defaults to the ones of the current process.
+
     Returns:
         Parsed arguments.
     """
@@ -492,15 +894,144 @@ def _parse_args() -> argparse.Namespace:
     parser.add_argument(
         "-vv", "--very-verbose", action="store_true", help="Enable debug logging."
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=1,
+        help="Number of frames buffered between capture and the processing stages.",
+    )
+    parser.add_argument(
+        "--drop-policy",
+        choices=[p.value for p in structures.DropPolicy],
+        default=structures.DropPolicy.DROP_OLDEST.value,
+        help="What to do with new frames, if a processing stage is busy.",
+    )
+    parser.add_argument(
+        "--detect-in-process",
+        action="store_true",
+        help="Run face detection in a separate worker process.",
+    )
+    parser.add_argument(
+        "--group-framing",
+        action="store_true",
+        help="Keep all faces in the frame, instead of following the largest one.",
+    )
+    parser.add_argument(
+        "--inset",
+        type=int,
+        action="append",
+        default=[],
+        metavar="CAM_ID",
+        help=(
+            "Also show this camera, as picture-in-picture, e.g. the speaker next to "
+            "the slides. Can be repeated."
+        ),
+    )
+    parser.add_argument(
+        "--inset-shape",
+        default="01-circle.png",
+        metavar="SHAPE",
+        help="Shape of the insets, e.g. 02-oval.png. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--record",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help=(
+            "Record the output as displayed, e.g. as overlay for video editing. "
+            ".webm, .mov and .mkv keep the transparency, .mp4 doesn't (requires "
+            "ffmpeg). Without suffix, PNG files are written into a directory."
+        ),
+    )
+    parser.add_argument(
+        "--record-fps",
+        type=float,
+        default=30,
+        help="Frame rate of the recording. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--record-policy",
+        choices=[p.value for p in structures.DropPolicy],
+        default=structures.DropPolicy.DROP_OLDEST.value,
+        help=(
+            "What to do with frames, if the encoder falls behind. 'block' keeps all "
+            "frames, but slows down the output."
+        ),
+    )
+    parser.add_argument(
+        "--release-camera-after",
+        type=float,
+        default=30,
+        metavar="SECONDS",
+        help="Release the camera, if the window is hidden that long. 0 to disable.",
+    )
+    parser.add_argument(
+        "--target-fps",
+        type=float,
+        default=None,
+        help="Adapt quality settings to reach this fps. Default: fixed settings.",
+    )
+    parser.add_argument(
+        "--cpu-budget",
+        type=float,
+        default=None,
+        metavar="CORES",
+        help="With --target-fps, also limit the processing to this many CPU cores.",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help=(
+            "Write metrics on SIGUSR1 and on exit. "
+            "Prometheus text format for *.prom, else JSON."
+        ),
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="Record timings of every frame & stage as Chrome/Perfetto JSON trace.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help=(
+            "Profile the CPU usage of all threads for SECONDS, then write a report to "
+            f"{config.CONFIG_PATH}."
+        ),
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Also trace memory allocations. Without --profile, for 30 seconds.",
+    )
+    parser.add_argument(
+        "--latency-selftest",
+        type=float,
+        nargs="?",
+        const=10,
+        default=None,
+        metavar="SECONDS",
+        help=(
+            "Measure the latency from capture to display with the demo video for "
+            "SECONDS (default: 10), then quit and log the result."
+        ),
+    )
+    return parser.parse_args(argv)
 
 
-def main() -> None:
-    args = _parse_args()
+def main(argv: list[str] | None = None) -> None:
+    args = _parse_args(argv)
 
     if args.very_verbose:
         log_level = "DEBUG"
-    elif args.verbose:
+    elif args.verbose or args.latency_selftest:
         log_level = "INFO"
     else:
         log_level = "WARNING"
@@ -0,0 +1,311 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import cv2
+
+from myhumbleself import __version__, camera, metrics, structures, video_handler
+
+logger = logging.getLogger(__name__)
+
+# Reported histograms, in pipeline order
+STAGES = ("decode", "detection", "composition", "crop", "mask", "latency")
+
+
+@dataclass
+class BenchSettings:
+    """Settings of a benchmark run.
+
+    Attributes:
+        frames: Number of captured frames to measure.
+        warmup: Number of captured frames to process before measuring.
+        video: Video file to replay instead of the demo video.
+        realtime: Replay at the video's fps instead of as fast as possible.
+        shape: PNG file of the shape mask. Defaults to a circle.
+        zoom_factor: Zoom factor, as adjusted via the GUI.
+        follow_face: Run face detection.
+        debug: Render the debug view instead of the shaped output.
+        queue_size: Frames buffered between capture and the pipeline stages.
+        drop_policy: Drop policy of the queues between the pipeline stages.
+        detect_in_process: Run face detection in a worker process.
+        display_fps: Rate at which rendering is requested, like the GUI's frame clock.
+        insets: Number of additional demo cameras, composited as insets.
+        timeout: Max seconds for the whole run.
+    """
+
+    frames: int = 300
+    warmup: int = 30
+    video: Path | None = None
+    realtime: bool = False
+    shape: Path | None = None
+    zoom_factor: float = 1
+    follow_face: bool = True
+    debug: bool = False
+    queue_size: int = 1
+    drop_policy: str = structures.DropPolicy.DROP_OLDEST.value
+    detect_in_process: bool = False
+    display_fps: float = 60
+    insets: int = 0
+    timeout: float = 120
+
+    def to_dict(self) -> dict:
+        return {
+            key: str(value) if isinstance(value, Path) else value
+            for key, value in asdict(self).items()
+        }
+
+
+def _drive(
+    handler: video_handler.VideoHandler,
+    registry: metrics.Registry,
+    frames: int,
+    settings: BenchSettings,
+) -> int:
+    """Render at display rate, until the camera captured the number of frames.
+
+    Returns:
+        Number of newly composed frames picked up, like the GUI does.
+    """
+    captured = registry.histogram("capture_interval_seconds")
+    latency_seconds = registry.histogram("latency_seconds")
+    render_interval = 1 / settings.display_fps if settings.display_fps > 0 else 0
+    deadline = time.monotonic() + settings.timeout
+    target_count = captured.count + frames
+    last_seq = handler.last_composed_seq
+    displayed = 0
+
+    while captured.count < target_count:
+        if time.monotonic() > deadline:
+            raise TimeoutError(
+                f"Only {captured.count} of {target_count} frames captured within "
+                f"{settings.timeout}s."
+            )
+        handler.request_render()
+        handler.get_processed_frame()
+        if handler.last_composed_seq != last_seq:
+            last_seq = handler.last_composed_seq
+            latency_seconds.observe(time.monotonic() - handler.last_composed_timestamp)
+            displayed += 1
+        time.sleep(render_interval)
+    return displayed
+
+
+def run(settings: BenchSettings) -> dict:
+    """Drive the processing pipeline headless and measure its performance.
+
+    Args:
+        settings: Benchmark settings.
+
+    Returns:
+        Results as plain data structures, ready to be serialized to JSON.
+    """
+    # Large enough to keep all samples, so the percentiles cover the whole run
+    registry = metrics.Registry(histogram_size=max(256, 4 * settings.frames))
+    handler = video_handler.VideoHandler(
+        cam_id=camera.DEMO_CAM_ID,
+        shape_png_buffer=(
+            settings.shape.read_bytes()
+            if settings.shape
+            else video_handler.default_shape_png()
+        ),
+        zoom_factor=settings.zoom_factor,
+        offset_x=0,
+        offset_y=0,
+        follow_face=settings.follow_face,
+        queue_size=settings.queue_size,
+        drop_policy=structures.DropPolicy(settings.drop_policy),
+        detect_in_process=settings.detect_in_process,
+        metrics_registry=registry,
+        demo_video=settings.video,
+        demo_realtime=settings.realtime,
+    )
+    for idx in range(settings.insets):
+        handler.add_inset(
+            camera.DEMO_CAM_ID,
+            shape_png_buffer=video_handler.default_shape_png(),
+            center=(0.8, 0.8 - idx * 0.3),
+        )
+    handler.set_debug_mode(on=settings.debug)
+    try:
+        _drive(handler, registry, settings.warmup, settings)
+        registry.reset()
+        started = time.monotonic()
+        cpu_started = time.process_time()
+        displayed = _drive(handler, registry, settings.frames, settings)
+        elapsed = time.monotonic() - started
+        cpu_seconds = time.process_time() - cpu_started
+        snapshot = registry.snapshot()
+    finally:
+        handler.stop()
+
+    stages = {}
+    # Insets report under their own names, see VideoHandler.add_inset()
+    prefixes = ["", *(f"inset{idx}_" for idx in range(1, settings.insets + 1))]
+    for prefix in prefixes:
+        for stage in STAGES:
+            stats = snapshot["histograms"].get(f"{prefix}{stage}_seconds")
+            if stats:
+                stages[prefix + stage] = {**stats, "rate": stats["count"] / elapsed}
+
+    return {
+        "version": __version__,
+        "system": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": settings.to_dict(),
+        "elapsed_seconds": elapsed,
+        "captured_frames": settings.frames,
+        "displayed_frames": displayed,
+        "capture_fps": settings.frames / elapsed,
+        "display_fps": displayed / elapsed,
+        "cpu_cores": cpu_seconds / elapsed,
+        "stages": stages,
+        "counters": snapshot["counters"],
+        "gauges": snapshot["gauges"],
+    }
+
+
+def format_table(result: dict) -> str:
+    """Render the per-stage statistics of a benchmark result as text table."""
+    header = ("stage", "count", "fps", "mean", "p50", "p90", "p99", "max")
+    # Wider for the stages of insets, e.g. "inset1_composition"
+    width = max([12, *(len(stage) + 1 for stage in result["stages"])])
+    row = "{:<%d}{:>8}{:>8}{:>9}{:>9}{:>9}{:>9}{:>9}" % width
+    lines = [row.format(*header), row.format("", "", "", "ms", "ms", "ms", "ms", "ms")]
+    for stage, stats in result["stages"].items():
+        lines.append(
+            f"{stage:<{width}}{stats['count']:>8}{stats['rate']:>8.1f}"
+            + "".join(
+                f"{stats[key] * 1000:>9.2f}"
+                for key in ("mean", "p50", "p90", "p99", "max")
+            )
+        )
+    lines.append(
+        f"\nCaptured {result['captured_frames']} frames in "
+        f"{result['elapsed_seconds']:.2f}s ({result['capture_fps']:.1f} fps), "
+        f"displayed {result['displayed_frames']} ({result['display_fps']:.1f} fps), "
+        f"using {result['cpu_cores']:.2f} CPU cores."
+    )
+    return "\n".join(lines) + "\n"
+
+
+def _parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Configure and process cli arguments of the bench subcommand.
+
+    Args:
+        argv: Arguments to parse, without the subcommand.
+
+    Returns:
+        Parsed arguments.
+    """
+    defaults = BenchSettings()
+    parser = argparse.ArgumentParser(
+        prog="myhumbleself bench",
+        description="Measure the performance of the processing pipeline, headless.",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Enable info logging."
+    )
+    parser.add_argument("--frames", type=int, default=defaults.frames)
+    parser.add_argument("--warmup", type=int, default=defaults.warmup)
+    parser.add_argument(
+        "--video",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="Replay this video file instead of the demo video.",
+    )
+    parser.add_argument(
+        "--realtime",
+        action="store_true",
+        help="Replay at the video's fps, instead of as fast as possible.",
+    )
+    parser.add_argument(
+        "--shape",
+        type=Path,
+        default=None,
+        metavar="PNG",
+        help="Shape mask, e.g. resources/shapes/02-oval.png. Default: circle.",
+    )
+    parser.add_argument("--zoom-factor", type=float, default=defaults.zoom_factor)
+    parser.add_argument(
+        "--no-follow-face",
+        dest="follow_face",
+        action="store_false",
+        help="Disable face detection.",
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="Render the debug view instead."
+    )
+    parser.add_argument("--queue-size", type=int, default=defaults.queue_size)
+    parser.add_argument(
+        "--drop-policy",
+        choices=[p.value for p in structures.DropPolicy],
+        default=defaults.drop_policy,
+    )
+    parser.add_argument("--detect-in-process", action="store_true")
+    parser.add_argument(
+        "--display-fps",
+        type=float,
+        default=defaults.display_fps,
+        help="Rate of render requests. 0 for as fast as possible.",
+    )
+    parser.add_argument(
+        "--insets",
+        type=int,
+        default=defaults.insets,
+        metavar="N",
+        help="Composite N additional demo cameras as insets.",
+    )
+    parser.add_argument("--timeout", type=float, default=defaults.timeout)
+    parser.add_argument(
+        "--json", action="store_true", help="Print the results as JSON."
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="Also write the results as JSON to this file.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    settings = BenchSettings(
+        frames=args.frames,
+        warmup=args.warmup,
+        video=args.video,
+        realtime=args.realtime,
+        shape=args.shape,
+        zoom_factor=args.zoom_factor,
+        follow_face=args.follow_face,
+        debug=args.debug,
+        queue_size=args.queue_size,
+        drop_policy=args.drop_policy,
+        detect_in_process=args.detect_in_process,
+        display_fps=args.display_fps,
+        insets=args.insets,
+        timeout=args.timeout,
+    )
+    try:
+        result = run(settings)
+    except TimeoutError as exc:
+        sys.exit(str(exc))
+
+    result_json = json.dumps(result, indent=2)
+    if args.output:
+        args.output.write_text(result_json)
+    sys.stdout.write(result_json + "\n" if args.json else format_table(result))
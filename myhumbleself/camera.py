@@ -1,31 +1,64 @@
 import logging
+import math
 import time
+from collections.abc import Callable
 from pathlib import Path
-from threading import Thread
+from threading import Lock, Thread
 from typing import Any
 
 import cv2
 import numpy as np
 
+from myhumbleself import (
+    capture_modes,
+    hotplug,
+    latency,
+    metrics,
+    structures,
+    tracing,
+)
+
 logger = logging.getLogger(__name__)
 
+DEMO_CAM_ID = 98
+FALLBACK_CAM_ID = 99
+DEVICE_DIR = Path("/dev")
+# Attempts to open a newly added device, e.g. while udev still adjusts permissions
+MAX_PROBE_ATTEMPTS = 3
+
 
 class DemoVideoCapture:
-    def __init__(self) -> None:
-        self._demo_video_file = str(Path(__file__).parent / "resources" / "demo.mp4")
+    """Endlessly loop a video file, e.g. the bundled demo video.
+
+    Args:
+        path: Video file to play. Defaults to the demo video.
+        realtime: Deliver frames at the video's fps. If False, as fast as possible.
+    """
+
+    def __init__(self, path: Path | None = None, realtime: bool = True) -> None:
+        self._demo_video_file = str(
+            path or Path(__file__).parent / "resources" / "demo.mp4"
+        )
         self.capture = cv2.VideoCapture(self._demo_video_file)
-        self.fps = self.capture.get(cv2.CAP_PROP_FPS)
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) if realtime else math.inf
         self.last_frame = time.perf_counter()
 
     def read(self) -> tuple[bool, np.ndarray]:
-        while self.last_frame + 1 / self.fps > time.perf_counter():
-            pass
+        self.grab()
+        return self.retrieve()
+
+    def grab(self) -> bool:
+        # Sleep instead of spinning, so several demo cameras don't occupy a core each
+        time.sleep(max(0, self.last_frame + 1 / self.fps - time.perf_counter()))
         self.last_frame = time.perf_counter()
-        return_code, frame = self.capture.read()
+        return_code = self.capture.grab()
         if not return_code:
             self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            return_code, frame = self.capture.read()
-        return (return_code, frame)
+            return_code = self.capture.grab()
+        return return_code
+
+    def retrieve(self) -> tuple[bool, np.ndarray]:
+        return self.capture.retrieve()
 
     def release(self) -> None:
         pass
@@ -43,6 +76,12 @@ class FallbackVideoCapture:
         self.frame = cv2.imread(self._image_path)
 
     def read(self) -> tuple[bool, np.ndarray]:
+        return self.retrieve()
+
+    def grab(self) -> bool:
+        return True
+
+    def retrieve(self) -> tuple[bool, np.ndarray]:
         # Add some noise to invalidate cache
         return (
             True,
@@ -59,27 +98,78 @@ class FallbackVideoCapture:
         return 0
 
 
+VideoCapture = cv2.VideoCapture | DemoVideoCapture | FallbackVideoCapture
+
+
 class Camera:
-    def __init__(self) -> None:
-        self.DEMO_CAM_ID = 98
-        self.FALLBACK_CAM_ID = 99
-        self.available_cameras = self._get_available_cameras()
+    def __init__(  # noqa: PLR0913
+        self,
+        metrics_registry: metrics.Registry | None = None,
+        tracer: tracing.Tracer | None = None,
+        demo_video: Path | None = None,
+        demo_realtime: bool = True,
+        available_cameras: dict[int, np.ndarray] | None = None,
+        queue_size: int = 1,
+        drop_policy: structures.DropPolicy = structures.DropPolicy.DROP_OLDEST,
+    ) -> None:
+        # Source of the demo camera, see DemoVideoCapture
+        self.demo_video = demo_video
+        self.demo_realtime = demo_realtime
+        self.DEMO_CAM_ID = DEMO_CAM_ID
+        self.FALLBACK_CAM_ID = FALLBACK_CAM_ID
+        # Replaced as a whole on changes, so it can be iterated from other threads.
+        # Probing is skipped, if another instance already did it.
+        self.available_cameras = (
+            self._get_available_cameras()
+            if available_cameras is None
+            else dict(available_cameras)
+        )
+        # Frame sizes at default resolution, kept also for removed cameras
+        self._default_sizes_hw = {
+            cam_id: (frame.shape[0], frame.shape[1])
+            for cam_id, frame in self.available_cameras.items()
+        }
+        self._device_watcher: hotplug.DeviceWatcher | None = None
+        self._on_cameras_changed: Callable[[], object] | None = None
+        self._failed_probes: dict[int, int] = {}
         self.cam_id: int
-        self._capture: (
-            cv2.VideoCapture | DemoVideoCapture | FallbackVideoCapture | None
-        ) = None
+        self._capture: VideoCapture | None = None
+        # Camera to switch to, with its capture already opened by switch() (or None,
+        # if the capture thread has to open it) and the time the switch was requested:
+        self._standby: tuple[int, VideoCapture | None, float] | None = None
+        # Incremented by every switch, to discard captures of outdated switches
+        self._switch_generation = 0
+        self._switch_lock = Lock()
+        self._switch_requested: float | None = None
+        # Latest frame, e.g. for thumbnails. Replaced as a whole by the capture thread,
+        # never modified in place, so other threads can read it without lock.
         self.frame: np.ndarray = np.zeros((1080, 1920, 3), np.uint8)
-        self.fps: list[float] = [0]
-        self.fps_window = 100
+        # Latest captured frames, consumed by the processing pipeline:
+        self.frames: structures.LatestValueQueue[structures.Frame] = (
+            structures.LatestValueQueue(maxsize=queue_size, drop_policy=drop_policy)
+        )
+        self.frame_seq = 0
+        # Stamp the sequence number into every frame, for the latency self-test
+        self.stamp_frames = False
+        # Limit for decoded frames per second, e.g. to save power. None for no limit.
+        self.max_fps: float | None = None
+        # Requested mode. OpenCV automatically selects a lower one, if needed:
+        self.capture_mode = capture_modes.DEFAULT_CAPTURE_MODE
+        self._capture_mode_changed = False
+        # Held while changing capture_mode and _capture_mode_changed together
+        self._mode_lock = Lock()
+        # Supported modes, by camera id, listed on first use
+        self._modes: dict[int, list[capture_modes.CaptureMode]] = {}
+        self.metrics = metrics_registry or metrics.Registry()
+        self.tracer = tracer or tracing.Tracer()
+        self.metrics.gauge("capture_dropped_frames", lambda: self.frames.dropped)
         self.stop_video_thread = False
         self.video_thread: Thread | None = None
 
-    def _get_video_capture(
-        self, cam_id: int
-    ) -> cv2.VideoCapture | DemoVideoCapture | FallbackVideoCapture:
+    def _get_video_capture(self, cam_id: int) -> VideoCapture:
         if cam_id == self.DEMO_CAM_ID:
             logger.info("Using demo video capture.")
-            return DemoVideoCapture()
+            return DemoVideoCapture(path=self.demo_video, realtime=self.demo_realtime)
 
         if cam_id == self.FALLBACK_CAM_ID:
             logger.info("Using fallback video capture.")
@@ -102,54 +192,159 @@ class Camera:
         cam_ids_to_try = [*range(10), self.DEMO_CAM_ID, self.FALLBACK_CAM_ID]
 
         for idx in cam_ids_to_try:
-            cap = self._get_video_capture(idx)
-            cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)  # type: ignore # FP
-            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)  # type: ignore # FP
-            try:
-                read_status, frame = cap.read()
-            except cv2.error:
-                logger.debug("Camera at /video%s seems unavailable (cv2.error)", idx)
-            else:
-                if read_status:
-                    logger.debug("Camera at /video%s is available", idx)
-                    cams[idx] = frame
-                else:
-                    logger.debug("Camera at /video%s seems unavailable (no frame)", idx)
-            finally:
-                cap.release()
+            frame = self._probe_camera(idx)
+            if frame is not None:
+                cams[idx] = frame
 
         logger.info("Available cameras: %s", cams.keys())
         return cams
 
-    def start(self, cam_id: int) -> None:
-        if self.video_thread is not None:
-            raise ValueError("Camera needs to be stopped before starting!")
+    def _probe_camera(self, idx: int) -> np.ndarray | None:
+        """Try to read a frame from the camera.
 
+        Returns:
+            Captured frame, or None if the camera seems unavailable.
+        """
+        cap = self._get_video_capture(idx)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)  # type: ignore # FP
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)  # type: ignore # FP
+        try:
+            read_status, frame = cap.read()
+        except cv2.error:
+            logger.debug("Camera at /video%s seems unavailable (cv2.error)", idx)
+            return None
+        finally:
+            cap.release()
+        if not read_status:
+            logger.debug("Camera at /video%s seems unavailable (no frame)", idx)
+            return None
+        logger.debug("Camera at /video%s is available", idx)
+        return frame
+
+    @property
+    def default_size_hw(self) -> tuple[int, int]:
+        """Frame size of the active camera at its default resolution, as probed."""
+        return self._default_sizes_hw[self.cam_id]
+
+    def watch_devices(
+        self,
+        device_dir: Path = DEVICE_DIR,
+        on_change: Callable[[], object] | None = None,
+    ) -> None:
+        """Update available_cameras, when video devices are added or removed.
+
+        Only added devices are probed, not all of them again. If the active camera
+        gets removed, the stream fails over to another camera.
+
+        Args:
+            device_dir: Directory containing the video device files.
+            on_change: Called from the watcher thread, after available_cameras changed.
+        """
+        self._on_cameras_changed = on_change
+        self._device_watcher = hotplug.DeviceWatcher(
+            self._on_devices_changed, directory=device_dir
+        )
+        self._device_watcher.start()
+
+    def stop_watching_devices(self) -> None:
+        if self._device_watcher:
+            self._device_watcher.stop()
+            self._device_watcher = None
+
+    def _on_devices_changed(self, present: set[int]) -> None:
+        """Probe added and drop removed cameras. Runs in the device watcher thread."""
+        cams = dict(self.available_cameras)
+        for cam_id in set(cams) - present - {self.DEMO_CAM_ID, self.FALLBACK_CAM_ID}:
+            logger.info("Camera %s was removed.", cam_id)
+            del cams[cam_id]
+        for cam_id in set(self._failed_probes) - present:
+            del self._failed_probes[cam_id]
+
+        for cam_id in sorted(present - set(cams)):
+            if (
+                cam_id >= self.DEMO_CAM_ID
+                or self._failed_probes.get(cam_id, 0) >= MAX_PROBE_ATTEMPTS
+            ):
+                continue
+            frame = self._probe_camera(cam_id)
+            if frame is None:
+                self._failed_probes[cam_id] = self._failed_probes.get(cam_id, 0) + 1
+                continue
+            logger.info("Camera %s was added.", cam_id)
+            self._failed_probes.pop(cam_id, None)
+            self._default_sizes_hw[cam_id] = (frame.shape[0], frame.shape[1])
+            cams[cam_id] = frame
+
+        if cams.keys() == self.available_cameras.keys():
+            return
+        self.available_cameras = cams
+        if self.video_thread is not None and self.cam_id not in cams:
+            self.switch(self._get_failover_cam_id())
+        if self._on_cameras_changed:
+            self._on_cameras_changed()
+
+    def _get_failover_cam_id(self) -> int:
+        """First remaining real camera, or the fallback image."""
+        return next(
+            (c for c in self.available_cameras if c < self.DEMO_CAM_ID),
+            self.FALLBACK_CAM_ID,
+        )
+
+    def _resolve_cam_id(self, cam_id: int) -> int:
         first_cam_id = next(iter(self.available_cameras), None)
         cam_is_available = cam_id in self.available_cameras
 
         if cam_is_available:
             logger.info("Using camera %s.", cam_id)
-            self.cam_id = cam_id
-        elif not cam_is_available and first_cam_id is not None:
+            return cam_id
+        if first_cam_id is not None:
             logger.warning("Camera %s not available. Fallback to first one.", cam_id)
-            self.cam_id = first_cam_id
-        else:
-            logger.error("No camera accessible! Is another application using it?")
-            self.cam_id = 99
+            return first_cam_id
+        logger.error("No camera accessible! Is another application using it?")
+        return self.FALLBACK_CAM_ID
+
+    def _open_capture(
+        self, cam_id: int, mode: capture_modes.CaptureMode
+    ) -> VideoCapture:
+        capture = self._get_video_capture(cam_id=cam_id)
+        self._negotiate(capture, mode)
+        return capture
+
+    @staticmethod
+    def _negotiate(capture: VideoCapture, mode: capture_modes.CaptureMode) -> None:
+        # A compressed codec is way faster, for most cameras:
+        capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*mode.fourcc))  # type: ignore # FP
+        capture.set(cv2.CAP_PROP_FPS, mode.fps)  # type: ignore # FP
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, mode.width)  # type: ignore # FP
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, mode.height)  # type: ignore # FP
+        logger.debug("Requested capture mode %s.", mode)
+
+    @property
+    def modes(self) -> list[capture_modes.CaptureMode]:
+        """Capture modes supported by the active camera. Empty, if unknown."""
+        cam_id = self.cam_id
+        if cam_id not in self._modes:
+            self._modes[cam_id] = (
+                []
+                if cam_id in (self.DEMO_CAM_ID, self.FALLBACK_CAM_ID)
+                else capture_modes.list_v4l2_modes(Path(f"/dev/video{cam_id}"))
+            )
+        return self._modes[cam_id]
 
-        self._capture = self._get_video_capture(cam_id=self.cam_id)
-
-        # Set compressed codec for way better performance:
-        self._capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))  # type: ignore # FP
+    def start(self, cam_id: int) -> None:
+        if self.video_thread is not None:
+            raise ValueError("Camera needs to be stopped before starting!")
 
-        # Max resolution & FPS. OpenCV automatically selects lower one, if needed:
-        self._capture.set(cv2.CAP_PROP_FPS, 60)  # type: ignore # FP
-        self._capture.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)  # type: ignore # FP
-        self._capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)  # type: ignore # FP
+        resolved_cam_id = self._resolve_cam_id(cam_id)
+        # Resuming the same camera keeps the mode, others start with the default
+        if resolved_cam_id != getattr(self, "cam_id", None):
+            self.capture_mode = capture_modes.DEFAULT_CAPTURE_MODE
+        self.cam_id = resolved_cam_id
+        self._capture = self._open_capture(self.cam_id, self.capture_mode)
+        self._capture_mode_changed = False
 
         self.stop_video_thread = False
-        self.video_thread = Thread(target=self.update, args=())
+        self.video_thread = Thread(target=self.update, name="camera")
         self.video_thread.start()
 
     def stop(self) -> None:
@@ -157,35 +352,221 @@ class Camera:
             return
 
         self.stop_video_thread = True
+        # The pipeline might not consume anymore. Closing the queue wakes the capture
+        # thread, in case it waits for room (BLOCK policy). Frames of the next start
+        # go to a new one.
+        closing, self.frames = (
+            self.frames,
+            structures.LatestValueQueue(
+                maxsize=self.frames.maxsize, drop_policy=self.frames.drop_policy
+            ),
+        )
+        closing.close()
         self.video_thread.join()
 
         if self._capture and self._capture.isOpened():
             self._capture.release()
 
+        with self._switch_lock:
+            self._switch_generation += 1
+            standby, self._standby = self._standby, None
+        if standby and standby[1]:
+            standby[1].release()
+        self._switch_requested = None
+
         self.video_thread = None
 
+    def switch(self, cam_id: int) -> None:
+        """Switch to another camera, without interrupting the stream.
+
+        The new camera is opened and negotiated in a background thread, while the
+        current one keeps streaming. Once the new one delivered a frame, the capture
+        thread swaps them between two frames and releases the old one in the
+        background. If the new camera can't stream in parallel (e.g. because of the
+        USB bandwidth), the capture thread releases the old one first instead.
+
+        The time until the first frame of the new camera is recorded in the
+        histogram "camera_switch_seconds".
+
+        Args:
+            cam_id: Camera to switch to.
+        """
+        if self.video_thread is None:
+            self.start(cam_id)
+            return
+
+        requested = time.monotonic()
+        cam_id = self._resolve_cam_id(cam_id)
+        with self._switch_lock:
+            self._switch_generation += 1
+            generation = self._switch_generation
+            outdated, self._standby = self._standby, None
+        if outdated and outdated[1]:
+            self._release_in_background(outdated[1])
+        if cam_id == self.cam_id:
+            return
+
+        Thread(
+            target=self._open_standby,
+            args=(cam_id, generation, requested),
+            name="camera-standby",
+            daemon=True,
+        ).start()
+
+    def _open_standby(self, cam_id: int, generation: int, requested: float) -> None:
+        """Open a camera and wait for its first frame. Runs in a background thread."""
+        with self.tracer.span("open"):
+            capture = self._open_capture(cam_id, capture_modes.DEFAULT_CAPTURE_MODE)
+            try:
+                is_streaming = capture.grab()
+            except cv2.error:  # type: ignore # FP
+                is_streaming = False
+        if not is_streaming:
+            logger.info("Camera %s can't stream in parallel, switch cold.", cam_id)
+            capture.release()
+
+        with self._switch_lock:
+            if generation != self._switch_generation:
+                logger.debug("Switch to camera %s got outdated.", cam_id)
+                if is_streaming:
+                    self._release_in_background(capture)
+                return
+            self._standby = (cam_id, capture if is_streaming else None, requested)
+
+    def _take_over_standby(self) -> None:
+        """Swap the capture with the one opened by switch(). Runs in capture thread."""
+        if self._standby is None:
+            return
+        with self._switch_lock:
+            standby, self._standby = self._standby, None
+        if standby is None:
+            return
+
+        cam_id, capture, requested = standby
+        old_capture = self._capture
+        if capture is None:
+            if old_capture:
+                old_capture.release()
+            with self.tracer.span("open"):
+                capture = self._open_capture(cam_id, capture_modes.DEFAULT_CAPTURE_MODE)
+        elif old_capture:
+            self._release_in_background(old_capture)
+        self._capture = capture
+        with self._mode_lock:
+            self.capture_mode = capture_modes.DEFAULT_CAPTURE_MODE
+            self._capture_mode_changed = False
+        self.cam_id = cam_id
+        self._switch_requested = requested
+
+    def _observe_switch(self, switch_seconds: metrics.Histogram) -> None:
+        """Record the switch latency, on the first frame of the new camera."""
+        if self._switch_requested is None:
+            return
+        duration = time.monotonic() - self._switch_requested
+        self._switch_requested = None
+        switch_seconds.observe(duration)
+        logger.info("Switched to camera %s in %.3fs.", self.cam_id, duration)
+
+    @staticmethod
+    def _release_in_background(capture: VideoCapture) -> None:
+        Thread(target=capture.release, name="camera-release", daemon=True).start()
+
+    def set_capture_mode(self, mode: capture_modes.CaptureMode) -> None:
+        """Request a different mode, applied before the next frame is grabbed.
+
+        Args:
+            mode: Requested resolution, frame rate and pixel format.
+        """
+        with self._mode_lock:
+            if mode == self.capture_mode:
+                return
+            self.capture_mode = mode
+            self._capture_mode_changed = True
+
+    def _apply_capture_mode(self) -> None:
+        with self._mode_lock:
+            self._capture_mode_changed = False
+            mode = self.capture_mode
+        if self._capture:
+            self._negotiate(self._capture, mode)
+
     def get_frame(self) -> np.ndarray:
         return self.frame
 
+    def _get_capture_timestamp(self, grabbed: float) -> float:
+        """Time the frame was captured, on the time.monotonic() clock.
+
+        Prefers the timestamp of the driver, which is set when the sensor delivered
+        the buffer, and therefore also covers the time the frame waited in the
+        driver's queue. V4L2 reports it in ms on the monotonic clock. Other backends
+        report the position in the stream instead, which is detected by checking for
+        plausibility.
+
+        Args:
+            grabbed: Time the frame was grabbed, used as fallback.
+
+        Returns:
+            Capture timestamp in seconds.
+        """
+        if isinstance(self._capture, cv2.VideoCapture):
+            driver_timestamp = self._capture.get(cv2.CAP_PROP_POS_MSEC) / 1000
+            if 0 <= grabbed - driver_timestamp < 1:
+                return driver_timestamp
+        return grabbed
+
     def update(self) -> None:
         logger.info("Camera thread started.")
-        clock_period = 1 / cv2.getTickFrequency()
-        last_tick = cv2.getTickCount()
+        decode_seconds = self.metrics.histogram("decode_seconds")
+        capture_interval_seconds = self.metrics.histogram("capture_interval_seconds")
+        switch_seconds = self.metrics.histogram("camera_switch_seconds")
+        last_capture = time.monotonic()
+        last_retrieve = 0.0
         while not self.stop_video_thread:
             try:
                 if not self._capture:
                     logger.error("Capture device not ready.")
                     break
 
-                _, self.frame = self._capture.read()
+                self._take_over_standby()
+
+                if self._capture_mode_changed:
+                    self._apply_capture_mode()
 
-                tick = cv2.getTickCount()
-                fps = 1 / ((tick - last_tick) * clock_period)
-                last_tick = tick
+                # Grabbing is cheap, it only dequeues the buffer from the driver. The
+                # expensive decoding happens in retrieve(), so skip it for frames
+                # exceeding the max fps:
+                with self.tracer.span("grab", seq=self.frame_seq + 1):
+                    read_status = self._capture.grab()
+                grabbed = time.monotonic()
+                if read_status and self.max_fps:
+                    if grabbed - last_retrieve < 1 / self.max_fps:
+                        continue
+                    last_retrieve = grabbed
 
-                self.fps.append(fps)
-                if len(self.fps) > self.fps_window:
-                    self.fps.pop(0)
+                if read_status:
+                    with self.tracer.span("decode", seq=self.frame_seq + 1):
+                        read_status, frame = self._capture.retrieve()
+                    decode_seconds.observe(time.monotonic() - grabbed)
+                if not read_status:
+                    logger.debug("Camera returned no frame.")
+                    time.sleep(0.01)
+                    continue
+
+                self.frame_seq += 1
+                if self.stamp_frames:
+                    latency.stamp_frame_counter(frame, self.frame_seq)
+                self.frame = frame
+                timestamp = self._get_capture_timestamp(grabbed)
+                self.frames.put(
+                    structures.Frame(
+                        image=frame, seq=self.frame_seq, timestamp=timestamp
+                    )
+                )
+
+                capture_interval_seconds.observe(timestamp - last_capture)
+                last_capture = timestamp
+
+                self._observe_switch(switch_seconds)
 
             except cv2.error:  # type: ignore # FP
                 logger.exception("Error in camera update.")
@@ -0,0 +1,277 @@
+import fcntl
+import logging
+import math
+import os
+import struct
+import time
+from collections.abc import Callable, Iterator, Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Preferred pixel formats, the compressed one first for lower USB bandwidth
+PREFERRED_FOURCCS = ("MJPG", "YUYV")
+MAX_FPS = 60
+
+
+@dataclass(frozen=True)
+class CaptureMode:
+    """Resolution, frame rate and pixel format a camera can deliver."""
+
+    width: int
+    height: int
+    fps: float
+    fourcc: str
+
+    def __str__(self) -> str:
+        return f"{self.width}x{self.height}@{self.fps:g} {self.fourcc}"
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+    def covers(self, size_wh: tuple[float, float]) -> bool:
+        return self.width >= size_wh[0] and self.height >= size_wh[1]
+
+
+# Mode requested, if the modes of a camera are unknown
+DEFAULT_CAPTURE_MODE = CaptureMode(1920, 1080, MAX_FPS, "MJPG")
+
+
+# Definitions from linux/videodev2.h
+_V4L2_BUF_TYPE_VIDEO_CAPTURE = 1
+_V4L2_FRMSIZE_TYPE_DISCRETE = 1
+_V4L2_FRMIVAL_TYPE_DISCRETE = 1
+_FMTDESC = struct.Struct("II I32sII12x")  # index, type, flags, description, fourcc, ...
+_FRMSIZEENUM = struct.Struct("III6I8x")  # index, fourcc, type, discrete|stepwise
+_FRMIVALENUM = struct.Struct("IIIII6I8x")  # index, fourcc, w, h, type, discrete|...
+
+
+def _iowr(nr: int, size: int) -> int:
+    return (3 << 30) | (size << 16) | (ord("V") << 8) | nr
+
+
+_VIDIOC_ENUM_FMT = _iowr(2, _FMTDESC.size)
+_VIDIOC_ENUM_FRAMESIZES = _iowr(74, _FRMSIZEENUM.size)
+_VIDIOC_ENUM_FRAMEINTERVALS = _iowr(75, _FRMIVALENUM.size)
+
+
+def _enumerate(
+    fd: int, request: int, layout: struct.Struct, *fields: int
+) -> Iterator[tuple]:
+    """Call an enumerating ioctl with increasing index, until the driver refuses.
+
+    Args:
+        fd: File descriptor of the device.
+        request: ioctl request code.
+        layout: Layout of the struct passed to the ioctl.
+        fields: Input fields following the index. The rest of the struct is zeroed.
+
+    Yields:
+        Unpacked structs filled by the driver.
+    """
+    for index in range(256):
+        buffer = bytearray(layout.size)
+        struct.pack_into(f"{1 + len(fields)}I", buffer, 0, index, *fields)
+        try:
+            fcntl.ioctl(fd, request, buffer)
+        except OSError:
+            return
+        yield layout.unpack(buffer)
+
+
+def _fourcc_to_str(fourcc: int) -> str:
+    return fourcc.to_bytes(4, "little").decode("ascii", errors="replace").strip()
+
+
+def list_v4l2_modes(device: Path) -> list[CaptureMode]:
+    """List the capture modes a V4L2 device supports, via ioctl.
+
+    Continuous and stepwise frame sizes are represented by their largest and smallest
+    size, frame interval ranges by their highest frame rate.
+
+    Args:
+        device: Device file, e.g. /dev/video0.
+
+    Returns:
+        Supported modes, or an empty list, if they can't be listed.
+    """
+    modes: list[CaptureMode] = []
+    try:
+        fd = os.open(device, os.O_RDWR | os.O_NONBLOCK)
+    except OSError as exc:
+        logger.debug("Can't list modes of %s: %s", device, exc)
+        return []
+    try:
+        formats = _enumerate(
+            fd, _VIDIOC_ENUM_FMT, _FMTDESC, _V4L2_BUF_TYPE_VIDEO_CAPTURE
+        )
+        for fmt in formats:
+            fourcc = fmt[4]
+            for size in _enumerate(fd, _VIDIOC_ENUM_FRAMESIZES, _FRMSIZEENUM, fourcc):
+                size_type, values = size[2], size[3:]
+                if size_type == _V4L2_FRMSIZE_TYPE_DISCRETE:
+                    sizes = [(values[0], values[1])]
+                else:  # min_width, max_width, step_width, min_height, max_height, ...
+                    sizes = [(values[1], values[4]), (values[0], values[3])]
+                for width, height in sizes:
+                    modes.extend(
+                        CaptureMode(width, height, fps, _fourcc_to_str(fourcc))
+                        for fps in _list_fps(fd, fourcc, width, height)
+                    )
+    finally:
+        os.close(fd)
+    logger.debug("Modes of %s: %s", device, ", ".join(str(m) for m in modes))
+    return modes
+
+
+def _list_fps(fd: int, fourcc: int, width: int, height: int) -> list[float]:
+    rates = []
+    for interval in _enumerate(
+        fd, _VIDIOC_ENUM_FRAMEINTERVALS, _FRMIVALENUM, fourcc, width, height
+    ):
+        # Intervals are fractions of seconds. Ranges start with the min interval.
+        interval_type, numerator, denominator = interval[4], interval[5], interval[6]
+        if numerator:
+            rates.append(round(denominator / numerator, 2))
+        if interval_type != _V4L2_FRMIVAL_TYPE_DISCRETE:
+            break
+    return rates
+
+
+def choose_mode(  # noqa: PLR0913
+    modes: Sequence[CaptureMode],
+    required_wh: tuple[float, float],
+    current: CaptureMode | None = None,
+    aspect_ratio: float | None = None,
+    min_fps: float = 30,
+    headroom: float = 0.25,
+) -> CaptureMode | None:
+    """Choose the cheapest mode delivering enough pixels.
+
+    Modes, which don't reach min_fps or change the field of view (by a different
+    aspect ratio), are only used if there are no others. Per resolution, the preferred
+    pixel format with the highest frame rate up to MAX_FPS is used.
+
+    To avoid renegotiating back and forth, e.g. while zooming, a lower mode is only
+    chosen, if it covers the required size plus some headroom. The current mode is
+    kept as long as it covers the required size.
+
+    Args:
+        modes: Modes supported by the camera.
+        required_wh: Required capture resolution.
+        current: Mode currently in use.
+        aspect_ratio: Width / height of the field of view to keep.
+        min_fps: Frame rate a mode should reach.
+        headroom: Additional relative size, a lower mode has to cover.
+
+    Returns:
+        Chosen mode, or None if no modes are known.
+    """
+    candidates = _filter_or_keep(modes, lambda m: m.fps >= min_fps)
+    if aspect_ratio:
+        candidates = _filter_or_keep(
+            candidates,
+            lambda m: math.isclose(m.width / m.height, aspect_ratio, rel_tol=0.02),
+        )
+    if not candidates:
+        return None
+
+    candidates = sorted(candidates, key=_cost)
+    with_headroom = (required_wh[0] * (1 + headroom), required_wh[1] * (1 + headroom))
+    target = next(
+        (m for m in candidates if m.covers(with_headroom)),
+        next((m for m in candidates if m.covers(required_wh)), candidates[-1]),
+    )
+    if current and current.covers(required_wh) and current.pixels <= target.pixels:
+        return current
+    return target
+
+
+def _filter_or_keep(
+    modes: Sequence[CaptureMode], condition: Callable[[CaptureMode], bool]
+) -> list[CaptureMode]:
+    return [m for m in modes if condition(m)] or list(modes)
+
+
+def _cost(mode: CaptureMode) -> tuple:
+    """Sort key, cheapest first. Among modes of equal resolution, the best first."""
+    fourcc_rank = (
+        PREFERRED_FOURCCS.index(mode.fourcc)
+        if mode.fourcc in PREFERRED_FOURCCS
+        else len(PREFERRED_FOURCCS)
+    )
+    return (mode.pixels, mode.fps > MAX_FPS, fourcc_rank, -mode.fps)
+
+
+class ModeSelector:
+    """Decide when to renegotiate the capture mode.
+
+    Renegotiating interrupts the stream for a moment, so a newly chosen mode has to
+    stay the choice for a while, before it is applied. Higher modes are applied
+    quickly, as the image quality suffers until then. Lower modes only save power, so
+    they wait longer, e.g. until a zoom motion came to rest.
+
+    Args:
+        modes: Modes supported by the camera.
+        aspect_ratio: Width / height of the field of view to keep.
+        min_fps: Frame rate a mode should reach.
+        upgrade_delay: Seconds a higher mode has to stay the choice.
+        downgrade_delay: Seconds a lower mode has to stay the choice.
+        clock: Time source, for testing.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        modes: Sequence[CaptureMode],
+        aspect_ratio: float | None = None,
+        min_fps: float = 30,
+        upgrade_delay: float = 0.3,
+        downgrade_delay: float = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.modes = modes
+        self.aspect_ratio = aspect_ratio
+        self.min_fps = min_fps
+        self.upgrade_delay = upgrade_delay
+        self.downgrade_delay = downgrade_delay
+        self._clock = clock
+        self._candidate: CaptureMode | None = None
+        self._candidate_since = 0.0
+
+    def update(
+        self, required_wh: tuple[float, float], current: CaptureMode
+    ) -> CaptureMode | None:
+        """Check, if the capture mode should be changed.
+
+        Args:
+            required_wh: Required capture resolution.
+            current: Mode currently in use.
+
+        Returns:
+            Mode to switch to, or None to keep the current one.
+        """
+        target = choose_mode(
+            self.modes,
+            required_wh,
+            current=current,
+            aspect_ratio=self.aspect_ratio,
+            min_fps=self.min_fps,
+        )
+        if target is None or target == current:
+            self._candidate = None
+            return None
+
+        now = self._clock()
+        if target != self._candidate:
+            self._candidate = target
+            self._candidate_since = now
+        is_upgrade = not current.covers((target.width, target.height))
+        delay = self.upgrade_delay if is_upgrade else self.downgrade_delay
+        if now - self._candidate_since < delay:
+            return None
+
+        self._candidate = None
+        logger.info("Change capture mode from %s to %s.", current, target)
+        return target
@@ -0,0 +1,29 @@
+import importlib
+import os
+import sys
+
+# Headless subcommands, each a module of this package with a main(argv) function
+SUBCOMMANDS = ("bench", "render", "headless", "evaluate")
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Start the GUI, or run one of the headless subcommands.
+
+    The subcommands are dispatched before importing the GUI, so they also work on
+    machines without GTK.
+
+    Args:
+        argv: Command line arguments. Defaults to the ones of the current process.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    # Hide warnings shown during search for cameras
+    os.environ.setdefault("OPENCV_LOG_LEVEL", "FATAL")
+
+    if argv and argv[0] in SUBCOMMANDS:
+        subcommand = importlib.import_module(f"myhumbleself.{argv[0]}")
+        subcommand.main(argv[1:])
+        return
+
+    from myhumbleself import app
+
+    app.main(argv)
@@ -1,7 +1,11 @@
+import io
 import logging
 import os
+import tempfile
+import threading
 from configparser import ConfigParser
 from pathlib import Path
+from typing import Any
 
 if xdg_conf := os.getenv("XDG_CONFIG_HOME", None):
     CONFIG_PATH = Path(xdg_conf) / "myhumbleself"
@@ -13,23 +17,97 @@ logger = logging.getLogger("myhumbleself")
 
 
 class WritingConfigParser(ConfigParser):
+    """Config parser, which persists changed values to disk.
+
+    Changes are written behind: Every change (re)starts a timer, and the file is only
+    written once no further change happened for write_delay seconds, e.g. after a
+    move button was clicked repeatedly. The write happens in the timer's thread, not
+    in the GTK main loop. flush() writes pending changes immediately, e.g. at shutdown.
+
+    The values are only locked while they are serialized, not while the file is
+    written, so changes never wait for the disk.
+
+    Args:
+        path: File to write the config to.
+        write_delay: Seconds without changes, after which the file is written.
+    """
+
+    def __init__(
+        self,
+        *args: Any,  # noqa: ANN401
+        path: Path = CONFIG_FILE,
+        write_delay: float = 1.0,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.path = path
+        self.write_delay = write_delay
+        self._lock = threading.RLock()
+        # Held while writing, so concurrent flushes write in order of serialization
+        self._write_lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+        self._dirty = False
+
     def set_persistent(
         self, option: str, value: str | bool | float, section: str = "main"
     ) -> None:
-        """Updates the config file on disk, in case the value has changed.
+        """Updates the value and schedules writing the config file.
 
         Args:
             section: Config section in the toml file.
             option: Setting name in the section.
             value: Setting value to be updated.
         """
-        if self.get(section, option) == str(value):
-            return
-        self.set(section, option, str(value))
-        if not CONFIG_FILE.parent.exists():
-            CONFIG_FILE.parent.mkdir(exist_ok=True, parents=True)
+        with self._lock:
+            if self.get(section, option) == str(value):
+                return
+            self.set(section, option, str(value))
+            self._dirty = True
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.write_delay, self.flush)
+            self._timer.name = "config-writer"
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """Write pending changes to the config file, if there are any."""
+        with self._write_lock:
+            with self._lock:
+                if self._timer:
+                    self._timer.cancel()
+                    self._timer = None
+                if not self._dirty:
+                    return
+                content = io.StringIO()
+                self.write(content)
+                self._dirty = False
+            try:
+                self._write_atomic(content.getvalue())
+            except OSError:
+                logger.exception("Couldn't write config to %s.", self.path)
+                with self._lock:
+                    self._dirty = True
 
-        self.write(CONFIG_FILE.open("w"))
+    def _write_atomic(self, content: str) -> None:
+        """Write to a temporary file first, then replace the config file by it.
+
+        This way, the config file is never left half-written, e.g. on a crash.
+        """
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        fd, tmp_name = tempfile.mkstemp(
+            dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as fh:
+                fh.write(content)
+                fh.flush()
+                os.fsync(fh.fileno())
+            Path(tmp_name).replace(self.path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        logger.debug("Wrote config to %s.", self.path)
 
 
 def load() -> WritingConfigParser:
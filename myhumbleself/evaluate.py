@@ -0,0 +1,461 @@
+import argparse
+import json
+import logging
+import sys
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from myhumbleself import face_detection
+
+logger = logging.getLogger(__name__)
+
+DEMO_VIDEO = Path(__file__).parent / "resources" / "demo.mp4"
+
+# Quality metrics compared with baselines, all lower is better, with the absolute
+# slack allowed on top of the relative tolerance. Costs depend on the machine, they
+# are covered by the benchmarks instead, see tests/test_benchmarks.py.
+QUALITY_METRICS = {
+    "error_px": 2.0,
+    "jitter_px": 0.25,
+    "converge_seconds_mean": 0.1,
+    "converge_seconds_max": 0.2,
+    "unconverged": 0,
+    "lag_seconds": 0.1,
+    "misses": 2,
+}
+
+# A tracked face is on target, if center and height are off by less than this fraction
+# of the face height
+CONVERGED_FACTOR = 0.1
+# Changes of the ground truth between two frames larger than this fraction of the face
+# height are jumps (e.g. a cut), smaller ones are motion.
+JUMP_FACTOR = 0.05
+# Changes of the ground truth up to this fraction of the face height count as still,
+# to tolerate rounding of annotated boxes
+STILL_FACTOR = 0.002
+
+
+@dataclass
+class Clip:
+    """Video with ground truth face boxes, to evaluate detection and smoothing.
+
+    Attributes:
+        name: Name of the clip in reports and baselines.
+        fps: Frame rate, to convert frame counts into seconds.
+        truth: Ground truth box of the face per frame, as rows of (top, left, height,
+            width). NaN rows for frames without face.
+        frames: Returns an iterator over the BGR frames of the clip.
+    """
+
+    name: str
+    fps: float
+    truth: np.ndarray
+    frames: Callable[[], Iterator[np.ndarray]]
+
+
+def load_clip(path: Path) -> Clip:
+    """Load a recorded clip with annotations.
+
+    The annotation is a JSON file with the keys "video" (path of the video, relative
+    to the JSON file), "fps" and "boxes" (one [top, left, height, width] or null per
+    frame of the video).
+
+    Args:
+        path: Annotation file.
+
+    Returns:
+        Clip, reading the frames from the video file.
+    """
+    annotation = json.loads(path.read_text())
+    video = path.parent / annotation["video"]
+    truth = np.array(
+        [box if box is not None else [np.nan] * 4 for box in annotation["boxes"]],
+        dtype=float,
+    )
+
+    def frames() -> Iterator[np.ndarray]:
+        capture = cv2.VideoCapture(str(video))
+        try:
+            for _ in range(len(truth)):
+                ok, frame = capture.read()
+                if not ok:
+                    return
+                yield frame
+        finally:
+            capture.release()
+
+    return Clip(name=path.stem, fps=annotation["fps"], truth=truth, frames=frames)
+
+
+def _detect_largest_face(image: np.ndarray) -> np.ndarray:
+    """Unsmoothed box of the largest face."""
+    detection = face_detection.FaceDetection()
+    faces = detection._detect_faces_cnn(
+        detection._downscale(image, target_width=detection.detection_width),
+        size_hw=(image.shape[0], image.shape[1]),
+    )
+    face = detection._select_largest_face(faces)
+    if face is None:
+        raise ValueError("No face found to create a clip from.")
+    return np.array(face.geometry, dtype=float)
+
+
+def motion_clip(
+    image: np.ndarray | None = None, fps: float = 30, name: str = "motion"
+) -> Clip:
+    """Create a clip by moving a still image along a scripted path.
+
+    The image is shifted and scaled around the face, so the ground truth is known
+    exactly: The face box of the still image, transformed the same way. The box of the
+    still image is detected once, without smoothing, so the metrics cover the tracking
+    and smoothing, not the bias of the detector.
+
+    The script: hold still, jump sideways, hold, jump closer, hold, move back smoothly,
+    hold.
+
+    Args:
+        image: BGR image with a face. Defaults to the first frame of the demo video.
+        fps: Frame rate of the clip.
+        name: Name of the clip.
+
+    Returns:
+        Clip, generating the frames on the fly.
+    """
+    if image is None:
+        capture = cv2.VideoCapture(str(DEMO_VIDEO))
+        image = capture.read()[1]
+        capture.release()
+    face = _detect_largest_face(image)
+    center_y, center_x = face[0] + face[2] / 2, face[1] + face[3] / 2
+    jump = image.shape[1] * 0.1
+
+    def hold(seconds: float, state: tuple) -> list:
+        return [state] * round(seconds * fps)
+
+    def move(
+        seconds: float,
+        start: tuple[float, float, float],
+        end: tuple[float, float, float],
+    ) -> list:
+        steps = round(seconds * fps)
+        return [
+            tuple(np.add(start, np.subtract(end, start) * (i + 1) / steps))
+            for i in range(steps)
+        ]
+
+    # Offset x, offset y and scale per frame
+    script = np.array(
+        [
+            *hold(1.5, (0, 0, 1)),
+            *hold(2, (jump, 0, 1)),
+            *hold(2, (jump, 0, 1.3)),
+            *move(2, (jump, 0, 1.3), (0, 0, 1)),
+            *hold(1.5, (0, 0, 1)),
+        ]
+    )
+    dx, dy, scale = script.T
+    truth = np.column_stack(
+        [
+            center_y + dy - face[2] * scale / 2,
+            center_x + dx - face[3] * scale / 2,
+            face[2] * scale,
+            face[3] * scale,
+        ]
+    )
+
+    def frames() -> Iterator[np.ndarray]:
+        for offset_x, offset_y, factor in script:
+            # Scale around the face's center, then shift
+            matrix = np.array(
+                [
+                    [factor, 0, (1 - factor) * center_x + offset_x],
+                    [0, factor, (1 - factor) * center_y + offset_y],
+                ]
+            )
+            yield cv2.warpAffine(
+                image,
+                matrix,
+                (image.shape[1], image.shape[0]),
+                flags=cv2.INTER_LINEAR,
+                borderMode=cv2.BORDER_REPLICATE,
+            )
+
+    return Clip(name=name, fps=fps, truth=truth, frames=frames)
+
+
+def replay(
+    clip: Clip, detection: face_detection.FaceDetection | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Run detection and smoothing over all frames of a clip.
+
+    Args:
+        clip: Clip to replay.
+        detection: Face detection to evaluate, e.g. with adjusted tunables.
+
+    Returns:
+        Tracked box per frame (NaN rows if there was none), and the seconds
+        get_faces() took per frame.
+    """
+    detection = detection or face_detection.FaceDetection()
+    tracked = np.full((len(clip.truth), 4), np.nan)
+    seconds = np.zeros(len(clip.truth))
+    for index, frame in enumerate(clip.frames()):
+        started = time.perf_counter()
+        faces = detection.get_faces(frame)
+        seconds[index] = time.perf_counter() - started
+        if len(faces):
+            tracked[index] = faces[0]
+    return tracked, seconds
+
+
+def _center_and_height(boxes: np.ndarray) -> np.ndarray:
+    return np.column_stack(
+        [
+            boxes[:, 0] + boxes[:, 2] / 2,
+            boxes[:, 1] + boxes[:, 3] / 2,
+            boxes[:, 2],
+        ]
+    )
+
+
+def evaluate(
+    truth: np.ndarray, tracked: np.ndarray, seconds: np.ndarray, fps: float
+) -> dict:
+    """Compare tracked boxes with the ground truth.
+
+    The frames are classified by the change of the ground truth since the previous
+    frame: still, moving or jumping (see JUMP_FACTOR). The first frame counts as jump,
+    as the tracking starts from scratch.
+
+    Args:
+        truth: Ground truth boxes, NaN rows for frames without face.
+        tracked: Tracked boxes, NaN rows for frames without tracked face.
+        seconds: Processing time per frame.
+        fps: Frame rate of the clip.
+
+    Returns:
+        Metrics, in pixels of the frames and seconds of the clip:
+        - error_px: Mean distance of the tracked center from the truth.
+        - jitter_px: Mean change of the tracked center and height between still
+          frames, once the tracking converged.
+        - converge_seconds_mean, _max: Time after jumps until the tracked face stays
+          on target (see CONVERGED_FACTOR) for the rest of the still period.
+        - unconverged: Jumps after which the tracked face never got on target.
+        - lag_seconds: Delay of the tracked face behind a moving face, as the time
+          shift which fits best.
+        - misses: Frames with face, but without tracked face.
+        - cost_ms_mean, cost_ms_p90: Processing time per frame.
+    """
+    truth_ch = _center_and_height(truth)
+    tracked_ch = _center_and_height(tracked)
+    height = truth_ch[:, 2]
+    offset = np.abs(tracked_ch - truth_ch)
+    error = np.hypot(offset[:, 0], offset[:, 1])
+    on_target = (offset <= (height * CONVERGED_FACTOR)[:, None]).all(axis=1)
+
+    change = np.zeros(len(truth))
+    change[1:] = np.abs(np.diff(truth_ch, axis=0)).sum(axis=1)
+    jumping = change > height * JUMP_FACTOR
+    jumping[0] = True
+    still = ~jumping & (change <= height * STILL_FACTOR)
+    moving = ~jumping & ~still
+
+    converge_frames, unconverged = [], 0
+    settled = np.zeros(len(truth), dtype=bool)
+    for start in np.flatnonzero(jumping):
+        # Period until the face moves or jumps again
+        end = start + 1
+        while end < len(truth) and still[end]:
+            end += 1
+        # First frame, after which the face stays on target until the end of the period
+        off_target = np.flatnonzero(~on_target[start:end])
+        if len(off_target) == end - start:
+            unconverged += 1
+            continue
+        first = start + (off_target[-1] + 1 if len(off_target) else 0)
+        converge_frames.append(first - start)
+        settled[first:end] = True
+
+    tracked_change = np.zeros(len(truth))
+    tracked_change[1:] = np.abs(np.diff(tracked_ch, axis=0)).sum(axis=1)
+    jitter_frames = still & settled & np.roll(settled, 1)
+
+    return {
+        "frames": len(truth),
+        "error_px": _mean(error),
+        "jitter_px": _mean(tracked_change[jitter_frames]),
+        "converge_seconds_mean": _mean(np.array(converge_frames)) / fps,
+        "converge_seconds_max": float(max(converge_frames, default=0)) / fps,
+        "unconverged": unconverged,
+        "lag_seconds": _best_lag(truth_ch, tracked_ch, moving, max_lag=round(fps))
+        / fps,
+        "misses": int((~np.isnan(truth[:, 0]) & np.isnan(tracked[:, 0])).sum()),
+        "cost_ms_mean": float(seconds.mean() * 1000) if len(seconds) else 0.0,
+        "cost_ms_p90": float(np.percentile(seconds, 90) * 1000)
+        if len(seconds)
+        else 0.0,
+    }
+
+
+def _mean(values: np.ndarray) -> float:
+    values = values[~np.isnan(values)]
+    return float(values.mean()) if len(values) else 0.0
+
+
+def _best_lag(
+    truth_ch: np.ndarray, tracked_ch: np.ndarray, moving: np.ndarray, max_lag: int
+) -> int:
+    """Frames the tracked face is behind the truth, while the face moves."""
+    frames = np.flatnonzero(moving)
+    if not len(frames):
+        return 0
+    errors = []
+    for lag in range(max_lag + 1):
+        current = frames[frames >= lag]
+        offset = tracked_ch[current, :2] - truth_ch[current - lag, :2]
+        errors.append(_mean(np.hypot(offset[:, 0], offset[:, 1])))
+    return int(np.argmin(errors))
+
+
+def compare(metrics: dict, baseline: dict, tolerance: float = 0.1) -> list[str]:
+    """Check the quality metrics for regressions.
+
+    Args:
+        metrics: Metrics of the current run, see evaluate().
+        baseline: Metrics of the baseline run.
+        tolerance: Allowed relative increase, on top of the absolute slack of the
+            metric, see QUALITY_METRICS.
+
+    Returns:
+        Descriptions of the metrics which got worse.
+    """
+    return [
+        f"{name}: {metrics[name]:.3f}, baseline {baseline[name]:.3f}"
+        for name, slack in QUALITY_METRICS.items()
+        if name in baseline and metrics[name] > baseline[name] * (1 + tolerance) + slack
+    ]
+
+
+def format_table(results: dict[str, dict]) -> str:
+    """Render the metrics of several clips as text table."""
+    names = [*QUALITY_METRICS, "cost_ms_mean", "cost_ms_p90"]
+    lines = ["{:<24}".format("metric") + "".join(f"{c:>12}" for c in results)]
+    lines.extend(
+        f"{name:<24}"
+        + "".join(f"{metrics[name]:>12.3f}" for metrics in results.values())
+        for name in names
+    )
+    return "\n".join(lines) + "\n"
+
+
+def _parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Configure and process cli arguments of the evaluate subcommand.
+
+    Args:
+        argv: Arguments to parse, without the subcommand.
+
+    Returns:
+        Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog="myhumbleself evaluate",
+        description=(
+            "Replay clips with ground truth face boxes through face detection and "
+            "smoothing, and report jitter, convergence time, lag and cost."
+        ),
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Enable info logging."
+    )
+    parser.add_argument(
+        "clips",
+        type=Path,
+        nargs="*",
+        metavar="CLIP",
+        help="Annotation JSON of a recorded clip. Default: a clip created from the "
+        "demo video, with known motion.",
+    )
+    parser.add_argument("--fluctuation-threshold-factor", type=float, default=None)
+    parser.add_argument("--follow-face-speed-factor", type=float, default=None)
+    parser.add_argument("--max-history-len", type=int, default=None)
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="Compare with the metrics stored in this JSON file.",
+    )
+    parser.add_argument(
+        "--update", action="store_true", help="Store the metrics as new baseline."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed relative regression. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Print the results as JSON."
+    )
+    return parser.parse_args(argv)
+
+
+def create_detection(
+    fluctuation_threshold_factor: float | None = None,
+    follow_face_speed_factor: float | None = None,
+    max_history_len: int | None = None,
+) -> face_detection.FaceDetection:
+    """Face detection with adjusted tunables. None keeps the default."""
+    detection = face_detection.FaceDetection()
+    if fluctuation_threshold_factor is not None:
+        detection.fluctuation_threshold_factor = fluctuation_threshold_factor
+    if follow_face_speed_factor is not None:
+        detection.follow_face_speed_factor = follow_face_speed_factor
+    if max_history_len is not None:
+        detection._max_history_len = max_history_len
+    return detection
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    clips = [load_clip(path) for path in args.clips] or [motion_clip()]
+    results = {}
+    for clip in clips:
+        detection = create_detection(
+            fluctuation_threshold_factor=args.fluctuation_threshold_factor,
+            follow_face_speed_factor=args.follow_face_speed_factor,
+            max_history_len=args.max_history_len,
+        )
+        tracked, seconds = replay(clip, detection)
+        results[clip.name] = evaluate(clip.truth, tracked, seconds, fps=clip.fps)
+
+    sys.stdout.write(
+        json.dumps(results, indent=2) + "\n" if args.json else format_table(results)
+    )
+
+    if args.baseline and args.update:
+        # Only the quality metrics, the costs would change with every machine
+        baselines = {
+            name: {key: round(metrics[key], 4) for key in QUALITY_METRICS}
+            for name, metrics in results.items()
+        }
+        args.baseline.write_text(json.dumps(baselines, indent=2) + "\n")
+        return
+    if args.baseline:
+        baselines = json.loads(args.baseline.read_text())
+        regressions = [
+            f"{name} {regression}"
+            for name, metrics in results.items()
+            for regression in compare(
+                metrics, baselines.get(name, {}), tolerance=args.tolerance
+            )
+        ]
+        if regressions:
+            sys.exit("Regressions:\n" + "\n".join(regressions))
@@ -1,28 +1,80 @@
+import contextlib
 import logging
+import multiprocessing
+import queue
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
 from pathlib import Path
 
 import cv2
 import numpy as np
 
+from myhumbleself import tracking
 from myhumbleself.structures import Rect
 
 logger = logging.getLogger(__name__)
 
 
+def _to_rects(
+    detections: np.ndarray,
+    image_hw: tuple[int, int],
+    size_hw: tuple[int, int],
+    top: int = 0,
+) -> list[Rect]:
+    """Convert detections of FaceDetectorYN to Rects and scale them back up.
+
+    Args:
+        detections: Detected faces, one row per face, starting with x, y, w, h.
+        image_hw: Size of the (downscaled) image the detections refer to.
+        size_hw: Size the returned coordinates should refer to.
+        top: Offset of the image, if it is a tile of a larger one.
+
+    Returns:
+        Face areas.
+    """
+    scale_factor_y = image_hw[0] / size_hw[0]
+    scale_factor_x = image_hw[1] / size_hw[1]
+    return [
+        Rect(
+            left=int(data[0] / scale_factor_x),
+            top=int((data[1] - top) / scale_factor_y),
+            width=int(data[2] / scale_factor_x),
+            height=int(data[3] / scale_factor_y),
+        )
+        for data in detections
+    ]
+
+
 class FaceDetection:
     cnn_onnx = str(
         Path(__file__).parent / "resources" / "face_detection_yunet_2023mar_int8.onnx"
     )
 
-    def __init__(self) -> None:
+    def __init__(self, detector: cv2.FaceDetectorYN | None = None) -> None:
         self._history: list[Rect] = []
         self._max_history_len = 20
         self._last_smoothed_geometry: Rect | None = None
-        self._detector_cnn = cv2.FaceDetectorYN.create(self.cnn_onnx, "", (42, 42))
+        self._detector_cnn = detector or self.create_detector()
 
+        # Max side length of the image used for detection. Lower values are faster,
+        # but might miss faces. 250px is based on little testing.
+        self.detection_width = 250
         self.fluctuation_threshold_factor = 0.03
         self.follow_face_speed_factor = 0.2
         self.debug_mode = False
+        # Track all faces, instead of the largest one only
+        self.group_framing = False
+        self._tracks = tracking.FaceTracks()
+
+    @staticmethod
+    def create_detector() -> cv2.FaceDetectorYN:
+        return cv2.FaceDetectorYN.create(FaceDetection.cnn_onnx, "", (42, 42))
 
     @staticmethod
     def _draw_bounding_box(
@@ -36,10 +88,9 @@ class FaceDetection:
             thickness=2,
         )
 
-    def _detect_faces_cnn(self, image: np.ndarray) -> list[Rect]:
+    @staticmethod
+    def _downscale(image: np.ndarray, target_width: int) -> np.ndarray:
         # Scale down to speed up and improve detection
-        # TODO: Make instance variable, expose via cli?
-        target_width = 250  # based on little testing
         scale_factor = target_width / max(image.shape)
         image = cv2.resize(
             image,
@@ -48,22 +99,17 @@ class FaceDetection:
             fy=scale_factor,
             interpolation=cv2.INTER_NEAREST,
         )
+        return image
 
+    def _detect_faces_cnn(
+        self, image: np.ndarray, size_hw: tuple[int, int]
+    ) -> list[Rect]:
         # Detect faces
         self._detector_cnn.setInputSize((image.shape[1], image.shape[0]))
         face_detections = self._detector_cnn.detect(image)
-
-        # Convert to Rect objects and scale back up
-        faces: list[Rect] = []
-        if face_detections[1] is not None:
-            for data in face_detections[1]:
-                left = int(data[0] / scale_factor)
-                top = int(data[1] / scale_factor)
-                width = int(data[2] / scale_factor)
-                height = int(data[3] / scale_factor)
-                faces.append(Rect(left=left, top=top, width=width, height=height))
-
-        return faces
+        if face_detections[1] is None:
+            return []
+        return _to_rects(face_detections[1], image_hw=image.shape[:2], size_hw=size_hw)
 
     @staticmethod
     def _select_largest_face(faces: list[Rect]) -> Rect | None:
@@ -86,36 +132,31 @@ class FaceDetection:
             self._last_smoothed_geometry = smoothed_geometry
             return smoothed_geometry
 
-        # Stabilize dimensions by comparing with the last mean_rect
-        for attr in ["left", "top", "width", "height"]:
-            new_val = getattr(smoothed_geometry, attr)
-            old_val = getattr(self._last_smoothed_geometry, attr)
-            if abs(new_val - old_val) <= old_val * self.fluctuation_threshold_factor:
-                # Use old value to avoid fluctuations
-                setattr(smoothed_geometry, attr, old_val)
-            else:
-                # Move into direction of the new value, but smoothly to avoid jumps
-                distance = new_val - old_val
-                step_size = abs(distance) * self.follow_face_speed_factor
-                correction_step = int(np.sign(distance) * max(1, step_size))
-                setattr(smoothed_geometry, attr, old_val + correction_step)
+        # Stabilize dimensions by comparing with the last mean_rect. Small changes are
+        # ignored to avoid fluctuations, bigger ones are followed smoothly.
+        top, left, height, width = tracking.stabilize(
+            last=np.array(self._last_smoothed_geometry.geometry),
+            new=np.array(smoothed_geometry.geometry),
+            threshold_factor=self.fluctuation_threshold_factor,
+            speed_factor=self.follow_face_speed_factor,
+        ).tolist()
+        smoothed_geometry = Rect(top=top, left=left, height=height, width=width)
 
         self._last_smoothed_geometry = smoothed_geometry
         return smoothed_geometry
 
-    def get_face(self, image: np.ndarray) -> Rect:
+    def _track_face(self, faces: list[Rect], image_size_hw: tuple[int, int]) -> Rect:
         if not self._history:
             # Start with full image
             self._history.append(
-                Rect(top=0, left=0, width=image.shape[1] - 1, height=image.shape[0] - 1)
+                Rect(
+                    top=0,
+                    left=0,
+                    width=image_size_hw[1] - 1,
+                    height=image_size_hw[0] - 1,
+                )
             )
 
-        faces = self._detect_faces_cnn(image)
-
-        if self.debug_mode:
-            for f in faces:
-                self._draw_bounding_box(image, f, color=(0, 125, 0))
-
         face = self._select_largest_face(faces=faces)
 
         if face:
@@ -124,3 +165,445 @@ class FaceDetection:
 
         face = self._smooth_geometry()
         return face
+
+    @staticmethod
+    def _draw_faces(
+        image: np.ndarray, faces: list[Rect], size_hw: tuple[int, int]
+    ) -> None:
+        for face in faces:
+            face_in_image = face.copy()
+            face_in_image.map_between(
+                source_size_hw=size_hw, target_size_hw=(image.shape[0], image.shape[1])
+            )
+            FaceDetection._draw_bounding_box(image, face_in_image, color=(0, 125, 0))
+
+    def _track_faces(
+        self, faces: list[Rect], image_size_hw: tuple[int, int]
+    ) -> np.ndarray:
+        """Track all faces in group framing mode, else the largest one.
+
+        Returns:
+            Boxes of the tracked faces, see tracking module. Might be empty in group
+            framing mode.
+        """
+        if not self.group_framing:
+            return np.array([self._track_face(faces, image_size_hw).geometry])
+        return self._tracks.update(np.array([f.geometry for f in faces]))
+
+    def get_faces(
+        self, image: np.ndarray, size_hw: tuple[int, int] | None = None
+    ) -> np.ndarray:
+        """Detect faces and track them over time.
+
+        Args:
+            image: BGR image to search in.
+            size_hw: Image size the returned coordinates refer to. Defaults to the size
+                of the image.
+
+        Returns:
+            Boxes of all tracked faces in group framing mode, else of the smoothed
+            largest face, as rows of (top, left, height, width).
+        """
+        size_hw = size_hw or (image.shape[0], image.shape[1])
+        small_image = self._downscale(image, target_width=self.detection_width)
+        faces = self._detect_faces_cnn(small_image, size_hw=size_hw)
+
+        if self.debug_mode:
+            self._draw_faces(image, faces, size_hw=size_hw)
+
+        return self._track_faces(faces, image_size_hw=size_hw)
+
+    def close(self) -> None:
+        """Release resources. Nothing to do, when running in-process."""
+
+
+class SharedFaceDetection(FaceDetection):
+    """Face detection of one video source, running on a FaceDetectionBatcher.
+
+    Downscaling, tracking and smoothing happen per source, only the inference is
+    shared. Create instances via FaceDetectionBatcher.client().
+    """
+
+    def __init__(self, batcher: "FaceDetectionBatcher") -> None:
+        super().__init__(detector=batcher.detector)
+        self._batcher = batcher
+
+    def _detect_faces_cnn(
+        self, image: np.ndarray, size_hw: tuple[int, int]
+    ) -> list[Rect]:
+        return self._batcher.detect(self, image, size_hw=size_hw)
+
+    def close(self) -> None:
+        """Stop waiting for this source in the batcher."""
+        self._batcher.unregister(self)
+
+
+# Source, downscaled frame, size the results refer to, and the future for the results
+_Request = tuple[SharedFaceDetection, np.ndarray, tuple[int, int], "Future[list[Rect]]"]
+
+
+class FaceDetectionBatcher:
+    """Run the face detection of several video sources in one worker thread.
+
+    The downscaled frames of all sources requesting a detection at about the same time
+    are stacked into one image, which is processed by a single inference. That keeps
+    the input size of the detector stable (changing it is expensive), and needs one
+    model instance only. Frames of sources which didn't request a detection for a while
+    (e.g. as they don't follow the face) are not waited for.
+
+    Args:
+        batch_window: Max seconds to wait for requests of other sources.
+        tile_gap: Empty pixel rows between the stacked frames, so faces at the edge of
+            a frame can't merge with the neighbouring one.
+        idle_after: Seconds without request, after which a source isn't waited for.
+    """
+
+    def __init__(
+        self, batch_window: float = 0.005, tile_gap: int = 16, idle_after: float = 0.5
+    ) -> None:
+        self.batch_window = batch_window
+        self.tile_gap = tile_gap
+        self.idle_after = idle_after
+        self.detector = FaceDetection.create_detector()
+        self._requests: queue.SimpleQueue[_Request | None] = queue.SimpleQueue()
+        # Time of the last request by source
+        self._last_requests: dict[SharedFaceDetection, float] = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="detection-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def client(self) -> SharedFaceDetection:
+        """Create the face detection for an additional video source."""
+        return SharedFaceDetection(self)
+
+    def unregister(self, client: SharedFaceDetection) -> None:
+        with self._lock:
+            self._last_requests.pop(client, None)
+
+    def detect(
+        self,
+        client: SharedFaceDetection,
+        image: np.ndarray,
+        size_hw: tuple[int, int],
+        timeout: float = 2,
+    ) -> list[Rect]:
+        """Detect faces in the downscaled frame of a source, as part of the next batch.
+
+        Args:
+            client: Source requesting the detection.
+            image: Downscaled BGR frame.
+            size_hw: Size the returned coordinates should refer to.
+            timeout: Max seconds to wait for the result.
+
+        Returns:
+            Detected faces, or none, if the batcher is closed or didn't respond.
+        """
+        future: Future[list[Rect]] = Future()
+        with self._lock:
+            self._last_requests[client] = time.monotonic()
+        self._requests.put((client, image, size_hw, future))
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            logger.exception("Shared face detection failed.")
+            return []
+
+    def close(self) -> None:
+        """Stop the worker thread. Pending requests are answered without faces."""
+        if not self._thread.is_alive():
+            return
+        self._requests.put(None)
+        self._thread.join()
+
+    def _active_sources(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            return sum(
+                now - last < self.idle_after for last in self._last_requests.values()
+            )
+
+    def _collect_batch(self, first: _Request) -> tuple[list[_Request], bool]:
+        """Wait a moment for the requests of the other active sources.
+
+        Every source waits for its result, so a batch contains one request per source.
+
+        Returns:
+            Requests of the batch, and whether to stop afterwards.
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self._active_sources():
+            try:
+                request = self._requests.get(
+                    timeout=max(0, deadline - time.monotonic())
+                )
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run(self) -> None:
+        logger.info("Face detection batcher started.")
+        stop = False
+        while not stop:
+            first = self._requests.get()
+            if first is None:
+                break
+            batch, stop = self._collect_batch(first)
+            try:
+                results = self._detect_batch([(r[1], r[2]) for r in batch])
+            except Exception as exc:
+                for request in batch:
+                    request[3].set_exception(exc)
+                continue
+            for request, faces in zip(batch, results, strict=True):
+                request[3].set_result(faces)
+
+        # Answer requests which arrived in the meantime
+        while True:
+            try:
+                pending = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if pending is not None:
+                pending[3].set_result([])
+        logger.info("Face detection batcher stopped.")
+
+    def _detect_batch(
+        self, batch: list[tuple[np.ndarray, tuple[int, int]]]
+    ) -> list[list[Rect]]:
+        """Detect faces in several downscaled frames by one inference.
+
+        Args:
+            batch: Downscaled BGR frames and the sizes their results should refer to.
+
+        Returns:
+            Detected faces, per frame.
+        """
+        if len(batch) == 1:
+            image = batch[0][0]
+            tops = [0]
+        else:
+            tops = np.cumsum(
+                [0] + [img.shape[0] + self.tile_gap for img, _ in batch[:-1]]
+            ).tolist()
+            image = np.zeros(
+                (
+                    tops[-1] + batch[-1][0].shape[0],
+                    max(img.shape[1] for img, _ in batch),
+                    3,
+                ),
+                dtype=np.uint8,
+            )
+            for (img, _), top in zip(batch, tops, strict=True):
+                image[top : top + img.shape[0], : img.shape[1]] = img
+
+        self.detector.setInputSize((image.shape[1], image.shape[0]))
+        detections = self.detector.detect(image)[1]
+        results: list[list[Rect]] = []
+        for (img, size_hw), top in zip(batch, tops, strict=True):
+            if detections is None:
+                results.append([])
+                continue
+            # Assign faces to the frame containing their center
+            centers_y = detections[:, 1] + detections[:, 3] / 2
+            in_tile = (centers_y >= top) & (centers_y < top + img.shape[0])
+            results.append(
+                _to_rects(
+                    detections[in_tile],
+                    image_hw=img.shape[:2],
+                    size_hw=size_hw,
+                    top=top,
+                )
+            )
+        return results
+
+
+def _detection_worker(
+    shm_name: str, slot_count: int, slot_size: int, conn: Connection
+) -> None:
+    """Entry point of the worker process used by FaceDetectionProcess.
+
+    Downscaled frames are read from a shared memory ring, requests & results are passed
+    as small tuples via the connection. Once the model is loaded, "ready" is sent.
+    """
+    # Shutdown is controlled by the parent process, e.g. via Ctrl+C in the terminal:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # The memory is owned by the parent process, which also unlinks it. Before 3.13,
+    # attaching registers it once more with the resource tracker, but spawned children
+    # share the tracker of the parent, which ignores the duplicate. Unregistering it
+    # here would remove the parent's registration.
+    shm = (
+        shared_memory.SharedMemory(name=shm_name, track=False)  # type: ignore
+        if sys.version_info >= (3, 13)
+        else shared_memory.SharedMemory(name=shm_name)
+    )
+    ring: np.ndarray = np.ndarray(
+        (slot_count, slot_size), dtype=np.uint8, buffer=shm.buf
+    )
+    detection = FaceDetection()
+    conn.send("ready")
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+
+        slot, height, width, size_hw, detection.group_framing = request
+        image = ring[slot, : height * width * 3].reshape((height, width, 3))
+        faces = detection._detect_faces_cnn(image, size_hw=size_hw)
+        boxes = detection._track_faces(faces, image_size_hw=size_hw)
+        conn.send((boxes.tolist(), [f.geometry for f in faces]))
+
+    del ring
+    shm.close()
+    conn.close()
+
+
+class FaceDetectionProcess:
+    """Face detection running in a separate worker process.
+
+    The expensive inference and the smoothing logic do not compete with the GUI for the
+    GIL. Frames are downscaled in the calling process and written to a shared memory
+    ring, so no image data gets pickled. Only the slot index and the resulting face
+    geometries are exchanged via a pipe. Crashed or hanging workers get restarted.
+
+    Starting a worker (spawning the process, importing OpenCV, loading the model) takes
+    much longer than a request. So the first request waits for the worker to report
+    ready, with the separate startup_timeout, before the per request timeout applies.
+
+    Args:
+        slot_count: Number of frames in the shared memory ring.
+        timeout: Max seconds to wait for the result of a request.
+        max_detection_width: Max width of the downscaled frames.
+        startup_timeout: Max seconds to wait for a started worker to be ready.
+    """
+
+    def __init__(
+        self,
+        slot_count: int = 4,
+        timeout: float = 2,
+        max_detection_width: int = 250,
+        startup_timeout: float = 30,
+    ) -> None:
+        self._slot_count = slot_count
+        self._max_detection_width = max_detection_width
+        # Max size of a downscaled BGR frame:
+        self._slot_size = max_detection_width * max_detection_width * 3
+        self._slot = 0
+        self._timeout = timeout
+        self._startup_timeout = startup_timeout
+        self._ready = False
+        self._last_faces: np.ndarray | None = None
+        self.detection_width = max_detection_width
+        self.debug_mode = False
+        self.group_framing = False
+
+        self._context = multiprocessing.get_context("spawn")
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=self._slot_count * self._slot_size
+        )
+        self._ring: np.ndarray = np.ndarray(
+            (self._slot_count, self._slot_size), dtype=np.uint8, buffer=self._shm.buf
+        )
+        self._conn: Connection
+        self._process: BaseProcess | None = None
+        self._start_worker()
+
+    def _start_worker(self) -> None:
+        self._ready = False
+        self._conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_detection_worker,
+            args=(self._shm.name, self._slot_count, self._slot_size, child_conn),
+            name="face-detection",
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        logger.info("Face detection worker process started.")
+
+    def _stop_worker(self) -> None:
+        if self._process is None:
+            return
+        with contextlib.suppress(OSError):
+            self._conn.send(None)
+        self._process.join(timeout=self._timeout)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._conn.close()
+        self._process = None
+        logger.info("Face detection worker process stopped.")
+
+    def _restart_worker(self) -> None:
+        logger.warning("Face detection worker process failed. Restarting.")
+        self._stop_worker()
+        self._start_worker()
+
+    def _wait_ready(self) -> bool:
+        """Wait for a started worker to load the model, see _detection_worker()."""
+        if self._ready:
+            return True
+        if not self._conn.poll(self._startup_timeout):
+            logger.error("Face detection worker did not start in time.")
+            return False
+        self._ready = self._conn.recv() == "ready"
+        return self._ready
+
+    def _request(self, request: tuple) -> tuple | None:
+        try:
+            if not self._wait_ready():
+                return None
+            self._conn.send(request)
+            if not self._conn.poll(self._timeout):
+                logger.error("Face detection worker did not respond in time.")
+                return None
+            return self._conn.recv()
+        except (EOFError, OSError):
+            logger.exception("Face detection worker not reachable.")
+            return None
+
+    def get_faces(
+        self, image: np.ndarray, size_hw: tuple[int, int] | None = None
+    ) -> np.ndarray:
+        size_hw = size_hw or (image.shape[0], image.shape[1])
+        small_image = FaceDetection._downscale(
+            image, target_width=min(self.detection_width, self._max_detection_width)
+        )
+        height, width = small_image.shape[:2]
+        self._slot = (self._slot + 1) % self._slot_count
+        self._ring[self._slot, : height * width * 3] = small_image.reshape(-1)
+
+        result = self._request((self._slot, height, width, size_hw, self.group_framing))
+        if result is None:
+            self._restart_worker()
+            if self._last_faces is None:
+                return np.array([[0, 0, size_hw[0] - 1, size_hw[1] - 1]])
+            return self._last_faces
+
+        boxes, face_geometries = result
+        if self.debug_mode:
+            faces = [
+                Rect(top=top, left=left, height=h, width=w)
+                for top, left, h, w in face_geometries
+            ]
+            FaceDetection._draw_faces(image, faces, size_hw=size_hw)
+
+        self._last_faces = np.array(boxes, dtype=int).reshape(-1, 4)
+        return self._last_faces
+
+    def close(self) -> None:
+        """Stop the worker process and free the shared memory."""
+        self._stop_worker()
+        del self._ring
+        self._shm.close()
+        self._shm.unlink()
@@ -0,0 +1,173 @@
+import logging
+import time
+from collections.abc import Callable, Mapping, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Recent durations in seconds per frame, by stage name
+StageTimes = Mapping[str, Sequence[float] | np.ndarray]
+
+
+@dataclass(frozen=True)
+class QualityLevel:
+    """Settings affecting the processing cost of a frame.
+
+    Attributes:
+        detect_every_n_frames: Run face detection only on every n-th frame.
+        detection_width: Max side length of images used for face detection.
+        capture_scale: Requested capture resolution, relative to the camera's default.
+        max_output_width: Downscale the output image to this width. None for no limit.
+    """
+
+    detect_every_n_frames: int
+    detection_width: int
+    capture_scale: float
+    max_output_width: int | None
+
+    def __str__(self) -> str:
+        output = f"{self.max_output_width}px" if self.max_output_width else "full"
+        return (
+            f"detect 1/{self.detect_every_n_frames} @ {self.detection_width}px, "
+            f"capture {self.capture_scale:.0%}, output {output}"
+        )
+
+
+# Ordered from best quality to lowest cost. Cheap quality losses (e.g. detection rate)
+# come first, visible ones (e.g. resolution) later.
+QUALITY_LEVELS = (
+    QualityLevel(1, 250, 1.0, None),
+    QualityLevel(2, 250, 1.0, None),
+    QualityLevel(3, 200, 1.0, 720),
+    QualityLevel(4, 160, 2 / 3, 540),
+    QualityLevel(6, 128, 1 / 2, 400),
+    QualityLevel(8, 96, 1 / 3, 320),
+)
+
+
+class QualityGovernor:
+    """Adapt the quality settings, so that the processing fits into a time budget.
+
+    The measured time per stage and frame is compared against the frame budget of the
+    target fps. As the stages run in parallel threads, the slowest stage determines the
+    achievable fps. Optionally, the summed up time of all stages is also compared to a
+    CPU budget (in cores).
+
+    To avoid oscillation, the quality is only changed if the load stays beyond the
+    thresholds for several consecutive evaluations, and the measurements are discarded
+    after every change. Returning to a level which turned out to be too expensive is
+    delayed with exponential backoff.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        target_fps: float = 30,
+        cpu_budget: float | None = None,
+        levels: tuple[QualityLevel, ...] = QUALITY_LEVELS,
+        interval: float = 1,
+        patience: int = 3,
+        step_down_load: float = 1.0,
+        step_up_load: float = 0.5,
+        backoff: float = 10,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.target_fps = target_fps
+        self.cpu_budget = cpu_budget
+        self.levels = levels
+        self.interval = interval
+        self.patience = patience
+        self.step_down_load = step_down_load
+        self.step_up_load = step_up_load
+        self.backoff = backoff
+        self._clock = clock
+
+        self.level_index = 0
+        self.load = 0.0
+        self.stage_loads: dict[str, float] = {}
+        self._over_budget_count = 0
+        self._under_budget_count = 0
+        self._last_update = self._clock()
+        # Per level: Earliest time to step up to it again, and the delay after that
+        self._retry_at: dict[int, float] = {}
+        self._retry_delay: dict[int, float] = {}
+
+    @property
+    def level(self) -> QualityLevel:
+        return self.levels[self.level_index]
+
+    def _calc_load(self, stage_times: StageTimes) -> float:
+        self.stage_loads = {
+            stage: float(np.mean(times)) * self.target_fps
+            for stage, times in stage_times.items()
+            if len(times)
+        }
+        if not self.stage_loads:
+            return 0.0
+        load = max(self.stage_loads.values())
+        if self.cpu_budget:
+            load = max(load, sum(self.stage_loads.values()) / self.cpu_budget)
+        return load
+
+    def update(self, stage_times: StageTimes) -> QualityLevel | None:
+        """Evaluate the latest stage timings, if the interval has passed.
+
+        Args:
+            stage_times: Recent durations in seconds per frame, by stage name.
+
+        Returns:
+            New quality level to be applied, or None if nothing changed.
+        """
+        now = self._clock()
+        if now - self._last_update < self.interval:
+            return None
+        self._last_update = now
+
+        self.load = self._calc_load(stage_times)
+        if self.load > self.step_down_load:
+            self._over_budget_count += 1
+            self._under_budget_count = 0
+        elif self.load < self.step_up_load:
+            self._under_budget_count += 1
+            self._over_budget_count = 0
+        else:
+            self._over_budget_count = 0
+            self._under_budget_count = 0
+
+        new_index = self.level_index
+        if self._over_budget_count >= self.patience:
+            new_index = min(self.level_index + 1, len(self.levels) - 1)
+        elif self._under_budget_count >= self.patience and now >= self._retry_at.get(
+            self.level_index - 1, 0
+        ):
+            new_index = max(self.level_index - 1, 0)
+
+        if new_index == self.level_index:
+            return None
+
+        if new_index > self.level_index:
+            delay = self._retry_delay.get(self.level_index, self.backoff)
+            self._retry_at[self.level_index] = now + delay
+            self._retry_delay[self.level_index] = min(delay * 2, 30 * self.backoff)
+
+        logger.info(
+            "Load %.2f, switching quality level %s -> %s: %s",
+            self.load,
+            self.level_index,
+            new_index,
+            self.levels[new_index],
+        )
+        self.level_index = new_index
+        self._over_budget_count = 0
+        self._under_budget_count = 0
+        return self.level
+
+    def describe(self) -> list[str]:
+        """Summarize the current decision, e.g. for the debug view."""
+        stages = ", ".join(f"{k} {v:.2f}" for k, v in self.stage_loads.items())
+        return [
+            f"Governor: {self.target_fps:.0f} fps target, load {self.load:.2f}",
+            f"Stage loads: {stages}",
+            f"Level {self.level_index}: {self.level}",
+        ]
@@ -0,0 +1,212 @@
+import argparse
+import logging
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+
+from myhumbleself import camera, sinks, structures, video_handler
+
+logger = logging.getLogger(__name__)
+
+
+def serve(
+    handler: video_handler.VideoHandler,
+    fps: float,
+    stop: threading.Event,
+    duration: float | None = None,
+) -> int:
+    """Render at a fixed rate instead of a display, so the sinks receive frames.
+
+    Args:
+        handler: Video handler with sinks, see VideoHandler.add_sink().
+        fps: Rate of render requests, like the GUI's frame clock.
+        stop: Set to stop serving.
+        duration: Max seconds to serve. None to serve until stopped.
+
+    Returns:
+        Number of render requests.
+    """
+    interval = 1 / fps
+    deadline = None if duration is None else time.monotonic() + duration
+    requests = 0
+    while not stop.is_set():
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        handler.request_render()
+        # Only the sinks need the frames, don't keep them queued for the display
+        handler.get_processed_frame()
+        requests += 1
+        stop.wait(interval)
+    return requests
+
+
+def _create_sinks(
+    args: argparse.Namespace, handler: video_handler.VideoHandler
+) -> list[sinks.QueuedSink]:
+    created: list[sinks.QueuedSink] = []
+    for fmt in sinks.PIPE_FORMATS:
+        target = getattr(args, fmt)
+        if target is not None:
+            created.append(
+                sinks.PipeSink(
+                    target=None if target == "-" else Path(target),
+                    fmt=fmt,
+                    fps=args.fps,
+                    metrics_registry=handler.metrics,
+                )
+            )
+    if args.shm:
+        created.append(
+            sinks.SharedMemoryRing(name=args.shm, metrics_registry=handler.metrics)
+        )
+    if args.record:
+        created.append(
+            sinks.Recorder(
+                args.record,
+                fps=args.fps,
+                drop_policy=structures.DropPolicy(args.record_policy),
+                metrics_registry=handler.metrics,
+            )
+        )
+    return created
+
+
+def _parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Configure and process cli arguments of the headless subcommand.
+
+    Args:
+        argv: Arguments to parse, without the subcommand.
+
+    Returns:
+        Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog="myhumbleself headless",
+        description=(
+            "Run without window and pass the output to other programs, e.g. "
+            "`myhumbleself headless --y4m | ffplay -`. Logs go to stderr."
+        ),
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Enable info logging."
+    )
+    parser.add_argument(
+        "--camera", type=int, default=0, metavar="CAM_ID", help="Camera to use."
+    )
+    parser.add_argument(
+        "--video",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="Replay this video file as camera, instead of a real one.",
+    )
+    parser.add_argument(
+        "--shape",
+        type=Path,
+        default=None,
+        metavar="PNG",
+        help="Shape mask, e.g. resources/shapes/02-oval.png. Default: circle.",
+    )
+    parser.add_argument("--zoom-factor", type=float, default=1)
+    parser.add_argument("--offset-x", type=int, default=0)
+    parser.add_argument("--offset-y", type=int, default=0)
+    parser.add_argument(
+        "--no-follow-face",
+        dest="follow_face",
+        action="store_false",
+        help="Disable face detection.",
+    )
+    parser.add_argument(
+        "--group-framing", action="store_true", help="Keep all faces in the frame."
+    )
+    parser.add_argument(
+        "--width", type=int, default=None, help="Max width of the output."
+    )
+    parser.add_argument(
+        "--fps", type=float, default=30, help="Output rate. Default: %(default)s."
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Stop after this time. Default: run until interrupted.",
+    )
+    sink_group = parser.add_argument_group("sinks", "At least one is required.")
+    sink_group.add_argument(
+        "--y4m",
+        nargs="?",
+        const="-",
+        default=None,
+        metavar="PATH",
+        help="Write Y4M with alpha to a file or FIFO. Default: stdout.",
+    )
+    sink_group.add_argument(
+        "--rgba",
+        nargs="?",
+        const="-",
+        default=None,
+        metavar="PATH",
+        help="Write raw RGBA frames to a file or FIFO. Default: stdout.",
+    )
+    sink_group.add_argument(
+        "--shm",
+        nargs="?",
+        const="myhumbleself",
+        default=None,
+        metavar="NAME",
+        help="Publish the frames in a shared memory ring. Default: %(const)s.",
+    )
+    sink_group.add_argument(
+        "--record",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="Record to a video file (requires ffmpeg) or a directory of PNGs.",
+    )
+    sink_group.add_argument(
+        "--record-policy",
+        choices=[p.value for p in structures.DropPolicy],
+        default=structures.DropPolicy.DROP_OLDEST.value,
+        help="What to do with frames, if the encoder falls behind.",
+    )
+    args = parser.parse_args(argv)
+    if not (args.y4m or args.rgba or args.shm or args.record):
+        parser.error("Choose at least one sink.")
+    if args.y4m == "-" and args.rgba == "-":
+        parser.error("Only one sink can write to stdout.")
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    handler = video_handler.VideoHandler(
+        cam_id=camera.DEMO_CAM_ID if args.video else args.camera,
+        shape_png_buffer=(
+            args.shape.read_bytes() if args.shape else video_handler.default_shape_png()
+        ),
+        zoom_factor=args.zoom_factor,
+        offset_x=args.offset_x,
+        offset_y=args.offset_y,
+        follow_face=args.follow_face,
+        demo_video=args.video,
+    )
+    handler.set_group_framing(args.group_framing)
+    handler.max_output_width = args.width
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        for sink in _create_sinks(args, handler):
+            handler.add_sink(sink)
+        serve(handler, fps=args.fps, stop=stop, duration=args.duration)
+    except ValueError as exc:
+        sys.exit(str(exc))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        handler.stop()
@@ -0,0 +1,168 @@
+import ctypes
+import logging
+import os
+import re
+import select
+import struct
+import threading
+from collections.abc import Callable
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEVICE_PATTERN = re.compile(r"video(\d+)")
+
+# Definitions from sys/inotify.h
+_IN_ATTRIB = 0x004
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_MASK = _IN_ATTRIB | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len, followed by name
+
+
+def _inotify_watch(directory: Path) -> int | None:
+    """Open an inotify instance watching entries of the directory.
+
+    Returns:
+        File descriptor to read events from, or None if inotify isn't available.
+    """
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), _IN_MASK) < 0:
+        logger.debug("Can't watch %s: errno %s", directory, ctypes.get_errno())
+        os.close(fd)
+        return None
+    return fd
+
+
+def _read_event_names(fd: int) -> list[str]:
+    """Read all pending inotify events and return the names they refer to."""
+    names: list[str] = []
+    try:
+        buffer = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return names
+    offset = 0
+    while offset < len(buffer):
+        *_, length = _INOTIFY_EVENT.unpack_from(buffer, offset)
+        offset += _INOTIFY_EVENT.size
+        names.append(os.fsdecode(buffer[offset : offset + length].rstrip(b"\0")))
+        offset += length
+    return names
+
+
+class DeviceWatcher:
+    """Watch a directory for video devices being added or removed.
+
+    Uses inotify, or polls the directory, if inotify isn't available. Only the names
+    of the device files are compared, the devices aren't opened.
+
+    Args:
+        on_change: Called from the watcher thread with the numbers of all present
+            video devices, whenever devices were added or removed. After a change, it
+            is called once more, as udev might only grant access to a new device
+            after a moment.
+        directory: Directory containing the device files.
+        interval: Seconds between polls, and before the repeated call after a change.
+        use_inotify: Set to False to always poll.
+    """
+
+    def __init__(
+        self,
+        on_change: Callable[[set[int]], object],
+        directory: Path = Path("/dev"),
+        interval: float = 1,
+        use_inotify: bool = True,
+    ) -> None:
+        self.on_change = on_change
+        self.directory = directory
+        self.interval = interval
+        self.use_inotify = use_inotify
+        self._stop = threading.Event()
+        self._wake_r, self._wake_w = -1, -1
+        self._thread: threading.Thread | None = None
+
+    def scan(self) -> set[int]:
+        """Numbers of the video devices currently present."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return set()
+        return {
+            int(match.group(1))
+            for name in names
+            if (match := DEVICE_PATTERN.fullmatch(name))
+        }
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._wake_r, self._wake_w = os.pipe()
+        # Watch before scanning, to not miss changes in between
+        inotify_fd = _inotify_watch(self.directory) if self.use_inotify else None
+        logger.info(
+            "Watching %s for cameras, %s.",
+            self.directory,
+            "via inotify" if inotify_fd is not None else "by polling",
+        )
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(inotify_fd, self.scan()),
+            name="device-watcher",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        os.write(self._wake_w, b"\0")
+        self._thread.join()
+        self._thread = None
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+    def _run(self, inotify_fd: int | None, known: set[int]) -> None:
+        repeat = False
+        try:
+            while not self._stop.is_set():
+                has_device_events = self._wait(inotify_fd)
+                if self._stop.is_set():
+                    break
+                present = self.scan()
+                if present != known or repeat or has_device_events:
+                    # Repeat only once after a change, not after the repetition
+                    repeat = present != known
+                    known = present
+                    self._notify(present)
+        finally:
+            if inotify_fd is not None:
+                os.close(inotify_fd)
+
+    def _wait(self, inotify_fd: int | None) -> bool:
+        """Wait for events or the next poll.
+
+        Returns:
+            True, if inotify reported events concerning video devices.
+        """
+        fds = [self._wake_r] if inotify_fd is None else [self._wake_r, inotify_fd]
+        readable, _, _ = select.select(fds, [], [], self.interval)
+        if inotify_fd is None or inotify_fd not in readable:
+            return False
+        names = _read_event_names(inotify_fd)
+        return any(DEVICE_PATTERN.fullmatch(name) for name in names)
+
+    def _notify(self, present: set[int]) -> None:
+        try:
+            self.on_change(present)
+        except Exception:
+            logger.exception("Error while handling changed devices.")
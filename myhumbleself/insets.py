@@ -0,0 +1,60 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import cv2
+import numpy as np
+
+if TYPE_CHECKING:
+    from myhumbleself.video_handler import VideoHandler
+
+
+@dataclass
+class Inset:
+    """Additional video source, composited into the output of another one.
+
+    Attributes:
+        handler: Pipeline of the inset's camera, with its own shape and framing.
+        center: Position of the inset's center, relative to the output size.
+        width: Width of the inset, relative to the output width.
+    """
+
+    handler: "VideoHandler"
+    center: tuple[float, float] = (0.8, 0.8)
+    width: float = 0.3
+
+
+def overlay(
+    base: np.ndarray, image: np.ndarray, center: tuple[float, float], width: float
+) -> None:
+    """Scale an image and alpha blend it onto the base image, in place.
+
+    Args:
+        base: RGBA image to draw onto.
+        image: RGBA image to draw. Parts outside of the base image are cut off. Should
+            already have about the drawn size, as it is scaled with linear
+            interpolation only.
+        center: Position of the image's center, relative to the base image size.
+        width: Width of the drawn image, relative to the base image width.
+    """
+    base_height, base_width = base.shape[:2]
+    target_width = max(1, round(base_width * width))
+    target_height = max(1, round(image.shape[0] * target_width / image.shape[1]))
+    if image.shape[:2] != (target_height, target_width):
+        # Usually only a slight adjustment, see VideoHandler.inset_width
+        image = cv2.resize(
+            image, (target_width, target_height), interpolation=cv2.INTER_LINEAR
+        )
+
+    left = round(base_width * center[0] - target_width / 2)
+    top = round(base_height * center[1] - target_height / 2)
+    x0, y0 = max(left, 0), max(top, 0)
+    x1 = min(left + target_width, base_width)
+    y1 = min(top + target_height, base_height)
+    if x0 >= x1 or y0 >= y1:
+        return
+
+    source = image[y0 - top : y1 - top, x0 - left : x1 - left]
+    target = base[y0:y1, x0:x1]
+    alpha = source[:, :, 3:] / np.float32(255)
+    target[:, :, :3] = source[:, :, :3] * alpha + target[:, :, :3] * (1 - alpha)
+    np.maximum(target[:, :, 3], source[:, :, 3], out=target[:, :, 3])
@@ -0,0 +1,80 @@
+import logging
+
+import numpy as np
+
+from myhumbleself import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bits of the frame counter stamped into the image. Wraps around after 65536 frames.
+COUNTER_BITS = 16
+
+
+def _cell_bounds(
+    image_size_hw: tuple[int, int], index: int
+) -> tuple[int, int, int, int]:
+    """Top, bottom, left, right of one cell of the code stamped into the image.
+
+    The code is a row of cells spanning the full width of the image: A white start
+    marker, the counter bits (most significant first) and a black end marker.
+    """
+    height, width = image_size_hw
+    cell_count = COUNTER_BITS + 2
+    # Relative to the image size, so the cells are found again after scaling
+    return (
+        height * 5 // 12,
+        height * 7 // 12,
+        width * index // cell_count,
+        width * (index + 1) // cell_count,
+    )
+
+
+def stamp_frame_counter(image: np.ndarray, counter: int) -> None:
+    """Stamp a frame counter as black & white cells into the image, in-place.
+
+    Used in the latency self-test, to recognize a frame again after processing. The
+    code is large enough to survive downscaling, but not cropping, so the displayed
+    area has to contain the whole frame.
+
+    Args:
+        image: BGR image.
+        counter: Value to stamp, e.g. the frame's sequence number.
+    """
+    size_hw = (image.shape[0], image.shape[1])
+    bits = [1, *((counter >> i) & 1 for i in reversed(range(COUNTER_BITS))), 0]
+    for index, bit in enumerate(bits):
+        top, bottom, left, right = _cell_bounds(size_hw, index)
+        image[top:bottom, left:right] = 255 if bit else 0
+
+
+def read_frame_counter(image: np.ndarray) -> int | None:
+    """Read the frame counter stamped by stamp_frame_counter().
+
+    Args:
+        image: BGR, RGB or RGBA image, possibly scaled. Alpha channel is ignored.
+
+    Returns:
+        Counter value, or None if the image doesn't contain a readable code.
+    """
+    size_hw = (image.shape[0], image.shape[1])
+    bits = []
+    for index in range(COUNTER_BITS + 2):
+        top, bottom, left, right = _cell_bounds(size_hw, index)
+        # Only sample the center of the cell, to be robust against blurred edges
+        margin_y, margin_x = (bottom - top) // 3, (right - left) // 3
+        cell = image[
+            top + margin_y : bottom - margin_y, left + margin_x : right - margin_x
+        ]
+        if not cell.size:
+            return None
+        bits.append(int(cell[..., :3].mean() > 127))  # noqa: PLR2004
+
+    if bits[0] != 1 or bits[-1] != 0:
+        return None
+    return int("".join(str(b) for b in bits[1:-1]), 2)
+
+
+def describe(histogram: metrics.Histogram) -> str:
+    """Summarize latency percentiles in milliseconds, e.g. for the window title."""
+    p50, p90, p99 = histogram.percentiles((0.5, 0.9, 0.99))
+    return f"latency p50/p90/p99: {p50 * 1000:.0f}/{p90 * 1000:.0f}/{p99 * 1000:.0f} ms"
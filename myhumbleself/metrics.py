@@ -0,0 +1,285 @@
+import json
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """Fixed-size ring buffer of the most recent samples, e.g. stage durations.
+
+    Observing a value is cheap and doesn't allocate. Statistics are only calculated on
+    request, over the samples still in the buffer. Count and sum cover all samples.
+
+    Samples can be observed and read from any thread. Without GIL, the updates would
+    otherwise get lost or torn, so they hold a lock.
+    """
+
+    def __init__(self, size: int = 256) -> None:
+        self._values = np.zeros(size, dtype=np.float64)
+        self._index = 0
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._values[self._index] = value
+            self._index = (self._index + 1) % len(self._values)
+            self.count += 1
+            self.sum += value
+
+    def values(self, last: int | None = None) -> np.ndarray:
+        """Return the buffered samples, oldest first.
+
+        Args:
+            last: Only return this many of the most recent samples.
+
+        Returns:
+            Copy of the samples.
+        """
+        size = len(self._values)
+        with self._lock:
+            available = min(self.count, size)
+            last = available if last is None else min(last, available)
+            indices = np.arange(self._index - last, self._index) % size
+            return self._values[indices]
+
+    def mean(self) -> float:
+        values = self.values()
+        return float(values.mean()) if len(values) else 0.0
+
+    def rate(self) -> float:
+        """Events per second, if the samples are intervals between events in seconds."""
+        mean = self.mean()
+        return 1 / mean if mean > 0 else 0.0
+
+    def percentiles(self, quantiles: tuple[float, ...]) -> list[float]:
+        values = self.values()
+        if not len(values):
+            return [0.0] * len(quantiles)
+        return np.quantile(values, quantiles).tolist()
+
+    def reset(self) -> None:
+        """Discard buffered samples, e.g. when they are not representative anymore."""
+        with self._lock:
+            self._index = 0
+            self.count = 0
+            self.sum = 0.0
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def reset(self) -> None:
+        with self._lock:
+            self.value = 0
+
+
+class _NullHistogram(Histogram):
+    """Histogram handed out by a disabled registry. Ignores all samples."""
+
+    def __init__(self) -> None:
+        super().__init__(size=1)
+
+    def observe(self, value: float) -> None:
+        pass
+
+
+class _NullCounter(Counter):
+    def inc(self, amount: int = 1) -> None:
+        pass
+
+
+class Registry:
+    """Collection of named metrics of the processing pipeline.
+
+    Metrics are created on first access. If the registry is disabled, it hands out
+    shared no-op metrics, so the instrumented code doesn't need to check for it.
+
+    The stages of the pipeline create and update metrics concurrently, while others
+    export them. Creation holds a lock, so all threads get the same metric, and
+    exports iterate over copies.
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, enabled: bool = True, histogram_size: int = 256) -> None:
+        self.enabled = enabled
+        self.histogram_size = histogram_size
+        self._histograms: dict[str, Histogram] = {}
+        self._counters: dict[str, Counter] = {}
+        self._gauges: dict[str, Callable[[], float]] = {}
+        self._null_histogram = _NullHistogram()
+        self._null_counter = _NullCounter()
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> Histogram:
+        if not self.enabled:
+            return self._null_histogram
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(
+                    name, Histogram(size=self.histogram_size)
+                )
+        return histogram
+
+    def counter(self, name: str) -> Counter:
+        if not self.enabled:
+            return self._null_counter
+        counter = self._counters.get(name)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(name, Counter())
+        return counter
+
+    def gauge(self, name: str, func: Callable[[], float]) -> None:
+        """Register a function, which is called to get the value on export."""
+        with self._lock:
+            self._gauges[name] = func
+
+    def prefixed(self, prefix: str) -> "Registry":
+        """View of this registry, which adds a prefix to the names of all metrics.
+
+        Used e.g. for the pipelines of insets, so their metrics don't collide with
+        the ones of the main pipeline, but still end up in the same export.
+        """
+        return _PrefixedRegistry(self, prefix)
+
+    def _items(
+        self,
+    ) -> tuple[
+        list[tuple[str, Histogram]],
+        list[tuple[str, Counter]],
+        list[tuple[str, Callable[[], float]]],
+    ]:
+        """Copies of all metrics, which stay valid while metrics are added."""
+        with self._lock:
+            return (
+                list(self._histograms.items()),
+                list(self._counters.items()),
+                list(self._gauges.items()),
+            )
+
+    def reset(self) -> None:
+        """Discard the samples of all histograms and zero all counters.
+
+        Used e.g. after a warmup phase. Gauges are not affected.
+        """
+        histograms, counters, _ = self._items()
+        for _, histogram in histograms:
+            histogram.reset()
+        for _, counter in counters:
+            counter.reset()
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Measure the duration of the with-block in seconds."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).observe(time.perf_counter() - started)
+
+    def snapshot(self) -> dict:
+        """Current state of all metrics as plain data structures."""
+        histogram_items, counters, gauges = self._items()
+        histograms = {}
+        for name, histogram in histogram_items:
+            p50, p90, p99 = histogram.percentiles(self.QUANTILES)
+            values = histogram.values()
+            histograms[name] = {
+                "count": histogram.count,
+                "sum": histogram.sum,
+                "mean": histogram.mean(),
+                "p50": p50,
+                "p90": p90,
+                "p99": p99,
+                "max": float(values.max()) if len(values) else 0.0,
+            }
+        return {
+            "timestamp": time.time(),
+            "histograms": histograms,
+            "counters": {name: c.value for name, c in counters},
+            "gauges": {name: float(func()) for name, func in gauges},
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix: str = "myhumbleself") -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        histograms, counters, gauges = self._items()
+        lines = []
+        for name, histogram in histograms:
+            metric = f"{prefix}_{name}"
+            lines.append(f"# TYPE {metric} summary")
+            quantiles = histogram.percentiles(self.QUANTILES)
+            for quantile, value in zip(self.QUANTILES, quantiles, strict=True):
+                lines.append(f'{metric}{{quantile="{quantile}"}} {value}')
+            lines.append(f"{metric}_sum {histogram.sum}")
+            lines.append(f"{metric}_count {histogram.count}")
+        for name, counter in counters:
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {counter.value}")
+        for name, func in gauges:
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {float(func())}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path) -> None:
+        """Export all metrics to a file. Prometheus format for *.prom, else JSON."""
+        text = self.to_prometheus() if path.suffix == ".prom" else self.to_json()
+        path.write_text(text)
+        logger.info("Wrote metrics to %s.", path)
+
+
+class _PrefixedRegistry(Registry):
+    """Registry handed out by Registry.prefixed(). Stores all metrics in the parent.
+
+    Exports only contain the metrics with the prefix, under their full names.
+    """
+
+    def __init__(self, parent: Registry, prefix: str) -> None:
+        super().__init__(enabled=parent.enabled, histogram_size=parent.histogram_size)
+        self._parent = parent
+        self._prefix = prefix
+
+    def histogram(self, name: str) -> Histogram:
+        return self._parent.histogram(self._prefix + name)
+
+    def counter(self, name: str) -> Counter:
+        return self._parent.counter(self._prefix + name)
+
+    def gauge(self, name: str, func: Callable[[], float]) -> None:
+        self._parent.gauge(self._prefix + name, func)
+
+    def _items(
+        self,
+    ) -> tuple[
+        list[tuple[str, Histogram]],
+        list[tuple[str, Counter]],
+        list[tuple[str, Callable[[], float]]],
+    ]:
+        histograms, counters, gauges = self._parent._items()
+        return (
+            [item for item in histograms if item[0].startswith(self._prefix)],
+            [item for item in counters if item[0].startswith(self._prefix)],
+            [item for item in gauges if item[0].startswith(self._prefix)],
+        )
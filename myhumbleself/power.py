@@ -0,0 +1,223 @@
+import functools
+import logging
+import time
+from collections.abc import Callable
+from enum import Enum
+from typing import Protocol
+
+from myhumbleself import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PowerState(Enum):
+    ACTIVE = "active"
+    IDLE = "idle"
+    HIDDEN = "hidden"
+    RELEASED = "released"
+
+
+class PowerControlled(Protocol):
+    """Interface of the component whose power consumption gets managed."""
+
+    def set_capture_fps(self, fps: float | None) -> None: ...
+
+    def set_detection_enabled(self, enabled: bool) -> None: ...
+
+    def release_camera(self) -> None: ...
+
+    def resume_camera(self) -> None: ...
+
+
+class PowerPolicy:
+    """Reduce the power consumption, depending on the visibility of the window.
+
+    The states are entered as follows:
+    - ACTIVE: Window is visible and the user interacts with it, or controls are shown.
+    - IDLE: Window is visible, the controls are hidden, and there was no interaction
+      for `idle_after` seconds. The capture fps is lowered to `idle_fps`.
+    - HIDDEN: Window is minimized, suspended, unmapped, or its frame clock stopped
+      ticking for `frame_timeout` seconds. Capture fps is lowered to `hidden_fps` and
+      face detection is suspended.
+    - RELEASED: Window is HIDDEN for `release_after` seconds. The camera is released.
+
+    Becoming visible again immediately returns to ACTIVE.
+
+    To make the savings measurable, the process' CPU time is accounted per state. It
+    is exported as gauges `power_<state>_seconds` and `power_<state>_cpu_seconds`, and
+    can be logged via `log_summary()`.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        controlled: PowerControlled,
+        idle_after: float = 60,
+        idle_fps: float = 30,
+        hidden_fps: float = 5,
+        release_after: float = 30,
+        frame_timeout: float = 1,
+        clock: Callable[[], float] = time.monotonic,
+        cpu_clock: Callable[[], float] = time.process_time,
+        metrics_registry: metrics.Registry | None = None,
+    ) -> None:
+        self._controlled = controlled
+        self.idle_after = idle_after
+        self.idle_fps = idle_fps
+        self.hidden_fps = hidden_fps
+        # 0 disables releasing the camera
+        self.release_after = release_after
+        self.frame_timeout = frame_timeout
+        self._clock = clock
+        self._cpu_clock = cpu_clock
+
+        now = self._clock()
+        self.state = PowerState.ACTIVE
+        self._last_activity = now
+        self._last_frame = now
+        self._hidden_since: float | None = None
+        self._window_visible = True
+        self._controls_hidden = False
+
+        self._state_entered = now
+        self._state_entered_cpu = self._cpu_clock()
+        self.wall_time: dict[PowerState, float] = dict.fromkeys(PowerState, 0.0)
+        self.cpu_time: dict[PowerState, float] = dict.fromkeys(PowerState, 0.0)
+
+        self.metrics = metrics_registry or metrics.Registry()
+        for power_state in PowerState:
+            self.metrics.gauge(
+                f"power_{power_state.value}_seconds",
+                functools.partial(self._accounted_wall_time, power_state),
+            )
+            self.metrics.gauge(
+                f"power_{power_state.value}_cpu_seconds",
+                functools.partial(self._accounted_cpu_time, power_state),
+            )
+
+    def notify_activity(self) -> None:
+        """Register user interaction, e.g. a click on one of the controls."""
+        self._last_activity = self._clock()
+        if self.state is not PowerState.ACTIVE:
+            self.update()
+
+    def notify_frame(self) -> None:
+        """Register a tick of the window's frame clock."""
+        self._last_frame = self._clock()
+        if self.state in (PowerState.HIDDEN, PowerState.RELEASED):
+            self.update()
+
+    def set_window_state(self, visible: bool, controls_hidden: bool) -> None:
+        """Update the window state and re-evaluate the power state.
+
+        Args:
+            visible: Window is mapped, not minimized and not suspended.
+            controls_hidden: Controls & decoration are hidden (presentation mode).
+        """
+        if controls_hidden != self._controls_hidden:
+            self._last_activity = self._clock()
+        self._window_visible = visible
+        self._controls_hidden = controls_hidden
+        self.update()
+
+    def update(self) -> PowerState:
+        """Re-evaluate the power state. Should also be called periodically.
+
+        Returns:
+            Current state.
+        """
+        now = self._clock()
+        is_visible = (
+            self._window_visible and now - self._last_frame < self.frame_timeout
+        )
+
+        if is_visible:
+            self._hidden_since = None
+            is_idle = (
+                self._controls_hidden and now - self._last_activity >= self.idle_after
+            )
+            state = PowerState.IDLE if is_idle else PowerState.ACTIVE
+        else:
+            if self._hidden_since is None:
+                self._hidden_since = now
+            is_released = (
+                self.release_after > 0
+                and now - self._hidden_since >= self.release_after
+            )
+            state = PowerState.RELEASED if is_released else PowerState.HIDDEN
+
+        if state is not self.state:
+            self._enter_state(state, now)
+        return self.state
+
+    def _enter_state(self, state: PowerState, now: float) -> None:
+        cpu_now = self._cpu_clock()
+        wall = now - self._state_entered
+        cpu = cpu_now - self._state_entered_cpu
+        self.wall_time[self.state] += wall
+        self.cpu_time[self.state] += cpu
+        logger.debug(
+            "Power state %s -> %s after %.1fs (CPU %.0f%%).",
+            self.state.value,
+            state.value,
+            wall,
+            100 * cpu / wall if wall > 0 else 0,
+        )
+
+        if self.state is PowerState.RELEASED:
+            self._controlled.resume_camera()
+
+        if state is PowerState.ACTIVE:
+            self._controlled.set_capture_fps(None)
+        elif state is PowerState.IDLE:
+            self._controlled.set_capture_fps(self.idle_fps)
+        else:
+            self._controlled.set_capture_fps(self.hidden_fps)
+        self._controlled.set_detection_enabled(
+            state in (PowerState.ACTIVE, PowerState.IDLE)
+        )
+        if state is PowerState.RELEASED:
+            self._controlled.release_camera()
+
+        self.state = state
+        self._state_entered = now
+        self._state_entered_cpu = cpu_now
+
+    def accounted_time(
+        self,
+    ) -> tuple[dict[PowerState, float], dict[PowerState, float]]:
+        """Wall and CPU time spent per state, including the time in the current one.
+
+        Returns:
+            Wall time and CPU time in seconds, per state.
+        """
+        wall_time = dict(self.wall_time)
+        cpu_time = dict(self.cpu_time)
+        wall_time[self.state] += self._clock() - self._state_entered
+        cpu_time[self.state] += self._cpu_clock() - self._state_entered_cpu
+        return wall_time, cpu_time
+
+    def _accounted_wall_time(self, state: PowerState) -> float:
+        return self.accounted_time()[0][state]
+
+    def _accounted_cpu_time(self, state: PowerState) -> float:
+        return self.accounted_time()[1][state]
+
+    def cpu_usage(self) -> dict[PowerState, float]:
+        """Average CPU usage of the process per state, in percent of one core."""
+        wall_time, cpu_time = self.accounted_time()
+        return {
+            state: 100 * cpu_time[state] / wall
+            for state, wall in wall_time.items()
+            if wall > 0
+        }
+
+    def log_summary(self) -> None:
+        """Log the time and the average CPU usage per state, e.g. on shutdown."""
+        wall_time, _ = self.accounted_time()
+        for state, usage in self.cpu_usage().items():
+            logger.info(
+                "Power state %s: %.1fs, CPU %.0f%%.",
+                state.value,
+                wall_time[state],
+                usage,
+            )
@@ -0,0 +1,156 @@
+import cProfile
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Since Python 3.12, cProfile is based on sys.monitoring, which observes all threads
+# of the interpreter. Before, a profiler only observes the thread it was enabled in.
+PROFILES_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+class Profiler:
+    """Collect CPU profiles and memory allocations, e.g. to analyze high CPU usage.
+
+    To also cover the camera and pipeline threads, the profiler should be started
+    before those threads are created. On Python < 3.12, every thread started afterwards
+    gets a profiler of its own, and the report lists the threads separately. On newer
+    versions, one profiler covers all threads, so the report only contains combined
+    stats.
+
+    tracemalloc can't attribute allocations to threads, the top allocating source
+    lines show which part of the app (camera, detection, UI) they belong to.
+
+    Args:
+        output_dir: Directory to write the report and the pstats file to.
+        cpu: Collect CPU profiles with cProfile.
+        memory: Collect memory allocations with tracemalloc.
+        top: Number of entries per section of the report.
+    """
+
+    def __init__(
+        self, output_dir: Path, cpu: bool = True, memory: bool = False, top: int = 30
+    ) -> None:
+        self.output_dir = output_dir
+        self.cpu = cpu
+        self.memory = memory
+        self.top = top
+        self._profiles: dict[str, cProfile.Profile] = {}
+        self._lock = threading.Lock()
+        self._start_snapshot: tracemalloc.Snapshot | None = None
+        self._started: float | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._started is not None
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._started = time.monotonic()
+        if self.memory:
+            tracemalloc.start(10)
+            self._start_snapshot = tracemalloc.take_snapshot()
+        if self.cpu:
+            if not PROFILES_ALL_THREADS:
+                threading.setprofile(self._profile_new_thread)
+            self._add_profile().enable()
+        logger.info("Profiling started.")
+
+    def _add_profile(self) -> cProfile.Profile:
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles[threading.current_thread().name] = profile
+        return profile
+
+    def _profile_new_thread(self, *_: Any) -> None:  # noqa: ANN401
+        """Replace itself by a dedicated profiler, on the first event of a thread."""
+        self._add_profile().enable()
+
+    def stop(self) -> Path:
+        """Stop collecting and write the report.
+
+        Returns:
+            Path of the written text report.
+        """
+        if self._started is None:
+            raise RuntimeError("Profiler is not running!")
+        duration = time.monotonic() - self._started
+        self._started = None
+
+        if self.cpu:
+            threading.setprofile(None)
+        with self._lock:
+            profiles = dict(self._profiles)
+            self._profiles.clear()
+        # Disabling only works from the profiled thread. Profilers of other threads
+        # are stopped, when their thread ends.
+        for profile in profiles.values():
+            profile.disable()
+
+        end_snapshot = tracemalloc.take_snapshot() if self.memory else None
+        if self.memory:
+            tracemalloc.stop()
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        name = f"profile-{time.strftime('%Y%m%d-%H%M%S')}"
+        report = io.StringIO()
+        report.write(f"Profiled for {duration:.1f}s.\n")
+        if profiles:
+            self._write_cpu_report(report, profiles, self.output_dir / f"{name}.prof")
+        if end_snapshot is not None:
+            self._write_memory_report(report, end_snapshot)
+
+        report_path = self.output_dir / f"{name}.txt"
+        report_path.write_text(report.getvalue())
+        logger.info("Profiling report written to %s.", report_path)
+        return report_path
+
+    def _write_cpu_report(
+        self, report: io.StringIO, profiles: dict[str, cProfile.Profile], path: Path
+    ) -> None:
+        combined: pstats.Stats | None = None
+        for thread_name, profile in profiles.items():
+            stats = pstats.Stats(profile, stream=report)
+            if len(profiles) > 1:
+                report.write(f"\n=== CPU: Thread '{thread_name}' ===\n")
+                stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+            if combined is None:
+                combined = stats
+            else:
+                combined.add(stats)
+
+        if combined is None:
+            return
+        combined.dump_stats(path)
+        report.write(f"\n=== CPU: All threads, by own time (see {path.name}) ===\n")
+        combined.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+        report.write("\n=== CPU: All threads, by cumulative time ===\n")
+        combined.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+
+    def _write_memory_report(
+        self, report: io.StringIO, snapshot: tracemalloc.Snapshot
+    ) -> None:
+        snapshot = snapshot.filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        report.write("\n=== Memory: Top allocating lines ===\n")
+        for stat in snapshot.statistics("lineno")[: self.top]:
+            report.write(f"{stat}\n")
+
+        if self._start_snapshot is not None:
+            report.write("\n=== Memory: Top growing lines since start ===\n")
+            for diff in snapshot.compare_to(self._start_snapshot, "lineno")[: self.top]:
+                report.write(f"{diff}\n")
+
+        report.write("\n=== Memory: Largest allocation, traceback ===\n")
+        largest = snapshot.statistics("traceback")[:1]
+        for stat in largest:
+            report.write("\n".join(stat.traceback.format()) + "\n")
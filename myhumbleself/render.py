@@ -0,0 +1,402 @@
+import argparse
+import contextlib
+import logging
+import math
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from myhumbleself import sinks, video_handler
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RenderSettings:
+    """Settings of an offline rendering.
+
+    Attributes:
+        input: Video file to render.
+        output: Video file (see sinks.VIDEO_CODECS) or directory for a PNG sequence.
+        shape: PNG file of the shape mask. Defaults to a circle.
+        width: Width of the output. The height follows the shape's aspect ratio.
+        zoom_factor: Zoom factor, as adjusted via the GUI.
+        offset_x: Horizontal offset of the framing, as adjusted via the GUI.
+        offset_y: Vertical offset of the framing, as adjusted via the GUI.
+        follow_face: Run face detection.
+        group_framing: Keep all faces in the frame.
+        workers: Number of worker processes. Defaults to the number of CPUs.
+        chunk_seconds: Duration of the parts of the video processed by one worker.
+        warmup_seconds: Duration processed before a part, without writing output, so
+            the smoothing of detection and pan & zoom continues across part borders.
+        max_frames: Only render the beginning of the video.
+    """
+
+    input: Path
+    output: Path
+    shape: Path | None = None
+    width: int = 480
+    zoom_factor: float = 1
+    offset_x: int = 0
+    offset_y: int = 0
+    follow_face: bool = True
+    group_framing: bool = False
+    workers: int | None = None
+    chunk_seconds: float = 10
+    warmup_seconds: float = 2
+    max_frames: int | None = None
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """Part of the video, rendered by one worker.
+
+    Attributes:
+        index: Position of the chunk in the video.
+        start: Index of the first frame to write.
+        stop: Index after the last frame to write. None to render until the end.
+        warmup: Number of frames before start, which are processed without output.
+    """
+
+    index: int
+    start: int
+    stop: int | None
+    warmup: int
+
+
+def plan_chunks(
+    frame_count: int, fps: float, settings: RenderSettings, workers: int
+) -> list[Chunk]:
+    """Split the video into chunks, to be rendered in parallel.
+
+    Chunks are at most chunk_seconds long, but short enough to keep all workers busy.
+
+    Args:
+        frame_count: Number of frames to render.
+        fps: Frame rate of the video.
+        settings: Render settings.
+        workers: Number of worker processes.
+
+    Returns:
+        Chunks in order of the video.
+    """
+    chunk_frames = max(
+        1,
+        min(
+            round(settings.chunk_seconds * fps),
+            math.ceil(frame_count / workers),
+        ),
+    )
+    warmup_frames = round(settings.warmup_seconds * fps)
+    starts = list(range(0, max(frame_count, 1), chunk_frames))
+    return [
+        Chunk(
+            index=index,
+            start=start,
+            # Frame counts of containers can be inaccurate, so read the rest until
+            # the end, unless the count was limited on purpose
+            stop=(
+                min(start + chunk_frames, frame_count)
+                if index < len(starts) - 1 or settings.max_frames
+                else None
+            ),
+            warmup=min(start, warmup_frames),
+        )
+        for index, start in enumerate(starts)
+    ]
+
+
+def output_size_wh(shape_png_buffer: bytes, width: int) -> tuple[int, int]:
+    """Output size for a shape, even, as required by most video codecs."""
+    shape = cv2.imdecode(
+        np.frombuffer(shape_png_buffer, dtype=np.uint8), cv2.IMREAD_GRAYSCALE
+    )
+    height = width * shape.shape[0] / shape.shape[1]
+    return (max(2, round(width / 2) * 2), max(2, round(height / 2) * 2))
+
+
+def _read_frames(capture: cv2.VideoCapture, chunk: Chunk) -> Iterator[np.ndarray]:
+    first = chunk.start - chunk.warmup
+    if first:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, first)
+    index = first
+    while chunk.stop is None or index < chunk.stop:
+        ok, frame = capture.read()
+        if not ok:
+            return
+        yield frame
+        index += 1
+
+
+def _part_path(parts_dir: Path, chunk: Chunk, suffix: str) -> Path:
+    return parts_dir / f"part-{chunk.index:05d}{suffix}"
+
+
+def render_chunk(
+    settings: RenderSettings, chunk: Chunk, fps: float, parts_dir: Path | None
+) -> int:
+    """Render one chunk of the video, e.g. in a worker process.
+
+    Args:
+        settings: Render settings.
+        chunk: Part of the video to render.
+        fps: Frame rate of the video.
+        parts_dir: Directory to encode the chunk's video into. None for PNG output.
+
+    Returns:
+        Number of frames written.
+    """
+    # Parallelism comes from the workers, more threads would only compete for cores
+    cv2.setNumThreads(1)
+    shape_png_buffer = (
+        settings.shape.read_bytes()
+        if settings.shape
+        else video_handler.default_shape_png()
+    )
+    size_wh = output_size_wh(shape_png_buffer, settings.width)
+    handler = video_handler.VideoHandler(
+        cam_id=None,
+        shape_png_buffer=shape_png_buffer,
+        zoom_factor=settings.zoom_factor,
+        offset_x=settings.offset_x,
+        offset_y=settings.offset_y,
+        follow_face=settings.follow_face,
+    )
+    handler.set_group_framing(on=settings.group_framing)
+    handler.max_output_width = size_wh[0]
+    writer = sinks.open_writer(
+        (
+            settings.output
+            if parts_dir is None
+            else _part_path(parts_dir, chunk, settings.output.suffix)
+        ),
+        size_wh,
+        fps,
+    )
+    capture = cv2.VideoCapture(str(settings.input))
+    written = 0
+    try:
+        for offset, frame in enumerate(_read_frames(capture, chunk)):
+            index = chunk.start - chunk.warmup + offset
+            if index < chunk.start:
+                handler.update_framing(frame, elapsed=1 / fps)
+                continue
+            image = handler.render_frame(frame, elapsed=1 / fps)
+            writer.write(index, sinks.fit(image, size_wh))
+            written += 1
+    finally:
+        capture.release()
+        handler.stop()
+        writer.close()
+    logger.info("Rendered chunk %s with %s frames.", chunk.index, written)
+    return written
+
+
+def _concat(parts: list[Path], output: Path) -> None:
+    """Join the encoded chunks into the output file, without re-encoding."""
+    list_file = parts[0].parent / "parts.txt"
+    list_file.write_text("".join(f"file '{part.name}'\n" for part in parts))
+    subprocess.run(  # noqa: S603
+        [
+            sinks.ffmpeg_path(),
+            *("-hide_banner", "-loglevel", "error", "-y"),
+            *("-f", "concat", "-safe", "0", "-i", str(list_file)),
+            *("-c", "copy", str(output)),
+        ],
+        check=True,
+    )
+
+
+def run(settings: RenderSettings) -> dict:
+    """Render a video file with the framing and shape mask of the GUI, headless.
+
+    The video is split into chunks, which are rendered in parallel worker processes.
+    Each worker starts a bit before its chunk, so the smoothing state has settled, when
+    the chunk begins.
+
+    Args:
+        settings: Render settings.
+
+    Returns:
+        Statistics of the rendering.
+
+    Raises:
+        ValueError: If input or output are not supported, or no frames got rendered.
+    """
+    capture = cv2.VideoCapture(str(settings.input))
+    if not capture.isOpened():
+        raise ValueError(f"Can't open video file {settings.input}.")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    if settings.max_frames:
+        frame_count = min(frame_count, settings.max_frames)
+
+    sinks.check_output(settings.output)
+    suffix = settings.output.suffix
+
+    workers = settings.workers or os.cpu_count() or 1
+    chunks = plan_chunks(frame_count, fps, settings, workers=workers)
+    workers = min(workers, len(chunks))
+    logger.info("Render %s chunks with %s workers.", len(chunks), workers)
+
+    started = time.monotonic()
+    # Chunks of video files are encoded separately and joined afterwards
+    parts_context: contextlib.AbstractContextManager[str | None] = (
+        contextlib.nullcontext()
+    )
+    if suffix:
+        parts_context = tempfile.TemporaryDirectory(
+            prefix=".render-", dir=settings.output.parent
+        )
+    with parts_context as temp_dir:
+        parts_dir = Path(temp_dir) if temp_dir else None
+        if workers == 1:
+            written = [render_chunk(settings, c, fps, parts_dir) for c in chunks]
+        else:
+            # Spawn, as forking a process with OpenCV's threads running can deadlock
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                written = list(
+                    executor.map(
+                        render_chunk,
+                        repeat(settings),
+                        chunks,
+                        repeat(fps),
+                        repeat(parts_dir),
+                    )
+                )
+        if not any(written):
+            # E.g. an empty video, or one OpenCV can open, but not decode
+            raise ValueError(f"No frames were rendered from {settings.input}.")
+        if parts_dir:
+            _concat(
+                [_part_path(parts_dir, c, suffix) for c in chunks if written[c.index]],
+                settings.output,
+            )
+    elapsed = time.monotonic() - started
+
+    return {
+        "frames": sum(written),
+        "chunks": len(chunks),
+        "workers": workers,
+        "elapsed_seconds": elapsed,
+        "fps": sum(written) / elapsed,
+    }
+
+
+def _parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Configure and process cli arguments of the render subcommand.
+
+    Args:
+        argv: Arguments to parse, without the subcommand.
+
+    Returns:
+        Parsed arguments.
+    """
+    defaults = RenderSettings(input=Path(), output=Path())
+    parser = argparse.ArgumentParser(
+        prog="myhumbleself render",
+        description=(
+            "Apply face framing and shape mask to a video file, headless. The output "
+            "keeps the transparency of the shape."
+        ),
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Enable info logging."
+    )
+    parser.add_argument("input", type=Path, help="Video file to render.")
+    parser.add_argument(
+        "output",
+        type=Path,
+        help=(
+            f"Video file ({', '.join(sinks.VIDEO_CODECS)}, requires ffmpeg, all but "
+            ".mp4 keep transparency), or directory to write PNG files into."
+        ),
+    )
+    parser.add_argument(
+        "--shape",
+        type=Path,
+        default=None,
+        metavar="PNG",
+        help="Shape mask, e.g. resources/shapes/02-oval.png. Default: circle.",
+    )
+    parser.add_argument(
+        "--width", type=int, default=defaults.width, help="Width of the output."
+    )
+    parser.add_argument("--zoom-factor", type=float, default=defaults.zoom_factor)
+    parser.add_argument("--offset-x", type=int, default=defaults.offset_x)
+    parser.add_argument("--offset-y", type=int, default=defaults.offset_y)
+    parser.add_argument(
+        "--no-follow-face",
+        dest="follow_face",
+        action="store_false",
+        help="Disable face detection.",
+    )
+    parser.add_argument(
+        "--group-framing", action="store_true", help="Keep all faces in the frame."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of worker processes. Default: number of CPUs.",
+    )
+    parser.add_argument("--chunk-seconds", type=float, default=defaults.chunk_seconds)
+    parser.add_argument(
+        "--warmup-seconds",
+        type=float,
+        default=defaults.warmup_seconds,
+        help="Video processed before each chunk, to continue the smoothing.",
+    )
+    parser.add_argument(
+        "--frames",
+        type=int,
+        default=None,
+        help="Only render this number of frames.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = _parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    settings = RenderSettings(
+        input=args.input,
+        output=args.output,
+        shape=args.shape,
+        width=args.width,
+        zoom_factor=args.zoom_factor,
+        offset_x=args.offset_x,
+        offset_y=args.offset_y,
+        follow_face=args.follow_face,
+        group_framing=args.group_framing,
+        workers=args.workers,
+        chunk_seconds=args.chunk_seconds,
+        warmup_seconds=args.warmup_seconds,
+        max_frames=args.frames,
+    )
+    try:
+        result = run(settings)
+    except ValueError as exc:
+        sys.exit(str(exc))
+
+    sys.stdout.write(
+        f"Rendered {result['frames']} frames in {result['elapsed_seconds']:.2f}s "
+        f"({result['fps']:.1f} fps), {result['chunks']} chunks on "
+        f"{result['workers']} workers.\n"
+    )
@@ -0,0 +1,602 @@
+import abc
+import errno
+import logging
+import os
+import shutil
+import stat
+import struct
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+from typing import BinaryIO
+
+import cv2
+import numpy as np
+
+from myhumbleself import metrics, structures
+
+logger = logging.getLogger(__name__)
+
+# Encoder arguments of ffmpeg per container. All but .mp4 keep the alpha channel.
+VIDEO_CODECS = {
+    ".webm": ["-c:v", "libvpx-vp9", "-pix_fmt", "yuva420p", "-crf", "30", "-b:v", "0"],
+    ".mov": ["-c:v", "prores_ks", "-profile:v", "4444", "-pix_fmt", "yuva444p10le"],
+    ".mkv": ["-c:v", "ffv1", "-pix_fmt", "bgra"],
+    ".mp4": ["-c:v", "libx264", "-pix_fmt", "yuv420p"],
+}
+
+# Formats of PipeSink
+PIPE_FORMATS = ("y4m", "rgba")
+
+# Layout of SharedMemoryRing, little endian. Headers are padded to 64 bytes.
+RING_MAGIC = b"MHSRING1"
+_RING_HEADER = struct.Struct("<8sIIIQ")  # magic, slots, max width, max height, seq
+_SLOT_HEADER = struct.Struct("<QdII")  # seq, timestamp, width, height
+_HEADER_SIZE = 64
+
+# Names of the SharedMemoryRings of this process, see RingReader
+_own_rings: set[str] = set()
+
+
+def ffmpeg_path() -> str:
+    """Path of the ffmpeg executable.
+
+    Raises:
+        ValueError: If ffmpeg isn't installed.
+    """
+    path = shutil.which("ffmpeg")
+    if path is None:
+        raise ValueError("Writing video files requires ffmpeg, write PNGs instead.")
+    return path
+
+
+def check_output(path: Path) -> None:
+    """Check, if frames can be written to a file of this type.
+
+    Raises:
+        ValueError: If the type isn't supported or requires a missing ffmpeg.
+    """
+    if path.suffix and path.suffix not in VIDEO_CODECS:
+        raise ValueError(
+            f"Unsupported output {path}, use a directory for PNGs or one of "
+            f"{', '.join(VIDEO_CODECS)}."
+        )
+    if path.suffix:
+        ffmpeg_path()
+
+
+def fit(image: np.ndarray, size_wh: tuple[int, int]) -> np.ndarray:
+    """Scale an RGBA image into the size, with transparent borders on other aspects."""
+    height, width = image.shape[:2]
+    if (width, height) == size_wh:
+        return image
+    factor = min(size_wh[0] / width, size_wh[1] / height)
+    scaled_wh = (
+        min(size_wh[0], max(1, round(width * factor))),
+        min(size_wh[1], max(1, round(height * factor))),
+    )
+    image = cv2.resize(
+        image,
+        scaled_wh,
+        interpolation=cv2.INTER_AREA if factor < 1 else cv2.INTER_LINEAR,
+    )
+    if scaled_wh == size_wh:
+        return image
+    canvas = np.zeros((size_wh[1], size_wh[0], 4), dtype=np.uint8)
+    top = (size_wh[1] - scaled_wh[1]) // 2
+    left = (size_wh[0] - scaled_wh[0]) // 2
+    canvas[top : top + scaled_wh[1], left : left + scaled_wh[0]] = image
+    return canvas
+
+
+class PngWriter:
+    """Write RGBA frames as PNG files, numbered by their position in the video."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def write(self, index: int, image: np.ndarray) -> None:
+        path = self.directory / f"{index:06d}.png"
+        cv2.imwrite(str(path), cv2.cvtColor(image, cv2.COLOR_RGBA2BGRA))
+
+    def close(self) -> None:
+        pass
+
+
+class FfmpegWriter:
+    """Encode RGBA frames to a video file, by piping them into ffmpeg.
+
+    The encoding runs in the ffmpeg process, writing only copies the raw frames.
+    """
+
+    def __init__(self, path: Path, size_wh: tuple[int, int], fps: float) -> None:
+        self._process = subprocess.Popen(  # noqa: S603
+            [
+                ffmpeg_path(),
+                *("-hide_banner", "-loglevel", "error", "-y"),
+                *("-f", "rawvideo", "-pix_fmt", "rgba"),
+                *("-s", f"{size_wh[0]}x{size_wh[1]}", "-r", f"{fps}", "-i", "-"),
+                *VIDEO_CODECS[path.suffix],
+                str(path),
+            ],
+            stdin=subprocess.PIPE,
+        )
+
+    def write(self, index: int, image: np.ndarray) -> None:
+        if self._process.stdin:
+            self._process.stdin.write(np.ascontiguousarray(image).data)
+
+    def close(self) -> None:
+        if self._process.stdin:
+            self._process.stdin.close()
+        if self._process.wait():
+            raise RuntimeError(f"ffmpeg failed with code {self._process.returncode}.")
+
+
+def open_writer(
+    path: Path, size_wh: tuple[int, int], fps: float
+) -> PngWriter | FfmpegWriter:
+    """Writer for a video file (see VIDEO_CODECS) or a directory of PNGs."""
+    return FfmpegWriter(path, size_wh, fps) if path.suffix else PngWriter(path)
+
+
+class QueuedSink(abc.ABC):
+    """Base of sinks, which receive the composed frames of a VideoHandler.
+
+    The composition stage only puts frames into a bounded queue, the frames are
+    processed in a background thread. So a slow sink can't stall the pipeline, unless
+    the BLOCK policy is chosen. The drop policy decides about frames arriving while
+    the queue is full:
+    - DROP_OLDEST, DROP_NEWEST: Discard a frame, the output skips it.
+    - BLOCK: Wait up to block_timeout for room, which slows down the composition
+      stage, and with it the displayed output, but never the camera or the GUI.
+
+    Subclasses implement _process(), and optionally _finish().
+
+    Args:
+        name: Name of the thread, and prefix of the metrics.
+        queue_size: Max frames waiting to be processed.
+        drop_policy: What to do with frames arriving while the queue is full.
+        block_timeout: Max seconds to wait for room with the BLOCK policy.
+        metrics_registry: Registry for lag and drop statistics.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        queue_size: int = 30,
+        drop_policy: structures.DropPolicy = structures.DropPolicy.DROP_OLDEST,
+        block_timeout: float = 1,
+        metrics_registry: metrics.Registry | None = None,
+    ) -> None:
+        self.name = name
+        self.block_timeout = block_timeout
+        self.metrics = metrics_registry or metrics.Registry()
+        # Seconds from put() until the last frame got processed
+        self.lag = 0.0
+        self._queue: structures.LatestValueQueue[tuple[structures.Frame, float]] = (
+            structures.LatestValueQueue(maxsize=queue_size, drop_policy=drop_policy)
+        )
+        self._lag_seconds = self.metrics.histogram(f"{name}_lag_seconds")
+        self.metrics.gauge(f"{name}_dropped_frames", lambda: self._queue.dropped)
+        self.metrics.gauge(f"{name}_queued_frames", lambda: len(self._queue))
+        self._thread: threading.Thread | None = None
+
+    @property
+    def dropped(self) -> int:
+        return self._queue.dropped
+
+    def start(self) -> None:
+        if self._thread is None and not self._queue.closed:
+            self._thread = threading.Thread(
+                target=self._run, name=self.name, daemon=True
+            )
+            self._thread.start()
+
+    def put(self, frame: structures.Frame) -> bool:
+        """Queue a composed frame, applying the drop policy.
+
+        Args:
+            frame: Composed frame. Its image must not be modified afterwards.
+
+        Returns:
+            False, if the frame got dropped.
+        """
+        return self._queue.put((frame, time.monotonic()), timeout=self.block_timeout)
+
+    def close(self) -> None:
+        """Process the queued frames, then stop the thread and finish the output."""
+        self._queue.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        logger.info("Sink %s started.", self.name)
+        try:
+            while (item := self._queue.get()) is not None:
+                frame, put_at = item
+                self._process(frame, put_at)
+                self.lag = time.monotonic() - put_at
+                self._lag_seconds.observe(self.lag)
+        except Exception:
+            logger.exception("Sink %s failed, stop feeding it.", self.name)
+            self._queue.close()
+        try:
+            self._finish()
+        except Exception:
+            logger.exception("Sink %s couldn't finish its output.", self.name)
+        logger.info("Sink %s stopped.", self.name)
+
+    @abc.abstractmethod
+    def _process(self, frame: structures.Frame, put_at: float) -> None:
+        """Write a frame to the output. Runs in the sink's thread."""
+
+    def _finish(self) -> None:  # noqa: B027 # Optional to override
+        """Finish the output after the last frame, e.g. close the file."""
+
+
+class Recorder(QueuedSink):
+    """Record the composed frames to a video file, exactly as displayed.
+
+    The recording has a constant frame rate, following the time the frames were
+    displayed: Frames replaced within one frame interval are skipped, frames displayed
+    longer are repeated. The size is set by the first frame, later frames of other
+    sizes (e.g. after resizing the window) are scaled to fit.
+
+    Args:
+        path: Video file (see VIDEO_CODECS) or directory to write PNG files into.
+        fps: Frame rate of the recording.
+        queue_size: Max frames waiting to be encoded.
+        drop_policy: What to do with frames arriving while the queue is full.
+        block_timeout: Max seconds to wait for room with the BLOCK policy.
+        metrics_registry: Registry for lag and drop statistics.
+
+    Raises:
+        ValueError: If the type of the file isn't supported.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        path: Path,
+        fps: float = 30,
+        queue_size: int = 30,
+        drop_policy: structures.DropPolicy = structures.DropPolicy.DROP_OLDEST,
+        block_timeout: float = 1,
+        metrics_registry: metrics.Registry | None = None,
+    ) -> None:
+        check_output(path)
+        super().__init__(
+            name="recording",
+            queue_size=queue_size,
+            drop_policy=drop_policy,
+            block_timeout=block_timeout,
+            metrics_registry=metrics_registry,
+        )
+        self.path = path
+        self.fps = fps
+        self.size_wh: tuple[int, int] | None = None
+        self.written = 0
+        self._writer: PngWriter | FfmpegWriter | None = None
+        self._started_at = 0.0
+        # Latest frame and its slot, written once the next frame has arrived
+        self._pending: np.ndarray | None = None
+        self._pending_slot = 0
+
+    def _process(self, frame: structures.Frame, put_at: float) -> None:
+        if self._writer is None:
+            height, width = frame.image.shape[:2]
+            # Even size, as required by most codecs
+            self.size_wh = (max(2, width // 2 * 2), max(2, height // 2 * 2))
+            self._writer = open_writer(self.path, self.size_wh, self.fps)
+            self._started_at = put_at
+            logger.info("Recording %sx%s to %s.", *self.size_wh, self.path)
+
+        slot = round((put_at - self._started_at) * self.fps)
+        image = fit(frame.image, self.size_wh or (0, 0))
+        if self._pending is not None:
+            repeats = slot - self._pending_slot
+            if repeats <= 0:
+                self._pending = image
+                return
+            for _ in range(repeats):
+                self._write(self._pending)
+        self._pending, self._pending_slot = image, slot
+
+    def _write(self, image: np.ndarray) -> None:
+        if self._writer:
+            self._writer.write(self.written, image)
+            self.written += 1
+
+    def _finish(self) -> None:
+        if self._pending is not None:
+            self._write(self._pending)
+            self._pending = None
+        if self._writer:
+            self._writer.close()
+        logger.info("Recorded %s frames to %s.", self.written, self.path)
+
+
+class PipeSink(QueuedSink):
+    """Stream the composed frames as Y4M or raw RGBA, e.g. into another program.
+
+    Y4M carries size, frame rate and the alpha channel (as full range YUV 4:4:4 with
+    alpha), so e.g. `ffplay -` or `ffmpeg -i -` can read it directly. Raw RGBA frames
+    have no header at all, their size is logged.
+
+    Frames are written as they are displayed, without timing. The target is opened in
+    the sink's thread, on the first frame. A FIFO is opened once a reader connected,
+    until then the frames are dropped, and the sink can be closed at any time. If the
+    reader goes away, the sink stops.
+
+    Args:
+        target: File or FIFO to write to. None for stdout.
+        fmt: One of PIPE_FORMATS.
+        fps: Nominal frame rate, written to the Y4M header.
+        size_wh: Size of the frames. Defaults to the size of the first frame.
+        queue_size: Max frames waiting to be written.
+        drop_policy: What to do with frames arriving while the queue is full.
+        metrics_registry: Registry for lag and drop statistics.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        target: Path | None = None,
+        fmt: str = "y4m",
+        fps: float = 30,
+        size_wh: tuple[int, int] | None = None,
+        queue_size: int = 2,
+        drop_policy: structures.DropPolicy = structures.DropPolicy.DROP_OLDEST,
+        metrics_registry: metrics.Registry | None = None,
+    ) -> None:
+        if fmt not in PIPE_FORMATS:
+            raise ValueError(f"Unsupported format {fmt}, use one of {PIPE_FORMATS}.")
+        super().__init__(
+            name="pipe",
+            queue_size=queue_size,
+            drop_policy=drop_policy,
+            metrics_registry=metrics_registry,
+        )
+        self.target = target
+        self.fmt = fmt
+        self.fps = fps
+        self.size_wh = size_wh
+        self._stream: BinaryIO | None = None
+        # Seconds between attempts to open a FIFO without reader
+        self.FIFO_RETRY_INTERVAL = 0.1
+
+    def _open_fifo(self, path: Path) -> BinaryIO | None:
+        """Open a FIFO for writing, once a reader connected.
+
+        A plain open() would block until then, so also close() would hang. Instead,
+        it's opened non-blocking, which fails as long as there is no reader.
+
+        Returns:
+            Stream, or None if the sink got closed before a reader connected.
+        """
+        logged = False
+        while not self._queue.closed:
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as exc:
+                if exc.errno != errno.ENXIO:
+                    raise
+                if not logged:
+                    logger.info("Waiting for a reader of %s.", path)
+                    logged = True
+                time.sleep(self.FIFO_RETRY_INTERVAL)
+                continue
+            os.set_blocking(fd, True)
+            return os.fdopen(fd, "wb")
+        return None
+
+    def _open(self, size_wh: tuple[int, int]) -> BinaryIO | None:
+        if self.target is None:
+            stream: BinaryIO | None = sys.stdout.buffer
+        elif self.target.exists() and stat.S_ISFIFO(self.target.stat().st_mode):
+            stream = self._open_fifo(self.target)
+        else:
+            stream = self.target.open("wb")
+        if stream is None:
+            return None
+        if self.fmt == "y4m":
+            fps_num, fps_den = float(self.fps).as_integer_ratio()
+            stream.write(
+                f"YUV4MPEG2 W{size_wh[0]} H{size_wh[1]} F{fps_num}:{fps_den} Ip A1:1 "
+                "C444alpha XCOLORRANGE=FULL\n".encode()
+            )
+        logger.info(
+            "Writing %sx%s %s frames to %s.",
+            *size_wh,
+            self.fmt,
+            self.target or "stdout",
+        )
+        return stream
+
+    def _process(self, frame: structures.Frame, put_at: float) -> None:
+        if self.size_wh is None:
+            height, width = frame.image.shape[:2]
+            self.size_wh = (width, height)
+        image = fit(frame.image, self.size_wh)
+        try:
+            if self._stream is None:
+                self._stream = self._open(self.size_wh)
+            if self._stream is None:
+                return
+            if self.fmt == "y4m":
+                self._stream.write(b"FRAME\n")
+                for plane in _rgba_to_yuva_planes(image):
+                    self._stream.write(plane.data)
+            else:
+                self._stream.write(np.ascontiguousarray(image).data)
+            self._stream.flush()
+        except BrokenPipeError:
+            logger.warning(
+                "Reader of %s is gone, stop writing.", self.target or "stdout"
+            )
+            self._queue.close()
+            self._stream = None
+
+    def _finish(self) -> None:
+        if self._stream is not None and self.target is not None:
+            self._stream.close()
+        self._stream = None
+
+
+def _rgba_to_yuva_planes(image: np.ndarray) -> list[np.ndarray]:
+    """Planes of a full range YUVA 4:4:4 image, in the order of Y4M."""
+    ycrcb = cv2.cvtColor(cv2.cvtColor(image, cv2.COLOR_RGBA2RGB), cv2.COLOR_RGB2YCrCb)
+    y, cr, cb = cv2.split(ycrcb)
+    return [y, cb, cr, np.ascontiguousarray(image[:, :, 3])]
+
+
+def _slot_offset(slot: int, max_size_wh: tuple[int, int]) -> int:
+    return _HEADER_SIZE + slot * (_HEADER_SIZE + max_size_wh[0] * max_size_wh[1] * 4)
+
+
+class SharedMemoryRing(QueuedSink):
+    """Publish the composed frames in a shared memory ring buffer, for other processes.
+
+    Layout, little endian:
+    - Header of 64 bytes: RING_MAGIC, number of slots, max width & height of the
+      frames, sequence number of the latest frame (uint32 x3, uint64).
+    - Slots, each with a header of 64 bytes (sequence number as uint64, capture
+      timestamp on the CLOCK_MONOTONIC clock as float64, width & height as uint32),
+      followed by room for an RGBA frame of max size.
+
+    Frame n (counting from 1) is written to slot n % slots. While a slot is written,
+    its sequence number is 0, so readers can detect frames being overwritten, see
+    RingReader. Frames larger than the max size are scaled down.
+
+    Args:
+        name: Name of the shared memory, e.g. /dev/shm/NAME on Linux.
+        slots: Number of frames kept. A reader has slots - 1 frame intervals to use a
+            frame without copying.
+        max_size_wh: Max size of the frames.
+        metrics_registry: Registry for lag and drop statistics.
+
+    Raises:
+        ValueError: If shared memory of that name already exists.
+    """
+
+    def __init__(
+        self,
+        name: str = "myhumbleself",
+        slots: int = 3,
+        max_size_wh: tuple[int, int] = (1920, 1080),
+        metrics_registry: metrics.Registry | None = None,
+    ) -> None:
+        super().__init__(name="shm", queue_size=1, metrics_registry=metrics_registry)
+        self.slots = slots
+        self.max_size_wh = max_size_wh
+        try:
+            self._shm = shared_memory.SharedMemory(
+                name=name, create=True, size=_slot_offset(slots, max_size_wh)
+            )
+        except FileExistsError as exc:
+            raise ValueError(f"Shared memory {name} is already in use.") from exc
+        _own_rings.add(self._shm.name)
+        _RING_HEADER.pack_into(self._shm.buf, 0, RING_MAGIC, slots, *max_size_wh, 0)
+        self._seq = 0
+        logger.info("Publishing frames in shared memory %s.", name)
+
+    def _process(self, frame: structures.Frame, put_at: float) -> None:
+        image = frame.image
+        height, width = image.shape[:2]
+        factor = min(1, self.max_size_wh[0] / width, self.max_size_wh[1] / height)
+        if factor < 1:
+            width = max(1, min(self.max_size_wh[0], round(width * factor)))
+            height = max(1, min(self.max_size_wh[1], round(height * factor)))
+            image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+        self._seq += 1
+        offset = _slot_offset(self._seq % self.slots, self.max_size_wh)
+        buffer = self._shm.buf
+        _SLOT_HEADER.pack_into(buffer, offset, 0, 0, 0, 0)
+        pixels: np.ndarray = np.ndarray(
+            (height, width, 4),
+            dtype=np.uint8,
+            buffer=buffer,
+            offset=offset + _HEADER_SIZE,
+        )
+        pixels[:] = image
+        del pixels  # Views have to be released before closing the shared memory
+        _SLOT_HEADER.pack_into(
+            buffer, offset, self._seq, frame.timestamp, width, height
+        )
+        struct.pack_into("<Q", buffer, _RING_HEADER.size - 8, self._seq)
+
+    def close(self) -> None:
+        super().close()
+        _own_rings.discard(self._shm.name)
+        self._shm.close()
+        self._shm.unlink()
+
+
+class RingReader:
+    """Read frames published by a SharedMemoryRing, e.g. in another process.
+
+    Args:
+        name: Name of the shared memory.
+
+    Raises:
+        ValueError: If the shared memory doesn't contain a ring.
+    """
+
+    def __init__(self, name: str = "myhumbleself") -> None:
+        # The memory belongs to the writer, so don't unlink it when this process exits
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, track=False)  # type: ignore[call-arg]
+        except TypeError:  # Before Python 3.13, attaching always registers it
+            self._shm = shared_memory.SharedMemory(name=name)
+            # In the writer's process, the registration is the writer's own one
+            if self._shm.name not in _own_rings:
+                resource_tracker.unregister(self._shm._name, "shared_memory")  # type: ignore[attr-defined]
+        magic, self.slots, width, height, _ = _RING_HEADER.unpack_from(self._shm.buf)
+        if magic != RING_MAGIC:
+            self._shm.close()
+            raise ValueError(f"Shared memory {name} contains no frame ring.")
+        self.max_size_wh = (width, height)
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the latest frame, 0 if there is none yet."""
+        return struct.unpack_from("<Q", self._shm.buf, _RING_HEADER.size - 8)[0]
+
+    def latest(self) -> tuple[int, float, np.ndarray] | None:
+        """Latest frame, without copying it.
+
+        Returns:
+            Sequence number, capture timestamp and RGBA image, or None if there is no
+            frame yet. The image is a view into the shared memory, which is valid until
+            the writer reuses its slot. Check with is_valid() after using it, or copy
+            it. Views have to be released before calling close().
+        """
+        seq = self.seq
+        if not seq:
+            return None
+        offset = _slot_offset(seq % self.slots, self.max_size_wh)
+        slot_seq, timestamp, width, height = _SLOT_HEADER.unpack_from(
+            self._shm.buf, offset
+        )
+        if slot_seq != seq:
+            return None
+        image: np.ndarray = np.ndarray(
+            (height, width, 4),
+            dtype=np.uint8,
+            buffer=self._shm.buf,
+            offset=offset + _HEADER_SIZE,
+        )
+        return seq, timestamp, image
+
+    def is_valid(self, seq: int) -> bool:
+        """Check, if the frame with this sequence number wasn't overwritten yet."""
+        offset = _slot_offset(seq % self.slots, self.max_size_wh)
+        return _SLOT_HEADER.unpack_from(self._shm.buf, offset)[0] == seq
+
+    def close(self) -> None:
+        self._shm.close()
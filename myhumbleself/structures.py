@@ -1,10 +1,22 @@
+import threading
+from collections import deque
+from collections.abc import Iterator, Sequence
 from dataclasses import dataclass
+from enum import Enum
+from typing import Generic, TypeVar
 
+import numpy as np
 
-@dataclass
+T = TypeVar("T")
+
+
+@dataclass(slots=True)
 class Rect:
     """Data structure to represent and transform rectangles.
 
+    Slotted, as several instances are created per frame. To transform many rectangles
+    at once, use RectArray.
+
     Note: Using OpenCV style geometry ordering (y, x, height, width)
     """
 
@@ -16,6 +28,12 @@ class Rect:
     def __str__(self) -> str:
         return f"Rect(x={self.left}, y={self.top}, w={self.width}, h={self.height})"
 
+    @staticmethod
+    def from_geometry(geometry: Sequence[int] | np.ndarray) -> "Rect":
+        """Create a rectangle from (top, left, height, width), like Rect.geometry."""
+        top, left, height, width = np.asarray(geometry, dtype=int).tolist()
+        return Rect(top=top, left=left, height=height, width=width)
+
     @property
     def right(self) -> int:
         return self.left + self.width
@@ -70,6 +88,22 @@ class Rect:
     def copy(self) -> "Rect":
         return Rect(top=self.top, left=self.left, height=self.height, width=self.width)
 
+    def map_between(
+        self, source_size_hw: tuple[int, int], target_size_hw: tuple[int, int]
+    ) -> None:
+        """Convert the rectangle from one image resolution to another.
+
+        Args:
+            source_size_hw: Height and width of the image, the rectangle refers to.
+            target_size_hw: Height and width of the image to convert to.
+        """
+        factor_y = target_size_hw[0] / source_size_hw[0]
+        factor_x = target_size_hw[1] / source_size_hw[1]
+        self.top = int(self.top * factor_y)
+        self.left = int(self.left * factor_x)
+        self.height = int(self.height * factor_y)
+        self.width = int(self.width * factor_x)
+
     def move_by(self, y: int, x: int) -> None:
         """Move the rectangle by the provided x and y values.
 
@@ -96,3 +130,241 @@ class Rect:
 
         self.top = min(max(0, self.top), height - self.height)
         self.left = min(max(0, self.left), width - self.width)
+
+
+class RectArray:
+    """Several rectangles, transformed at once by NumPy operations.
+
+    The methods behave like the ones of Rect, applied to every rectangle, so the cost
+    hardly grows with the number of rectangles. For a single rectangle, a Rect is
+    a lot cheaper, though.
+
+    Indexing and iterating return copies as Rect, for code working with single
+    rectangles. Changing them doesn't affect the RectArray.
+
+    Args:
+        geometry: Rows of (top, left, height, width), like Rect.geometry.
+    """
+
+    __slots__ = ("geometry",)
+
+    def __init__(self, geometry: np.ndarray | Sequence[Sequence[int]]) -> None:
+        self.geometry: np.ndarray = np.array(geometry, dtype=int).reshape(-1, 4)
+
+    @staticmethod
+    def from_rects(rects: Sequence[Rect]) -> "RectArray":
+        return RectArray([rect.geometry for rect in rects])
+
+    def __len__(self) -> int:
+        return len(self.geometry)
+
+    def __getitem__(self, index: int) -> Rect:
+        return Rect.from_geometry(self.geometry[index])
+
+    def __iter__(self) -> Iterator[Rect]:
+        for top, left, height, width in self.geometry.tolist():
+            yield Rect(top=top, left=left, height=height, width=width)
+
+    def __repr__(self) -> str:
+        return f"RectArray({self.geometry.tolist()})"
+
+    @property
+    def top(self) -> np.ndarray:
+        return self.geometry[:, 0]
+
+    @property
+    def left(self) -> np.ndarray:
+        return self.geometry[:, 1]
+
+    @property
+    def height(self) -> np.ndarray:
+        return self.geometry[:, 2]
+
+    @property
+    def width(self) -> np.ndarray:
+        return self.geometry[:, 3]
+
+    @property
+    def bottom(self) -> np.ndarray:
+        return self.top + self.height
+
+    @property
+    def right(self) -> np.ndarray:
+        return self.left + self.width
+
+    @property
+    def area(self) -> np.ndarray:
+        return np.abs(self.width * self.height)
+
+    def copy(self) -> "RectArray":
+        return RectArray(self.geometry)
+
+    def pad(self, padding: int | np.ndarray) -> None:
+        """Centered padding of the rectangles, like the method of Rect.
+
+        Args:
+            padding: Absolute padding value, for all or per rectangle.
+        """
+        padding = np.asarray(padding)
+        self.geometry[:, :2] -= padding[..., None]
+        self.geometry[:, 2:] += 2 * padding[..., None]
+
+    def scale(self, factor: float | np.ndarray) -> None:
+        """Centered scaling of the rectangles, like the method of Rect.
+
+        Args:
+            factor: Multiplication factor, for all or per rectangle.
+        """
+        sizes = self.geometry[:, 2:]
+        new_sizes = np.trunc(sizes * np.asarray(factor)[..., None]).astype(int)
+        self.geometry[:, :2] -= np.trunc((new_sizes - sizes) / 2).astype(int)
+        self.geometry[:, 2:] = new_sizes
+
+    def map_between(
+        self, source_size_hw: tuple[int, int], target_size_hw: tuple[int, int]
+    ) -> None:
+        """Convert the rectangles from one image resolution to another.
+
+        Args:
+            source_size_hw: Height and width of the image, the rectangles refer to.
+            target_size_hw: Height and width of the image to convert to.
+        """
+        factor_y = target_size_hw[0] / source_size_hw[0]
+        factor_x = target_size_hw[1] / source_size_hw[1]
+        factors = np.array([factor_y, factor_x, factor_y, factor_x])
+        self.geometry[:] = np.trunc(self.geometry * factors)
+
+    def move_by(self, y: int | np.ndarray, x: int | np.ndarray) -> None:
+        """Move the rectangles by the provided x and y values.
+
+        Args:
+            y: Value to move the rectangles by on the y-axis, for all or per rectangle.
+            x: Value to move the rectangles by on the x-axis, for all or per rectangle.
+        """
+        self.geometry[:, 0] += y
+        self.geometry[:, 1] += x
+
+    def stay_within(self, height: int, width: int) -> None:
+        """Ensure the rectangles are within the bounds, like the method of Rect.
+
+        Preserves aspect ratios.
+
+        Args:
+            height: Height of the bounding box.
+            width: Width of the bounding box.
+        """
+        factor = np.minimum(width / self.width, height / self.height)
+        self.scale(np.minimum(factor, 1))
+        self.geometry[:, 0] = np.minimum(np.maximum(0, self.top), height - self.height)
+        self.geometry[:, 1] = np.minimum(np.maximum(0, self.left), width - self.width)
+
+
+@dataclass
+class Frame:
+    """Image passed between the stages of the video pipeline.
+
+    Attributes:
+        image: Pixel data, BGR as delivered by OpenCV or RGBA after composition.
+        seq: Sequence number assigned by the camera, increasing per captured frame.
+        timestamp: Capture time in seconds, on the time.monotonic() clock.
+    """
+
+    image: np.ndarray
+    seq: int
+    timestamp: float
+
+
+class DropPolicy(Enum):
+    """Strategy of a LatestValueQueue for new values when it is full."""
+
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    BLOCK = "block"
+
+
+class LatestValueQueue(Generic[T]):
+    """Bounded, thread-safe queue connecting the stages of the video pipeline.
+
+    Consumers usually only care about the most recent value, so the queue is small and
+    never grows. When it is full, the drop policy decides what happens on put():
+    - DROP_OLDEST: discard the oldest queued value (default, lowest latency).
+    - DROP_NEWEST: discard the value being put.
+    - BLOCK: wait until a consumer made room, or until the timeout is over.
+    """
+
+    def __init__(
+        self, maxsize: int = 1, drop_policy: DropPolicy = DropPolicy.DROP_OLDEST
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("Queue size needs to be at least 1!")
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self.dropped = 0
+        self._items: deque[T] = deque()
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._items)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def put(self, item: T, timeout: float | None = None) -> bool:
+        """Add a value, applying the drop policy if the queue is full.
+
+        Args:
+            item: Value to be queued.
+            timeout: Max seconds to wait for free space, only used by BLOCK policy.
+
+        Returns:
+            True if the item got queued, False if it got dropped.
+        """
+        with self._condition:
+            if self._closed:
+                return False
+            if self.drop_policy is DropPolicy.BLOCK:
+                self._condition.wait_for(
+                    lambda: len(self._items) < self.maxsize or self._closed, timeout
+                )
+            if self._closed or (
+                len(self._items) >= self.maxsize
+                and self.drop_policy is not DropPolicy.DROP_OLDEST
+            ):
+                self.dropped += 1
+                return False
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._condition.notify_all()
+            return True
+
+    def get(self, timeout: float | None = None) -> T | None:
+        """Remove and return the oldest queued value.
+
+        Args:
+            timeout: Max seconds to wait for a value. 0 doesn't wait at all, None waits
+                until a value arrives or the queue gets closed.
+
+        Returns:
+            Queued value or None, if nothing arrived in time.
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self._items or self._closed, timeout
+            ):
+                return None
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._condition.notify_all()
+            return item
+
+    def close(self) -> None:
+        """Wake up all waiting producers and consumers and refuse further values."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
@@ -0,0 +1,99 @@
+import logging
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Generic, TypeVar
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Width of the thumbnails in the camera menu, in pixels
+THUMBNAIL_WIDTH = 192
+
+
+def create_thumbnail(image: np.ndarray, width: int = THUMBNAIL_WIDTH) -> np.ndarray:
+    """Downscale a camera frame to a thumbnail.
+
+    Args:
+        image: BGR camera frame.
+        width: Width of the thumbnail. The height keeps the aspect ratio.
+
+    Returns:
+        RGBA thumbnail.
+    """
+    height = max(1, round(image.shape[0] * width / image.shape[1]))
+    thumbnail = cv2.resize(image, dsize=(width, height), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(thumbnail, cv2.COLOR_BGR2RGBA)
+
+
+class ThumbnailCache(Generic[T]):
+    """Create thumbnails of camera frames in a background thread, and cache them.
+
+    Downscaling and converting a frame (e.g. into a texture) happens in a worker
+    thread, so the GTK main loop isn't blocked. Requests for a camera, which still has
+    one pending, are dropped, so a slow worker can't pile up work.
+
+    Args:
+        to_texture: Converts an RGBA thumbnail into the cached type, e.g. a texture.
+        on_update: Called with the camera id and the new thumbnail, from the worker
+            thread.
+    """
+
+    def __init__(
+        self,
+        to_texture: Callable[[np.ndarray], T],
+        on_update: Callable[[int, T], object] | None = None,
+    ) -> None:
+        self.to_texture = to_texture
+        self.on_update = on_update
+        self._thumbnails: dict[int, T] = {}
+        self._pending: set[int] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="thumbnails"
+        )
+
+    def get(self, cam_id: int) -> T | None:
+        """Cached thumbnail of the camera, or None if there is none yet."""
+        with self._lock:
+            return self._thumbnails.get(cam_id)
+
+    def request(self, cam_id: int, image: np.ndarray) -> bool:
+        """Schedule creating a new thumbnail of the camera.
+
+        Args:
+            cam_id: Camera the frame belongs to.
+            image: BGR camera frame. Must not be modified afterwards.
+
+        Returns:
+            False, if the request was dropped because one is still pending.
+        """
+        with self._lock:
+            if cam_id in self._pending:
+                return False
+            self._pending.add(cam_id)
+        self._executor.submit(self._update, cam_id, image)
+        return True
+
+    def _update(self, cam_id: int, image: np.ndarray) -> None:
+        try:
+            texture = self.to_texture(create_thumbnail(image))
+        except Exception:
+            logger.exception("Couldn't create thumbnail of camera %s.", cam_id)
+            return
+        finally:
+            with self._lock:
+                self._pending.discard(cam_id)
+
+        with self._lock:
+            self._thumbnails[cam_id] = texture
+        if self.on_update:
+            self.on_update(cam_id, texture)
+
+    def close(self) -> None:
+        """Finish pending requests and stop the worker thread."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,154 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class Tracer:
+    """Record spans of the processing stages in the Chrome trace-event format.
+
+    The resulting file can be opened in https://ui.perfetto.dev or chrome://tracing.
+    Every span is tagged with the thread it ran in and the sequence number of the
+    frame it belongs to.
+
+    Events are buffered in a bounded deque (oldest events are dropped, if the writer
+    can't keep up) and appended to the file by a background thread. If the tracer is
+    disabled, span() does nothing.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        max_events: int = 100_000,
+        flush_interval: float = 1,
+    ) -> None:
+        self.path = path
+        self.enabled = path is not None
+        self.flush_interval = flush_interval
+        self._events: deque[dict] = deque(maxlen=max_events)
+        self._known_threads: set[tuple[int, str]] = set()
+        self._pid = os.getpid()
+        self._stop = threading.Event()
+        self._writer: threading.Thread | None = None
+        self._is_first_event = True
+
+        if self.path is not None:
+            self.path.write_text("[")
+            self._writer = threading.Thread(
+                target=self._write_loop, name="trace-writer", daemon=True
+            )
+            self._writer.start()
+            logger.info("Writing trace to %s.", self.path)
+
+    def prefixed(self, prefix: str) -> "Tracer":
+        """View of this tracer, which adds a prefix to the names of all spans.
+
+        Used e.g. for the pipelines of insets, to tell their spans apart from the
+        ones of the main pipeline. Closing the view doesn't close this tracer.
+        """
+        return _PrefixedTracer(self, prefix)
+
+    @contextmanager
+    def span(self, name: str, seq: int | None = None) -> Iterator[None]:
+        """Record the duration of the with-block.
+
+        Args:
+            name: Name of the span, e.g. the pipeline stage.
+            seq: Sequence number of the frame being processed.
+        """
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self._add_event(name, started, time.perf_counter_ns() - started, seq)
+
+    def _add_event(
+        self, name: str, started_ns: int, duration_ns: int, seq: int | None
+    ) -> None:
+        thread_id = threading.get_native_id()
+        thread_name = threading.current_thread().name
+        # Thread ids get reused, e.g. after restarting the camera, so track the names
+        if (thread_id, thread_name) not in self._known_threads:
+            self._known_threads.add((thread_id, thread_name))
+            self._events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self._pid,
+                    "tid": thread_id,
+                    "args": {"name": thread_name},
+                }
+            )
+        self._events.append(
+            {
+                "name": name,
+                "cat": "pipeline",
+                "ph": "X",
+                "ts": started_ns / 1000,
+                "dur": duration_ns / 1000,
+                "pid": self._pid,
+                "tid": thread_id,
+                "args": {} if seq is None else {"seq": seq},
+            }
+        )
+
+    def _write_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self) -> None:
+        """Append all buffered events to the trace file."""
+        if self.path is None:
+            return
+        chunks = []
+        while self._events:
+            event = self._events.popleft()
+            separator = "\n" if self._is_first_event else ",\n"
+            self._is_first_event = False
+            chunks.append(separator + json.dumps(event))
+        if chunks:
+            with self.path.open("a") as fh:
+                fh.write("".join(chunks))
+
+    def close(self) -> None:
+        """Write the remaining events and finish the trace file."""
+        if self.path is None or self._writer is None:
+            return
+        self._stop.set()
+        self._writer.join()
+        self._writer = None
+        with self.path.open("a") as fh:
+            fh.write("\n]\n")
+        logger.info("Trace written to %s.", self.path)
+
+
+class _PrefixedTracer(Tracer):
+    """Tracer handed out by Tracer.prefixed(). Records all spans in the parent."""
+
+    def __init__(self, parent: Tracer, prefix: str) -> None:
+        super().__init__()
+        self.enabled = parent.enabled
+        self._parent = parent
+        self._prefix = prefix
+
+    @contextmanager
+    def span(self, name: str, seq: int | None = None) -> Iterator[None]:
+        with self._parent.span(self._prefix + name, seq=seq):
+            yield
+
+    def flush(self) -> None:
+        self._parent.flush()
+
+    def close(self) -> None:
+        """Does nothing, the parent is closed by its owner."""
@@ -0,0 +1,122 @@
+import numpy as np
+
+# Boxes are arrays with one row of (top, left, height, width) per face, the same order
+# as structures.Rect.geometry.
+
+
+def iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Intersection over union of every box of boxes_a with every box of boxes_b.
+
+    Returns:
+        Matrix of shape (len(boxes_a), len(boxes_b)).
+    """
+    top_a, left_a, height_a, width_a = (c[:, None] for c in boxes_a.T)
+    top_b, left_b, height_b, width_b = boxes_b.T
+    overlap_y = np.minimum(top_a + height_a, top_b + height_b) - np.maximum(
+        top_a, top_b
+    )
+    overlap_x = np.minimum(left_a + width_a, left_b + width_b) - np.maximum(
+        left_a, left_b
+    )
+    intersection = np.clip(overlap_y, 0, None) * np.clip(overlap_x, 0, None)
+    union_area = height_a * width_a + height_b * width_b - intersection
+    return intersection / np.maximum(union_area, 1)
+
+
+def union(boxes: np.ndarray) -> np.ndarray:
+    """Smallest box containing all boxes."""
+    top, left = boxes[:, 0].min(), boxes[:, 1].min()
+    bottom = (boxes[:, 0] + boxes[:, 2]).max()
+    right = (boxes[:, 1] + boxes[:, 3]).max()
+    return np.array([top, left, bottom - top, right - left])
+
+
+def stabilize(
+    last: np.ndarray,
+    new: np.ndarray,
+    threshold_factor: float,
+    speed_factor: float = 1,
+) -> np.ndarray:
+    """Suppress small fluctuations and move smoothly towards new values.
+
+    Args:
+        last: Values used before.
+        new: Target values.
+        threshold_factor: Changes up to this fraction of the last value are ignored.
+        speed_factor: Fraction of the way to move towards bigger changes, at least by 1.
+            1 to jump right to the new value.
+
+    Returns:
+        Values to be used now, as integers.
+    """
+    distance = new - last
+    step = np.trunc(np.sign(distance) * np.maximum(1, np.abs(distance) * speed_factor))
+    is_fluctuation = np.abs(distance) <= last * threshold_factor
+    return np.where(is_fluctuation, last, last + step).astype(int)
+
+
+class FaceTracks:
+    """Follow several faces over time, by matching detections to known faces.
+
+    A detection and a track are matched, if each is the best overlapping of the other.
+    Matched tracks move smoothly towards their detection, unmatched detections start
+    new tracks, and tracks without detection for a while are dropped. All steps are
+    NumPy operations on arrays of boxes, so the cost hardly grows with the number of
+    faces.
+
+    Args:
+        smoothing: Fraction of the way a track moves towards its detection per update.
+        min_iou: Min overlap (intersection over union) of a matching detection.
+        max_misses: Updates without matching detection, before a track is dropped.
+            Avoids jumps of the framing, if a face is missed once in a while.
+    """
+
+    def __init__(
+        self, smoothing: float = 0.3, min_iou: float = 0.2, max_misses: int = 10
+    ) -> None:
+        self.smoothing = smoothing
+        self.min_iou = min_iou
+        self.max_misses = max_misses
+        self.boxes = np.empty((0, 4), dtype=float)
+        self.misses = np.empty(0, dtype=int)
+
+    def update(self, detections: np.ndarray) -> np.ndarray:
+        """Match the detections of a frame to the tracks.
+
+        Args:
+            detections: Boxes of the detected faces.
+
+        Returns:
+            Boxes of all tracked faces, as integers.
+        """
+        detections = detections.astype(float).reshape(-1, 4)
+        tracks = np.arange(len(self.boxes))
+        matched = np.zeros(len(self.boxes), dtype=bool)
+        best_detection = np.zeros(len(self.boxes), dtype=int)
+        if len(self.boxes) and len(detections):
+            overlaps = iou(self.boxes, detections)
+            best_detection = overlaps.argmax(axis=1)
+            best_track = overlaps.argmax(axis=0)
+            matched = (best_track[best_detection] == tracks) & (
+                overlaps[tracks, best_detection] >= self.min_iou
+            )
+
+        matched_detections = best_detection[matched]
+        self.boxes[matched] += (
+            detections[matched_detections] - self.boxes[matched]
+        ) * self.smoothing
+        self.misses[matched] = 0
+        self.misses[~matched] += 1
+
+        unmatched = np.ones(len(detections), dtype=bool)
+        unmatched[matched_detections] = False
+        kept = self.misses <= self.max_misses
+        self.boxes = np.concatenate([self.boxes[kept], detections[unmatched]])
+        self.misses = np.concatenate(
+            [self.misses[kept], np.zeros(unmatched.sum(), dtype=int)]
+        )
+        return np.rint(self.boxes).astype(int)
+
+    def reset(self) -> None:
+        self.boxes = np.empty((0, 4), dtype=float)
+        self.misses = np.empty(0, dtype=int)
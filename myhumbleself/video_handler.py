@@ -1,21 +1,45 @@
+import dataclasses
 import logging
+import math
+import threading
+import time
 from collections.abc import Callable
+from pathlib import Path
 
 import cv2
 import numpy as np
 
-from myhumbleself import camera, face_detection, structures
+from myhumbleself import (
+    camera,
+    capture_modes,
+    face_detection,
+    governor,
+    insets,
+    metrics,
+    sinks,
+    structures,
+    tracing,
+    tracking,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def default_shape_png() -> bytes:
+    """Circle shape, like the GUI's default shape, which is only in the gresource."""
+    shape = np.zeros((512, 512), dtype=np.uint8)
+    cv2.circle(shape, center=(256, 256), radius=256, color=(255,), thickness=-1)
+    return cv2.imencode(".png", shape)[1].tobytes()
+
+
 def cache(func: Callable) -> Callable:
     """Custom approximating cache decorator for numpy arrays.
 
     This is intended to be used in VideoHandler._process_frame method only!
 
-    The reason is, that often the GTK gui will call get_frame faster than the FPS of
-    the camera. This will result in the same frame being processed multiple times.
+    The reason is, that callers processing frames synchronously (i.e. without the
+    pipeline threads) often poll faster than the FPS of the camera. This will result in
+    the same frame being processed multiple times.
 
     This decorator instead caches the processed frame and serves it, if the frame is
     still the same.
@@ -30,74 +54,256 @@ def cache(func: Callable) -> Callable:
 
     (functools.lru_cache does not work with numpy arrays, as they are not hashable.
     hashing the whole image is too slow, anyway.)
+
+    The cache is kept per instance, in VideoHandler._process_cache. Id and content are
+    replaced together as one tuple, so concurrent callers never get the content of
+    another frame.
     """
-    cache.id = 0  # type: ignore [attr-defined]
-    cache.content = None  # type: ignore [attr-defined]
 
     def inner(cls, ary: np.ndarray) -> np.ndarray:  # noqa: ANN001
         new_cache_id = ary[::100, ::100, 1].data.tobytes()  # type: ignore [attr-defined]
-        if new_cache_id != cache.id:  # type: ignore [attr-defined]
-            cache.id = new_cache_id  # type: ignore [attr-defined]
-            cache.content = func(cls, ary)  # type: ignore [attr-defined]
-        return cache.content  # type: ignore [attr-defined]
+        cached = cls._process_cache
+        if cached is not None and cached[0] == new_cache_id:
+            cls.metrics.counter("process_cache_hits").inc()
+            return cached[1]
+        content = func(cls, ary)
+        cls._process_cache = (new_cache_id, content)
+        cls.metrics.counter("process_cache_misses").inc()
+        return content
 
     return inner
 
 
 class VideoHandler:
-    def __init__(  # noqa:PLR0913
+    """Turns camera frames into shaped images, ready to be displayed.
+
+    The work is split into a pipeline of stages, each running in its own thread:
+    - decode: Camera.update() reads and decodes frames from the device.
+    - detection: Locates the face in the latest decoded frame.
+    - composition: Crops the frame around the face and applies the shape mask.
+
+    The stages are connected by small LatestValueQueues, so a slow stage never builds
+    up a backlog, but works on the freshest frame available. As OpenCV releases the GIL
+    during its heavy lifting, the stages can make use of multiple cores. On
+    free-threaded Python builds, also their Python parts run in parallel. The GTK main
+    thread only picks up the composed frames via get_processed_frame().
+
+    Thread safety doesn't rely on the GIL:
+    - Settings (zoom, offsets, flags, shape, ...) are written by the GUI thread and
+      read by the stages. Each holds an immutable value or is replaced as a whole.
+      Settings which belong together are changed and read together under _view_lock.
+    - Shared collections (insets, sinks, available cameras) are replaced as a whole,
+      never modified in place, so they can be iterated without lock.
+    - State of a stage, e.g. the history of the face detection, is only touched by
+      that stage. Other threads change it under the stage's lock (_detection_lock).
+    - Frames are passed between threads via LatestValueQueues, and not modified after.
+
+    The composition stage runs at display rate, not at camera rate: On every display
+    refresh (see request_render()) the crop area is moved a bit closer to its target,
+    and the last decoded frame is cropped again. This results in smooth pan & zoom
+    motions, even with low FPS cameras, without any additional detection cost.
+
+    All geometry (face, focus & mask area, offsets) refers to the camera's default
+    resolution, see _frame_size_hw. That way, the capture resolution can be changed,
+    e.g. by the QualityGovernor, without affecting the framing. This is also used to
+    capture in a cheaper mode, if the displayed output doesn't need all pixels, see
+    _update_capture_mode().
+
+    Further cameras can be added as insets (picture-in-picture), see add_inset(). Each
+    of them runs a pipeline of its own, with independent shape and framing. Their face
+    detection shares one FaceDetectionBatcher with this handler, so frames of all
+    sources are processed together by one inference. The composed frames of the insets
+    are blended into the output in this handler's composition stage.
+
+    Besides the GUI, the composed frames can be passed to sinks, e.g. a Recorder, see
+    add_sink(). The sinks process them in threads of their own.
+
+    Without camera (cam_id None), no pipeline is started. Instead, frames e.g. of a
+    video file are passed to render_frame() one by one, see the render module.
+    """
+
+    def __init__(  # noqa:PLR0913,PLR0915
         self,
-        cam_id: int,
+        cam_id: int | None,
         shape_png_buffer: bytes,
         zoom_factor: float,
         offset_x: int,
         offset_y: int,
         follow_face: bool,
+        queue_size: int = 1,
+        drop_policy: structures.DropPolicy = structures.DropPolicy.DROP_OLDEST,
+        detect_in_process: bool = False,
+        quality_governor: governor.QualityGovernor | None = None,
+        metrics_registry: metrics.Registry | None = None,
+        tracer: tracing.Tracer | None = None,
+        stamp_frames: bool = False,
+        demo_video: Path | None = None,
+        demo_realtime: bool = True,
+        device_dir: Path | None = None,
+        on_cameras_changed: Callable[[], object] | None = None,
+        face_detector: (
+            face_detection.FaceDetection | face_detection.FaceDetectionProcess | None
+        ) = None,
+        available_cameras: dict[int, np.ndarray] | None = None,
     ) -> None:
         self._shape_mask = cv2.imdecode(
             np.frombuffer(shape_png_buffer, dtype=np.uint8), cv2.IMREAD_GRAYSCALE
         )
-        # Face detection area. Cached here to allow the use case, where face detection
-        # is only used once to get the face, but then disabled to avoid tracking during
-        # presentation.
-        self._face_area: structures.Rect | None = None
+        # Face detection areas, see tracking module. Cached here to allow the use case,
+        # where face detection is only used once to get the face, but then disabled to
+        # avoid tracking during presentation.
+        self._face_areas: np.ndarray | None = None
         # User adjusted area, with padding, offset and zoom. Cached to allow allow
         # detection, if we are already at the edge of the image, to disable buttons
         self._focus_area: structures.Rect | None = None
 
-        self._camera = camera.Camera()
-        self._face_detection = face_detection.FaceDetection()
+        self.metrics = metrics_registry or metrics.Registry()
+        self.tracer = tracer or tracing.Tracer()
+        self._camera = camera.Camera(
+            metrics_registry=self.metrics,
+            tracer=self.tracer,
+            demo_video=demo_video,
+            demo_realtime=demo_realtime,
+            # Without camera, there's no need to probe for any
+            available_cameras={} if cam_id is None else available_cameras,
+            queue_size=queue_size,
+            drop_policy=drop_policy,
+        )
+        self._camera.stamp_frames = stamp_frames
+        self._face_detection = face_detector or (
+            face_detection.FaceDetectionProcess()
+            if detect_in_process
+            else face_detection.FaceDetection()
+        )
+        # Held while detecting, so the detection can be replaced by a shared one
+        self._detection_lock = threading.Lock()
+        # Held while changing or reading zoom factor and offsets, see _get_view()
+        self._view_lock = threading.Lock()
+        # Held while releasing or resuming the camera, see _apply_camera_running()
+        self._camera_power_lock = threading.Lock()
+        self._camera_should_run = True
+        self._detection_batcher: face_detection.FaceDetectionBatcher | None = None
+        self._insets: list[insets.Inset] = []
+        # Numbers the insets, to name their metrics & spans. Cameras can be repeated.
+        self._added_insets = 0
+        self._sinks: list[sinks.QueuedSink] = []
 
-        self.zoom_factor = zoom_factor
-        self.offset_x = offset_x
-        self.offset_y = offset_y
+        # Read-only from outside, changed via set_view(), move_view() & reset_view()
+        self._zoom_factor = zoom_factor
+        self._offset_x = offset_x
+        self._offset_y = offset_y
 
         self.follow_face = follow_face
+        # Frame all faces, instead of the largest one, see set_group_framing()
+        self.group_framing = False
+        # Changes of the group's focus area up to this fraction are ignored
+        self.GROUP_FLUCTUATION_THRESHOLD = 0.05
+        self._group_focus_geometry: np.ndarray | None = None
         self.ZOOM_STEP = 0.1
         self.MOVE_STEP = 20
         self.MIN_ZOOM_FACTOR = 0.1
+        # Time in seconds for the crop area to cover ~63% of the way to its target.
+        # 0 disables the interpolation.
+        self.PAN_ZOOM_TIME_CONSTANT = 0.1
+        # Max time between renderings, if nobody requests them via request_render()
+        self.MAX_RENDER_INTERVAL = 1 / 60
+        # Max seconds a stage waits for room in the next queue with BLOCK policy, before
+        # it drops the frame and checks for stop() & changed settings again
+        self.BLOCK_TIMEOUT = 0.1
+        self.STAGES = ("decode", "detection", "composition")
         self.debug_mode = False
+        self.detection_enabled = True
+        self.detect_every_n_frames = 1
+        self.max_output_width: int | None = None
+        # Width the composed frames are scaled to, if shown as inset of another handler
+        self.inset_width: int | None = None
+        self.quality_governor = quality_governor
+        # Capture resolution is chosen to provide enough pixels for the output size,
+        # but not more than this fraction of the default resolution:
+        self.capture_scale = 1.0
+        self.MIN_CAPTURE_FPS = 30
+        self.MODE_UPDATE_INTERVAL = 0.25
+        self._output_size_wh: tuple[int, int] | None = None
+        # Size of the frames passed to render_frame(), replaces the camera's size
+        self._input_size_hw: tuple[int, int] | None = None
+        self._mode_selector: capture_modes.ModeSelector | None = None
+        self._last_mode_update = 0.0
+        # Id and result of the last frame processed by _process_frame(), see cache()
+        self._process_cache: tuple[bytes, np.ndarray] | None = None
 
-        self.available_cameras = self._camera.available_cameras
         self.FALLBACK_CAM_ID = self._camera.FALLBACK_CAM_ID
         self.DEMO_CAM_ID = self._camera.DEMO_CAM_ID
 
+        # Pipeline state. Frames which passed detection (together with the face area),
+        # and fully composed frames:
+        self._detected_frames: structures.LatestValueQueue[
+            tuple[structures.Frame, np.ndarray]
+        ] = structures.LatestValueQueue(maxsize=queue_size, drop_policy=drop_policy)
+        self._composed_frames: structures.LatestValueQueue[structures.Frame] = (
+            structures.LatestValueQueue(maxsize=queue_size, drop_policy=drop_policy)
+        )
+        self._last_composed_frame: np.ndarray = np.zeros((1, 1, 4), np.uint8)
+        # Sequence number & capture timestamp of the frame last returned to the GUI
+        self.last_composed_seq = 0
+        self.last_composed_timestamp = time.monotonic()
+        self._render_requested = threading.Event()
+        # Currently displayed mask area as (top, left, height, width) in float, to
+        # accumulate sub-pixel steps of the interpolation.
+        self._mask_geometry: np.ndarray | None = None
+        self._stop_pipeline = threading.Event()
+        self._stage_threads: list[threading.Thread] = []
+        self.metrics.gauge(
+            "detection_dropped_frames", lambda: self._detected_frames.dropped
+        )
+        self.metrics.gauge(
+            "composition_dropped_frames", lambda: self._composed_frames.dropped
+        )
+
+        if cam_id is None:
+            return
         self._camera.start(cam_id)
+        if device_dir:
+            self._camera.watch_devices(device_dir, on_change=on_cameras_changed)
+        self._start_pipeline()
 
-    def _get_face_area_placeholder(self) -> structures.Rect:
+    def _get_face_area_placeholder(self) -> np.ndarray:
         base_size = int(min(*self._frame_size_hw) / 1.6)
-        rect = structures.Rect(
-            top=(self._frame_size_hw[0] - base_size) // 2,
-            left=(self._frame_size_hw[1] - base_size) // 2,
-            width=base_size,
-            height=base_size,
+        return np.array(
+            [
+                [
+                    (self._frame_size_hw[0] - base_size) // 2,
+                    (self._frame_size_hw[1] - base_size) // 2,
+                    base_size,
+                    base_size,
+                ]
+            ]
         )
-        return rect
 
     @property
     def _frame_size_hw(self) -> tuple[int, int]:
-        cam_image = self.available_cameras[self._camera.cam_id]
-        return (cam_image.shape[0], cam_image.shape[1])
+        return self._input_size_hw or self._camera.default_size_hw
+
+    @property
+    def zoom_factor(self) -> float:
+        return self._zoom_factor
+
+    @property
+    def offset_x(self) -> int:
+        return self._offset_x
+
+    @property
+    def offset_y(self) -> int:
+        return self._offset_y
+
+    @property
+    def available_cameras(self) -> dict[int, np.ndarray]:
+        """Probed frame by camera id. Changes, if cameras are added or removed."""
+        return self._camera.available_cameras
+
+    @property
+    def cam_id(self) -> int:
+        """Id of the active camera."""
+        return self._camera.cam_id
 
     def can_zoom_out(self) -> bool:
         if self._focus_area is None:
@@ -133,9 +339,264 @@ class VideoHandler:
         return self._focus_area.bottom < self._frame_size_hw[0]
 
     def set_camera(self, cam_id: int | None) -> None:
-        self._camera.stop()
-        if cam_id is not None:
-            self._camera.start(cam_id)
+        """Switch to another camera, while the current one keeps streaming.
+
+        Args:
+            cam_id: Camera to switch to. None to stop capturing.
+        """
+        if cam_id is None:
+            self._camera.stop()
+        else:
+            self._camera.switch(cam_id)
+
+    def add_inset(
+        self,
+        cam_id: int,
+        shape_png_buffer: bytes,
+        center: tuple[float, float] = (0.8, 0.8),
+        width: float = 0.3,
+        follow_face: bool = True,
+    ) -> "VideoHandler":
+        """Composite another camera into the output, as picture-in-picture.
+
+        Args:
+            cam_id: Camera to show in the inset. Must not be in use by another handler.
+            shape_png_buffer: Shape mask of the inset.
+            center: Position of the inset's center, relative to the output size.
+            width: Width of the inset, relative to the output width.
+            follow_face: Keep the face in the inset centered.
+
+        Returns:
+            Video handler of the inset, e.g. to adjust its zoom.
+        """
+        self._added_insets += 1
+        prefix = f"inset{self._added_insets}_"
+        handler = VideoHandler(
+            cam_id=cam_id,
+            shape_png_buffer=shape_png_buffer,
+            zoom_factor=1,
+            offset_x=0,
+            offset_y=0,
+            follow_face=follow_face,
+            face_detector=self._get_detection_batcher().client(),
+            available_cameras=self.available_cameras,
+            # Same export & trace, e.g. "inset1_detection_seconds"
+            metrics_registry=self.metrics.prefixed(prefix),
+            tracer=self.tracer.prefixed(prefix),
+        )
+        handler.detect_every_n_frames = self.detect_every_n_frames
+        handler.set_debug_mode(self.debug_mode)
+        handler.set_detection_enabled(self.detection_enabled)
+        self._insets = [
+            *self._insets,
+            insets.Inset(handler=handler, center=center, width=width),
+        ]
+        logger.info("Added camera %s as inset.", cam_id)
+        return handler
+
+    def remove_inset(self, handler: "VideoHandler") -> None:
+        """Stop showing an inset added by add_inset()."""
+        self._insets = [i for i in self._insets if i.handler is not handler]
+        handler.stop()
+
+    def add_sink(self, sink: sinks.QueuedSink) -> None:
+        """Also pass the composed frames to a sink, e.g. to record them.
+
+        The sink is started, and closed when the handler stops.
+        """
+        sink.start()
+        # Replaced as a whole, so the composition stage can iterate without lock
+        self._sinks = [*self._sinks, sink]
+
+    def remove_sink(self, sink: sinks.QueuedSink) -> None:
+        """Stop passing frames to a sink, and close it."""
+        self._sinks = [s for s in self._sinks if s is not sink]
+        sink.close()
+
+    def _get_detection_batcher(self) -> face_detection.FaceDetectionBatcher:
+        """Create the batcher shared by all sources, and use it for this handler, too.
+
+        A face detection running in a worker process is replaced as well, as the
+        sources can't share it.
+        """
+        if self._detection_batcher is None:
+            self._detection_batcher = face_detection.FaceDetectionBatcher()
+            shared = self._detection_batcher.client()
+            shared.detection_width = self._face_detection.detection_width
+            shared.debug_mode = self._face_detection.debug_mode
+            shared.group_framing = self._face_detection.group_framing
+            with self._detection_lock:
+                previous, self._face_detection = self._face_detection, shared
+            previous.close()
+        return self._detection_batcher
+
+    def get_camera_frame(self) -> tuple[int, np.ndarray]:
+        """Id and latest raw frame of the active camera, e.g. for its thumbnail."""
+        return self._camera.cam_id, self._camera.get_frame()
+
+    def stop(self) -> None:
+        """Stop all pipeline stages, release the camera and the face detection."""
+        if self._stop_pipeline.is_set():
+            return
+        self._stop_pipeline.set()
+        self._detected_frames.close()
+        self._composed_frames.close()
+        for thread in self._stage_threads:
+            thread.join()
+        self._stage_threads = []
+        self._camera.stop_watching_devices()
+        with self._camera_power_lock:
+            self._camera.stop()
+        for inset in self._insets:
+            inset.handler.stop()
+        for sink in self._sinks:
+            sink.close()
+        self._face_detection.close()
+        if self._detection_batcher is not None:
+            self._detection_batcher.close()
+        self.tracer.close()
+
+    def set_capture_fps(self, fps: float | None) -> None:
+        """Limit the frames decoded per second. None for camera's max fps."""
+        self._camera.max_fps = fps
+        for inset in self._insets:
+            inset.handler.set_capture_fps(fps)
+
+    def set_detection_enabled(self, enabled: bool) -> None:
+        """Suspend face detection, e.g. while nobody can see the result."""
+        self.detection_enabled = enabled
+        for inset in self._insets:
+            inset.handler.set_detection_enabled(enabled)
+
+    def release_camera(self) -> None:
+        """Stop capturing in the background, so the camera device can power down."""
+        self._set_camera_running(False)
+        for inset in self._insets:
+            inset.handler.release_camera()
+
+    def resume_camera(self) -> None:
+        """Restart capturing with the camera used before release_camera().
+
+        Opening the device and negotiating its mode takes a while, so it happens in a
+        background thread. Until the first new frame is composed,
+        get_processed_frame() keeps returning the last one.
+        """
+        self._set_camera_running(True)
+        for inset in self._insets:
+            inset.handler.resume_camera()
+
+    def _set_camera_running(self, running: bool) -> None:
+        self._camera_should_run = running
+        threading.Thread(
+            target=self._apply_camera_running, name="camera-power", daemon=True
+        ).start()
+
+    def _apply_camera_running(self) -> None:
+        """Start or stop the camera, as last requested. Runs in a background thread.
+
+        Requests are applied one after another, so a release requested while the
+        camera is still resuming stops it afterwards.
+        """
+        with self._camera_power_lock:
+            if self._stop_pipeline.is_set():
+                return
+            if not self._camera_should_run:
+                self._camera.stop()
+            elif self._camera.video_thread is None:
+                self._camera.start(self._camera.cam_id)
+
+    def apply_quality_level(self, level: governor.QualityLevel) -> None:
+        """Change the settings affecting the processing cost of a frame."""
+        self.detect_every_n_frames = level.detect_every_n_frames
+        with self._detection_lock:
+            self._face_detection.detection_width = level.detection_width
+        self.max_output_width = level.max_output_width
+        self.capture_scale = level.capture_scale
+        if not self._camera.modes:
+            # Without known modes, request a smaller size and let OpenCV pick
+            height, width = self._frame_size_hw
+            self._camera.set_capture_mode(
+                dataclasses.replace(
+                    capture_modes.DEFAULT_CAPTURE_MODE,
+                    width=int(width * level.capture_scale),
+                    height=int(height * level.capture_scale),
+                )
+            )
+        # Measurements of the previous level are not meaningful anymore
+        for stage in self.STAGES:
+            self.metrics.histogram(f"{stage}_seconds").reset()
+        for inset in self._insets:
+            inset.handler.apply_quality_level(level)
+
+    def get_stage_times(self, last: int = 30) -> dict[str, np.ndarray]:
+        """Recent durations per frame in seconds, by pipeline stage."""
+        return {
+            stage: self.metrics.histogram(f"{stage}_seconds").values(last=last)
+            for stage in self.STAGES
+        }
+
+    def set_output_size(self, width: int, height: int) -> None:
+        """Set the size in device pixels, at which the composed frames are displayed.
+
+        Used to choose the capture mode. If unset, the default resolution is used.
+        """
+        self._output_size_wh = (width, height)
+        for inset in self._insets:
+            inset.handler.set_output_size(round(width * inset.width), height)
+
+    def _get_required_capture_size(
+        self, mask_area: structures.Rect
+    ) -> tuple[float, float]:
+        """Capture resolution, which renders the mask area at output size."""
+        height, width = self._frame_size_hw
+        area_width, area_height = (
+            (width, height)
+            if self.debug_mode
+            else (max(mask_area.width, 1), max(mask_area.height, 1))
+        )
+        scale = self.capture_scale
+        if self._output_size_wh:
+            output_width, output_height = self._output_size_wh
+            # The GUI scales the composed frame to fit into the output
+            scale = min(scale, output_width / area_width, output_height / area_height)
+        if self.max_output_width:
+            scale = min(scale, self.max_output_width / area_width)
+        # Face detection works on a downscaled frame, which shouldn't get upscaled
+        scale = max(scale, self._face_detection.detection_width / width)
+        return (width * scale, height * scale)
+
+    def _update_capture_mode(self, mask_area: structures.Rect) -> None:
+        """Renegotiate a cheaper capture mode, if the output doesn't need all pixels.
+
+        E.g. if zoomed out, a small output only needs a fraction of the default
+        resolution. Runs in the composition stage, throttled to a few times a second.
+        """
+        now = time.monotonic()
+        if now - self._last_mode_update < self.MODE_UPDATE_INTERVAL:
+            return
+        self._last_mode_update = now
+
+        modes = self._camera.modes
+        if not modes:
+            return
+        if self._mode_selector is None or self._mode_selector.modes is not modes:
+            height, width = self._frame_size_hw
+            self._mode_selector = capture_modes.ModeSelector(
+                modes, aspect_ratio=width / height, min_fps=self.MIN_CAPTURE_FPS
+            )
+        mode = self._mode_selector.update(
+            self._get_required_capture_size(mask_area),
+            current=self._camera.capture_mode,
+        )
+        if mode:
+            self._camera.set_capture_mode(mode)
+
+    def _update_quality_governor(self) -> None:
+        if self.quality_governor is None:
+            return
+        level = self.quality_governor.update(self.get_stage_times())
+        if level is not None:
+            self.apply_quality_level(level)
 
     def set_shape(self, png_buffer: bytes) -> None:
         self._shape_mask = cv2.imdecode(
@@ -144,13 +605,50 @@ class VideoHandler:
 
     def set_debug_mode(self, on: bool) -> None:
         self.debug_mode = on
-        self._face_detection.debug_mode = on
+        with self._detection_lock:
+            self._face_detection.debug_mode = on
+        for inset in self._insets:
+            inset.handler.set_debug_mode(on)
+
+    def set_group_framing(self, on: bool) -> None:
+        """Keep all faces in the frame, e.g. of two presenters sharing a camera."""
+        self.group_framing = on
+        with self._detection_lock:
+            self._face_detection.group_framing = on
+        self._group_focus_geometry = None
 
     def reset_view(self) -> None:
-        self._face_area = None
-        self.offset_x = 0
-        self.offset_y = 0
-        self.zoom_factor = 1.0
+        with self._view_lock:
+            self._face_areas = None
+            self._offset_x = 0
+            self._offset_y = 0
+            self._zoom_factor = 1.0
+
+    def set_view(
+        self,
+        zoom_factor: float | None = None,
+        offset_x: int | None = None,
+        offset_y: int | None = None,
+    ) -> None:
+        """Change zoom factor and offsets together. None keeps the current value."""
+        with self._view_lock:
+            if zoom_factor is not None:
+                self._zoom_factor = zoom_factor
+            if offset_x is not None:
+                self._offset_x = offset_x
+            if offset_y is not None:
+                self._offset_y = offset_y
+
+    def move_view(self, x: int, y: int) -> None:
+        """Shift the focus area, e.g. by multiples of MOVE_STEP."""
+        with self._view_lock:
+            self._offset_x += x
+            self._offset_y += y
+
+    def _get_view(self) -> tuple[float, int, int]:
+        """Zoom factor and offsets x & y, consistent with each other."""
+        with self._view_lock:
+            return self._zoom_factor, self._offset_x, self._offset_y
 
     def _draw_bbox(
         self,
@@ -177,61 +675,384 @@ class VideoHandler:
             2,
         )
 
+    def _draw_text_lines(
+        self, lines: list[str], image: np.ndarray, color: tuple[int, int, int]
+    ) -> None:
+        line_height = 25
+        bottom = image.shape[0] - 10 - line_height * len(lines)
+        for idx, line in enumerate(lines, start=1):
+            cv2.putText(
+                image,
+                line,
+                (10, bottom + idx * line_height),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.6,
+                color,
+                2,
+            )
+
+    def _start_pipeline(self) -> None:
+        self._stop_pipeline.clear()
+        self._stage_threads = [
+            threading.Thread(
+                target=self._detection_stage, name="detection", daemon=True
+            ),
+            threading.Thread(
+                target=self._composition_stage, name="composition", daemon=True
+            ),
+        ]
+        for thread in self._stage_threads:
+            thread.start()
+
+    def _detection_stage(self) -> None:
+        logger.info("Detection stage started.")
+        detection_seconds = self.metrics.histogram("detection_seconds")
+        detections_skipped = self.metrics.counter("detections_skipped")
+        while not self._stop_pipeline.is_set():
+            # Timeout, as the camera queue stays open. Only stopping the camera
+            # closes it, and replaces it with a new one.
+            frame = self._camera.frames.get(timeout=0.1)
+            if frame is None:
+                continue
+
+            started = time.perf_counter()
+            # Read once, as the GUI thread might reset it meanwhile
+            face_areas = self._face_areas
+            if face_areas is None or frame.seq % self.detect_every_n_frames == 0:
+                with self.tracer.span("detection", seq=frame.seq):
+                    face_areas = self._detect(frame.image)
+            else:
+                detections_skipped.inc()
+            detection_seconds.observe(time.perf_counter() - started)
+
+            self._detected_frames.put((frame, face_areas), timeout=self.BLOCK_TIMEOUT)
+        logger.info("Detection stage stopped.")
+
+    def _composition_stage(self) -> None:
+        logger.info("Composition stage started.")
+        composition_seconds = self.metrics.histogram("composition_seconds")
+        renders_skipped = self.metrics.counter("renders_skipped")
+        frame: structures.Frame | None = None
+        face_areas: np.ndarray | None = None
+        rendered_mask_area: structures.Rect | None = None
+        rendered_insets: list[np.ndarray] = []
+        last_render = time.perf_counter()
+
+        while not self._stop_pipeline.is_set():
+            self._render_requested.wait(timeout=self.MAX_RENDER_INTERVAL)
+            self._render_requested.clear()
+
+            item = self._detected_frames.get(timeout=0)
+            if item is not None:
+                frame, face_areas = item
+            if frame is None or face_areas is None:
+                continue
+
+            self._update_quality_governor()
+
+            now = time.perf_counter()
+            mask_area = self._interpolate_mask_area(
+                target=self._get_target_mask_area(face_areas, self._frame_size_hw),
+                image_size_hw=self._frame_size_hw,
+                elapsed=now - last_render,
+            )
+            last_render = now
+            self._update_capture_mode(mask_area)
+
+            inset_images = [i.handler.get_processed_frame() for i in self._insets]
+            insets_changed = len(inset_images) != len(rendered_insets) or any(
+                a is not b for a, b in zip(inset_images, rendered_insets, strict=False)
+            )
+
+            # Re-use the last frame only, if the crop area or an inset has changed:
+            if item is None and mask_area == rendered_mask_area and not insets_changed:
+                renders_skipped.inc()
+                continue
+            rendered_mask_area = mask_area
+            rendered_insets = inset_images
+
+            with self.tracer.span("composition", seq=frame.seq):
+                image = self._compose(
+                    frame.image,
+                    face_areas=face_areas,
+                    mask_area=mask_area,
+                    seq=frame.seq,
+                )
+                for inset, inset_image in zip(self._insets, inset_images, strict=False):
+                    insets.overlay(image, inset_image, inset.center, inset.width)
+                    # Let the inset's pipeline deliver the size needed next time
+                    inset.handler.inset_width = round(image.shape[1] * inset.width)
+            composition_seconds.observe(time.perf_counter() - now)
+            composed = structures.Frame(
+                image=image, seq=frame.seq, timestamp=frame.timestamp
+            )
+            # The GUI might not read for a while, e.g. while the window is hidden
+            self._composed_frames.put(composed, timeout=self.BLOCK_TIMEOUT)
+            for sink in self._sinks:
+                sink.put(composed)
+        logger.info("Composition stage stopped.")
+
+    def request_render(self) -> None:
+        """Trigger the composition stage, e.g. on every display refresh."""
+        self._render_requested.set()
+        for inset in self._insets:
+            inset.handler.request_render()
+
+    def _interpolate_mask_area(
+        self,
+        target: structures.Rect,
+        image_size_hw: tuple[int, int],
+        elapsed: float,
+    ) -> structures.Rect:
+        """Move the displayed mask area smoothly towards the target mask area.
+
+        The progress depends on the elapsed time, not on the number of calls, so the
+        speed of the motion is independent of camera FPS and display refresh rate.
+
+        Args:
+            target: Mask area to move to.
+            image_size_hw: Size of the frame, the mask area has to stay within.
+            elapsed: Seconds since the last call.
+
+        Returns:
+            Mask area to be displayed now.
+        """
+        target_geometry = np.array(target.geometry, dtype=float)
+        current = self._mask_geometry
+
+        # Jump, if there's nothing to interpolate from, or the shape has changed:
+        if (
+            current is None
+            or self.PAN_ZOOM_TIME_CONSTANT <= 0
+            or not math.isclose(
+                current[3] / current[2],
+                target_geometry[3] / target_geometry[2],
+                rel_tol=0.02,
+            )
+        ):
+            self._mask_geometry = target_geometry
+            return target
+
+        progress = 1 - math.exp(-elapsed / self.PAN_ZOOM_TIME_CONSTANT)
+        current += (target_geometry - current) * progress
+        if np.abs(target_geometry - current).max() < 0.5:  # noqa: PLR2004
+            current[:] = target_geometry
+
+        top, left, height, width = np.rint(current).astype(int).tolist()
+        mask_area = structures.Rect(top=top, left=left, height=height, width=width)
+        mask_area.stay_within(height=image_size_hw[0], width=image_size_hw[1])
+        return mask_area
+
     def get_processed_frame(self) -> np.ndarray:
-        frame = self._camera.get_frame()
-        frame = self._process_frame(frame)
-        return frame
+        """Return the latest composed frame, without waiting for a new one.
+
+        Returns:
+            RGBA image ready to be displayed. The same object is returned until the
+            pipeline delivers a newer frame.
+        """
+        frame = self._composed_frames.get(timeout=0)
+        if frame is not None:
+            self._last_composed_frame = frame.image
+            self.last_composed_seq = frame.seq
+            self.last_composed_timestamp = frame.timestamp
+        return self._last_composed_frame
+
+    def update_framing(
+        self, frame: np.ndarray, elapsed: float
+    ) -> tuple[np.ndarray, structures.Rect]:
+        """Detect the faces in a frame and move the mask area towards them.
+
+        Synchronous counterpart of the pipeline, for handlers without camera.
+
+        Args:
+            frame: BGR image. All frames need to have the same size.
+            elapsed: Seconds since the previous frame, e.g. 1 / fps of a video file.
+
+        Returns:
+            Face areas and mask area to be displayed for this frame.
+        """
+        self._input_size_hw = (frame.shape[0], frame.shape[1])
+        face_areas = self._detect(frame)
+        mask_area = self._interpolate_mask_area(
+            target=self._get_target_mask_area(face_areas, self._frame_size_hw),
+            image_size_hw=self._frame_size_hw,
+            elapsed=elapsed,
+        )
+        return face_areas, mask_area
+
+    def render_frame(self, frame: np.ndarray, elapsed: float) -> np.ndarray:
+        """Process a frame synchronously, for handlers without camera.
+
+        Unlike the composition stage, every frame is rendered exactly once, so the
+        result doesn't depend on timing, e.g. when rendering a video file.
+
+        Args:
+            frame: BGR image. All frames need to have the same size.
+            elapsed: Seconds since the previous frame, e.g. 1 / fps of a video file.
+
+        Returns:
+            RGBA image, like the ones displayed.
+        """
+        face_areas, mask_area = self.update_framing(frame, elapsed=elapsed)
+        return self._compose(frame, face_areas=face_areas, mask_area=mask_area)
 
     @cache
     def _process_frame(self, frame: np.ndarray) -> np.ndarray:
-        """Process frame and return it with applied shape mask.
+        """Process frame synchronously, without the pipeline threads.
+
+        Returns:
+            Image ready to be displayed.
+        """
+        return self._compose(frame, face_areas=self._detect(frame))
+
+    def _detect(self, frame: np.ndarray) -> np.ndarray:
+        if self.follow_face and self.detection_enabled:
+            with self._detection_lock:
+                face_areas = self._face_detection.get_faces(
+                    frame, size_hw=self._frame_size_hw
+                )
+            # Without any tracked face, keep the last framing
+            if len(face_areas):
+                self._face_areas = face_areas
+                return face_areas
+        # Read once, as the GUI thread might reset it meanwhile
+        last_face_areas = self._face_areas
+        if last_face_areas is None:
+            last_face_areas = self._get_face_area_placeholder()
+            self._face_areas = last_face_areas
+        return last_face_areas
+
+    def _get_target_mask_area(
+        self, face_areas: np.ndarray, image_size_hw: tuple[int, int]
+    ) -> structures.Rect:
+        """Calculate the area to be cropped for the given face areas.
 
         Three different areas are calculated
-        - face_area: Area supposed to contain face. Should be stabilized.
-        - focus_area: User adjusted area, with padding, offset and zoom.
+        - face_areas: Areas supposed to contain faces. Should be stabilized.
+        - focus_area: User adjusted area, with padding, offset and zoom. With several
+          faces, the union of their focus areas, stabilized on its own.
         - mask_area: Final area, restrained to image size. Should match aspect ratio of
           shape mask. At best case, this will be close to focus_area.
 
         Returns:
-            Image ready to be displayed.
+            Mask area.
         """
-        if self.follow_face:
-            self._face_area = self._face_detection.get_face(frame)
-        elif self._face_area is None:
-            self._face_area = self._get_face_area_placeholder()
-
-        self._focus_area = self._get_focus_area(face_area=self._face_area)
-        mask_area = self._get_mask_area(
-            focus_area=self._focus_area,
-            image_size_hw=(frame.shape[0], frame.shape[1]),
-            shape_size_hw=(self._shape_mask.shape[0], self._shape_mask.shape[1]),
+        zoom_factor, offset_x, offset_y = self._get_view()
+        if len(face_areas) == 1:
+            # Usual case, for which a single Rect is a lot cheaper than a RectArray
+            focus_area = self._get_focus_area(
+                structures.Rect.from_geometry(face_areas[0]), zoom_factor=zoom_factor
+            )
+        else:
+            focus_area = structures.Rect.from_geometry(
+                tracking.union(
+                    self._get_focus_areas(face_areas, zoom_factor=zoom_factor).geometry
+                )
+            )
+        if self.group_framing:
+            # Faces move independently, so their union would fluctuate a lot
+            focus_geometry = np.array(focus_area.geometry)
+            last_geometry = self._group_focus_geometry
+            if last_geometry is not None:
+                focus_geometry = tracking.stabilize(
+                    last=last_geometry,
+                    new=focus_geometry,
+                    threshold_factor=self.GROUP_FLUCTUATION_THRESHOLD,
+                )
+            self._group_focus_geometry = focus_geometry
+            focus_area = structures.Rect.from_geometry(focus_geometry)
+        focus_area.move_by(y=offset_y, x=offset_x)
+        self._focus_area = focus_area
+        shape_mask = self._shape_mask
+        return self._get_mask_area(
+            focus_area=focus_area,
+            image_size_hw=image_size_hw,
+            shape_size_hw=(shape_mask.shape[0], shape_mask.shape[1]),
         )
 
-        if self.debug_mode:
-            self._draw_bbox(
-                rect=self._face_area,
-                image=frame,
-                color=(0, 255, 0),
-                label="Face",
+    def _compose(
+        self,
+        frame: np.ndarray,
+        face_areas: np.ndarray,
+        mask_area: structures.Rect | None = None,
+        seq: int | None = None,
+    ) -> np.ndarray:
+        """Crop the frame around the faces and apply the shape mask.
+
+        Args:
+            frame: BGR image.
+            face_areas: Areas supposed to contain faces.
+            mask_area: Area to crop. Calculated from face_areas, if not provided.
+            seq: Sequence number of the frame, for tracing.
+
+        Returns:
+            Image ready to be displayed.
+        """
+        if mask_area is None:
+            mask_area = self._get_target_mask_area(
+                face_areas, image_size_hw=self._frame_size_hw
             )
+
+        if self.debug_mode:
+            # Copy, as the same frame might get rendered multiple times
+            frame = frame.copy()
+            for top, left, height, width in face_areas.tolist():
+                face_area = structures.Rect(
+                    top=top, left=left, height=height, width=width
+                )
+                self._draw_bbox(
+                    rect=self._to_frame_coords(face_area, frame),
+                    image=frame,
+                    color=(0, 255, 0),
+                    label="Face",
+                )
             self._draw_bbox(
-                rect=self._focus_area,
+                rect=self._to_frame_coords(self._focus_area or face_area, frame),
                 image=frame,
                 color=(255, 0, 0),
                 label="Focus",
             )
             self._draw_bbox(
-                rect=mask_area,
+                rect=self._to_frame_coords(mask_area, frame),
                 image=frame,
                 color=(0, 0, 255),
                 label="Mask",
             )
+            if self.quality_governor is not None:
+                self._draw_text_lines(
+                    self.quality_governor.describe(), image=frame, color=(0, 255, 255)
+                )
             return cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
 
-        frame = self._crop_to_mask(image=frame, mask=mask_area)
-        frame = self._apply_shape_mask(image=frame, shape_mask=self._shape_mask)
+        with self.metrics.timer("crop_seconds"), self.tracer.span("crop", seq=seq):
+            frame = self._crop_to_mask(
+                image=frame, mask=self._to_frame_coords(mask_area, frame)
+            )
+            max_width = min(
+                self.max_output_width or math.inf, self.inset_width or math.inf
+            )
+            if frame.shape[1] > max_width:
+                factor = max_width / frame.shape[1]
+                frame = cv2.resize(
+                    frame, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA
+                )
+        with self.metrics.timer("mask_seconds"), self.tracer.span("mask", seq=seq):
+            frame = self._apply_shape_mask(image=frame, shape_mask=self._shape_mask)
         return frame
 
+    def _to_frame_coords(
+        self, rect: structures.Rect, frame: np.ndarray
+    ) -> structures.Rect:
+        """Map a rectangle to the current frame, if it has a non-default resolution."""
+        frame_size_hw = (frame.shape[0], frame.shape[1])
+        if frame_size_hw == self._frame_size_hw:
+            return rect
+        rect = rect.copy()
+        rect.map_between(
+            source_size_hw=self._frame_size_hw, target_size_hw=frame_size_hw
+        )
+        return rect
+
     def _apply_shape_mask(
         self, image: np.ndarray, shape_mask: np.ndarray
     ) -> np.ndarray:
@@ -258,22 +1079,33 @@ class VideoHandler:
 
         return cropped_image
 
-    def _get_focus_area(self, face_area: structures.Rect) -> structures.Rect:
+    def _get_focus_area(
+        self, face_area: structures.Rect, zoom_factor: float
+    ) -> structures.Rect:
+        """Scale and pad the face area, as adjusted by the user, without offset."""
         focus_area = face_area.copy()
-        focus_area.scale(self.zoom_factor)
-
-        padding = int(max(face_area.width, face_area.height) / 1.5 * self.zoom_factor)
+        padding = int(max(face_area.width, face_area.height) / 1.5 * zoom_factor)
+        focus_area.scale(zoom_factor)
         focus_area.pad(padding=padding)
-
-        focus_area.move_by(x=self.offset_x, y=self.offset_y)
         return focus_area
 
+    def _get_focus_areas(
+        self, face_areas: np.ndarray, zoom_factor: float
+    ) -> structures.RectArray:
+        """Like _get_focus_area(), but for several faces at once, see group framing."""
+        focus_areas = structures.RectArray(face_areas)
+        padding = np.maximum(focus_areas.width, focus_areas.height) / 1.5
+        focus_areas.scale(zoom_factor)
+        focus_areas.pad(padding=np.trunc(padding * zoom_factor).astype(int))
+        return focus_areas
+
     def _get_mask_area(
         self,
         focus_area: structures.Rect,
         image_size_hw: tuple[int, int],
         shape_size_hw: tuple[int, int],
     ) -> structures.Rect:
+        """Fit the focus area to the aspect ratio of the shape and into the image."""
         mask_area = focus_area.copy()
         shape_height, shape_width = shape_size_hw
         aspect_ratio = shape_width / shape_height
@@ -281,14 +1113,12 @@ class VideoHandler:
         # Adjust aspect ratio of mask area to match shape
         if mask_area.width / mask_area.height < aspect_ratio:
             new_width = int(mask_area.height * aspect_ratio)
-            width_delta = new_width - mask_area.width
+            mask_area.left -= (new_width - mask_area.width) // 2
             mask_area.width = new_width
-            mask_area.left = mask_area.left - width_delta // 2
         else:
             new_height = int(mask_area.width / aspect_ratio)
-            height_delta = new_height - mask_area.height
+            mask_area.top -= (new_height - mask_area.height) // 2
             mask_area.height = new_height
-            mask_area.top = mask_area.top - height_delta // 2
 
         image_height, image_width = image_size_hw
         mask_area.stay_within(width=image_width, height=image_height)
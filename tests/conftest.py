@@ -0,0 +1,127 @@
+import json
+import platform
+import statistics
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import cv2
+import pytest
+
+from myhumbleself import face_detection
+
+DEMO_VIDEO = Path(face_detection.__file__).parent / "resources" / "demo.mp4"
+BENCHMARK_BASELINES = Path(__file__).parent / "benchmark_baselines.json"
+
+# Every round calls the function repeatedly for at least this long, to reduce the
+# influence of the timer resolution
+MIN_ROUND_SECONDS = 0.01
+ROUNDS = 15
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("benchmark", "Benchmarks, run via: pytest -m benchmark")
+    group.addoption(
+        "--benchmark-update",
+        action="store_true",
+        help="Store the measured timings as new baselines, instead of comparing.",
+    )
+    group.addoption(
+        "--benchmark-tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown relative to the baseline. Default: 0.25 (= 25%%).",
+    )
+    group.addoption(
+        "--benchmark-baselines",
+        type=Path,
+        default=BENCHMARK_BASELINES,
+        help="JSON file with the baseline timings.",
+    )
+
+
+def measure(func: Callable[[], Any]) -> float:
+    """Median duration of one call of func in seconds."""
+    func()  # Warmup, e.g. to fill caches or initialize OpenCV
+    calls_per_round = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls_per_round):
+            func()
+        duration = time.perf_counter() - started
+        if duration >= MIN_ROUND_SECONDS:
+            break
+        calls_per_round *= 2
+
+    durations = [duration / calls_per_round]
+    for _ in range(ROUNDS - 1):
+        started = time.perf_counter()
+        for _ in range(calls_per_round):
+            func()
+        durations.append((time.perf_counter() - started) / calls_per_round)
+    return statistics.median(durations)
+
+
+@pytest.fixture(scope="session")
+def benchmark_baselines(request):
+    path = request.config.getoption("--benchmark-baselines")
+    baselines = json.loads(path.read_text()) if path.exists() else {}
+    measured = {}
+
+    yield baselines.get("timings", {}), measured
+
+    if request.config.getoption("--benchmark-update") and measured:
+        path.write_text(
+            json.dumps(
+                {
+                    "machine": {
+                        "python": platform.python_version(),
+                        "opencv": cv2.__version__,
+                        "processor": platform.processor() or platform.machine(),
+                    },
+                    "timings": {**baselines.get("timings", {}), **measured},
+                },
+                indent=2,
+                sort_keys=True,
+            )
+            + "\n"
+        )
+
+
+@pytest.fixture()
+def benchmark(request, benchmark_baselines):
+    """Time a function and compare the result against the stored baseline.
+
+    Fails, if the function got slower than the baseline plus the tolerance. Without
+    baseline, or with --benchmark-update, the timing is only recorded.
+    """
+    baselines, measured = benchmark_baselines
+    name = request.node.name
+    tolerance = request.config.getoption("--benchmark-tolerance")
+    update = request.config.getoption("--benchmark-update")
+
+    def run(func):
+        seconds = measure(func)
+        measured[name] = seconds
+        baseline = baselines.get(name)
+        if baseline and not update:
+            assert seconds <= baseline * (1 + tolerance), (
+                f"{name} took {seconds * 1000:.3f} ms, baseline is "
+                f"{baseline * 1000:.3f} ms (tolerance {tolerance:.0%})"
+            )
+        return seconds
+
+    return run
+
+
+@pytest.fixture(scope="session")
+def benchmark_frames():
+    """Fixed frames from different positions of the demo video."""
+    capture = cv2.VideoCapture(str(DEMO_VIDEO))
+    frames = []
+    for position in (0, 60, 120, 180, 240):
+        capture.set(cv2.CAP_PROP_POS_FRAMES, position)
+        frames.append(capture.read()[1])
+    capture.release()
+    return frames
@@ -48,7 +48,9 @@ def _init_config(monkeypatch):
 
 @pytest.fixture()
 def mhs_app(_init_config):
-    mhs = app.MyHumbleSelf(application_id="com.github.dynobo.myhumbleself", args={})
+    mhs = app.MyHumbleSelf(
+        application_id="com.github.dynobo.myhumbleself", args=app._parse_args([])
+    )
     thread = threading.Thread(target=mhs.run)
     thread.start()
 
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from myhumbleself import bench, cli
+
+
+@pytest.fixture(scope="module")
+def result():
+    return bench.run(bench.BenchSettings(frames=20, warmup=5, display_fps=0))
+
+
+def test_run_reports_stage_statistics(result):
+    assert result["captured_frames"] == 20
+    assert result["displayed_frames"] > 0
+    assert result["capture_fps"] > 0
+    assert result["cpu_cores"] > 0
+    for stage in ("decode", "detection", "composition", "latency"):
+        stats = result["stages"][stage]
+        assert stats["count"] > 0
+        assert 0 <= stats["p50"] <= stats["p99"] <= stats["max"]
+
+
+def test_run_with_insets():
+    result = bench.run(
+        bench.BenchSettings(frames=10, warmup=5, display_fps=0, insets=1)
+    )
+    assert result["settings"]["insets"] == 1
+    assert result["displayed_frames"] > 0
+    assert result["stages"]["inset1_composition"]["count"] > 0
+
+
+def test_format_table(result):
+    table = bench.format_table(result)
+    lines = table.splitlines()
+    assert lines[0].split() == [
+        "stage",
+        "count",
+        "fps",
+        "mean",
+        "p50",
+        "p90",
+        "p99",
+        "max",
+    ]
+    assert any(line.startswith("detection") for line in lines)
+    assert "Captured 20 frames" in table
+
+
+def test_cli_dispatches_bench_without_gui(capsys, tmp_path):
+    output = tmp_path / "result.json"
+    cli.main(
+        [
+            "bench",
+            "--frames=5",
+            "--warmup=1",
+            "--no-follow-face",
+            "--json",
+            f"--output={output}",
+        ]
+    )
+    printed = json.loads(capsys.readouterr().out)
+    assert printed["settings"]["follow_face"] is False
+    assert json.loads(output.read_text()) == printed
@@ -0,0 +1,136 @@
+import itertools
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from myhumbleself import (
+    evaluate,
+    face_detection,
+    structures,
+    tracking,
+    video_handler,
+)
+
+SHAPES_PATH = Path(__file__).parent.parent / "resources" / "shapes"
+
+pytestmark = pytest.mark.benchmark
+
+
+@pytest.fixture(scope="module")
+def handler():
+    handler = video_handler.VideoHandler(
+        cam_id=98,
+        shape_png_buffer=(SHAPES_PATH / "01-circle.png").read_bytes(),
+        zoom_factor=1,
+        offset_x=0,
+        offset_y=0,
+        follow_face=True,
+    )
+    # Only the synchronous code paths are measured, the pipeline would add noise
+    handler.stop()
+    return handler
+
+
+def test_get_faces(benchmark, benchmark_frames):
+    detection = face_detection.FaceDetection()
+    frames = itertools.cycle(benchmark_frames)
+    benchmark(lambda: detection.get_faces(next(frames)))
+
+
+def test_process_frame(benchmark, handler, benchmark_frames):
+    # Cycling through different frames, as identical frames would hit the cache
+    frames = itertools.cycle(benchmark_frames)
+    benchmark(lambda: handler._process_frame(next(frames)))
+
+
+def test_apply_shape_mask(benchmark, handler, benchmark_frames):
+    crop = benchmark_frames[0][100:600, 300:800]
+    benchmark(
+        lambda: handler._apply_shape_mask(image=crop, shape_mask=handler._shape_mask)
+    )
+
+
+def test_get_mask_area(benchmark, handler):
+    face_areas = np.array([[200, 500, 250, 250]])
+    benchmark(
+        lambda: handler._get_target_mask_area(face_areas, image_size_hw=(720, 1280))
+    )
+
+
+def test_rect_transformations(benchmark):
+    rect = structures.Rect(top=200, left=500, width=250, height=250)
+
+    def transform() -> None:
+        r = rect.copy()
+        r.scale(1.2)
+        r.pad(20)
+        r.move_by(y=10, x=-10)
+        r.map_between(source_size_hw=(720, 1280), target_size_hw=(1080, 1920))
+        r.stay_within(height=1080, width=1920)
+
+    benchmark(transform)
+
+
+@pytest.mark.parametrize("count", [1, 16])
+@pytest.mark.parametrize("kind", ["rect", "rect_array"])
+def test_rect_batch_transformations(benchmark, kind, count):
+    geometries = [(200 + i, 500 - i, 250, 250) for i in range(count)]
+    rects = [
+        structures.Rect(top=top, left=left, height=height, width=width)
+        for top, left, height, width in geometries
+    ]
+    rect_array = structures.RectArray(geometries)
+
+    def transform_rects() -> None:
+        for rect in rects:
+            r = rect.copy()
+            r.scale(1.2)
+            r.pad(20)
+            r.move_by(y=10, x=-10)
+            r.stay_within(height=1080, width=1920)
+
+    def transform_rect_array() -> None:
+        r = rect_array.copy()
+        r.scale(1.2)
+        r.pad(20)
+        r.move_by(y=10, x=-10)
+        r.stay_within(height=1080, width=1920)
+
+    benchmark(transform_rects if kind == "rect" else transform_rect_array)
+
+
+@pytest.mark.parametrize("face_count", [1, 16])
+def test_group_framing(benchmark, handler, face_count):
+    rng = np.random.default_rng(seed=42)
+    tracks = tracking.FaceTracks()
+    positions = rng.integers(0, 1000, size=(face_count, 2))
+    faces = np.hstack([positions, np.full((face_count, 2), 80)])
+
+    def frame() -> None:
+        jitter = rng.integers(-3, 4, size=faces.shape)
+        handler._get_target_mask_area(
+            tracks.update(faces + jitter), image_size_hw=(1080, 1920)
+        )
+
+    handler.group_framing = True
+    try:
+        benchmark(frame)
+    finally:
+        handler.group_framing = False
+
+
+def test_track_motion_clip(benchmark):
+    # Per frame cost of the golden trace, see tests/test_evaluate.py
+    detection = face_detection.FaceDetection()
+    frames = itertools.cycle(list(evaluate.motion_clip(fps=5).frames()))
+    benchmark(lambda: detection.get_faces(next(frames)))
+
+
+def test_image_to_texture(benchmark, benchmark_frames):
+    pytest.importorskip("gi")
+    from myhumbleself import app
+
+    image = cv2.cvtColor(benchmark_frames[0][100:600, 300:800], cv2.COLOR_BGR2RGBA)
+    benchmark(lambda: app.image_to_texture(image))
@@ -1,6 +1,128 @@
-from myhumbleself import camera
+import time
+
+import numpy as np
+
+from myhumbleself import camera, metrics, structures
 
 
 def test_available_cameras():
     cam = camera.Camera()
     assert cam.available_cameras
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.005)
+
+
+def test_switch_keeps_streaming_until_new_camera_delivers():
+    registry = metrics.Registry()
+    cam = camera.Camera(metrics_registry=registry)
+    cam.start(camera.DEMO_CAM_ID)
+    wait_for(lambda: cam.frame_seq > 0)
+
+    open_capture = cam._open_capture
+    seq_while_opening = []
+
+    def slow_open_capture(cam_id, mode):
+        capture = open_capture(cam_id, mode)
+        if cam_id == camera.FALLBACK_CAM_ID:
+            seq_before = cam.frame_seq
+            time.sleep(0.2)
+            seq_while_opening.append(cam.frame_seq - seq_before)
+        return capture
+
+    cam._open_capture = slow_open_capture
+    try:
+        cam.switch(camera.FALLBACK_CAM_ID)
+        assert cam.cam_id == camera.DEMO_CAM_ID
+        switch_seconds = registry.histogram("camera_switch_seconds")
+        wait_for(lambda: switch_seconds.count == 1)
+        assert cam.cam_id == camera.FALLBACK_CAM_ID
+        assert switch_seconds.percentiles((0.5,))[0] >= 0.2
+        # The old camera kept delivering frames, while the new one was opened
+        assert seq_while_opening[0] > 0
+    finally:
+        cam.stop()
+
+
+def test_block_policy_waits_for_the_pipeline():
+    cam = camera.Camera(queue_size=2, drop_policy=structures.DropPolicy.BLOCK)
+    cam.start(camera.DEMO_CAM_ID)
+    try:
+        # Nothing consumes the frames: two are queued, the third one waits for room
+        wait_for(lambda: cam.frame_seq == 3)
+        time.sleep(0.2)
+        assert cam.frame_seq == 3
+        assert len(cam.frames) == 2
+        assert cam.frames.dropped == 0
+
+        assert cam.frames.get(timeout=0).seq == 1
+        wait_for(lambda: cam.frame_seq == 4)
+    finally:
+        started = time.monotonic()
+        cam.stop()
+    # Stopping isn't blocked by the full queue
+    assert time.monotonic() - started < 1
+
+
+def test_switch_falls_back_to_cold_switch(monkeypatch):
+    registry = metrics.Registry()
+    cam = camera.Camera(metrics_registry=registry)
+    cam.start(camera.DEMO_CAM_ID)
+    monkeypatch.setattr(camera.FallbackVideoCapture, "grab", lambda _: False)
+    try:
+        cam.switch(camera.FALLBACK_CAM_ID)
+        wait_for(lambda: cam.cam_id == camera.FALLBACK_CAM_ID)
+        assert cam._standby is None
+    finally:
+        cam.stop()
+
+
+def test_outdated_switch_is_discarded():
+    cam = camera.Camera()
+    cam.start(camera.DEMO_CAM_ID)
+    try:
+        cam.switch(camera.FALLBACK_CAM_ID)
+        cam.switch(camera.DEMO_CAM_ID)
+        time.sleep(0.5)
+        assert cam.cam_id == camera.DEMO_CAM_ID
+        assert cam._standby is None
+    finally:
+        cam.stop()
+
+
+def test_hotplug_adds_cameras_and_fails_over(tmp_path, monkeypatch):
+    probed = []
+
+    def probe_camera(_, cam_id):
+        probed.append(cam_id)
+        return None if cam_id == 5 else np.zeros((480, 640, 3), dtype=np.uint8)
+
+    cam = camera.Camera()
+    monkeypatch.setattr(camera.Camera, "_probe_camera", probe_camera)
+    changed = []
+    cam.watch_devices(tmp_path, on_change=lambda: changed.append(True))
+    cam.start(camera.DEMO_CAM_ID)
+    try:
+        # Only the added devices are probed. Unusable ones are retried a few times.
+        cam._on_devices_changed({3, 5})
+        assert probed == [3, 5]
+        assert 3 in cam.available_cameras
+        assert 5 not in cam.available_cameras
+        assert changed == [True]
+        for _ in range(5):
+            cam._on_devices_changed({3, 5})
+        assert probed.count(5) == camera.MAX_PROBE_ATTEMPTS
+
+        # The active camera fails over to a remaining one
+        cam.cam_id = 3
+        cam._on_devices_changed(set())
+        assert 3 not in cam.available_cameras
+        wait_for(lambda: cam.cam_id == camera.FALLBACK_CAM_ID)
+        assert len(changed) == 2
+    finally:
+        cam.stop()
+        cam.stop_watching_devices()
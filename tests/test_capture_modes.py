@@ -0,0 +1,117 @@
+import struct
+
+import pytest
+
+from myhumbleself import capture_modes
+from myhumbleself.capture_modes import CaptureMode
+
+MODES = [
+    CaptureMode(1920, 1080, 30, "MJPG"),
+    CaptureMode(1920, 1080, 5, "YUYV"),
+    CaptureMode(1280, 720, 60, "MJPG"),
+    CaptureMode(1280, 720, 10, "YUYV"),
+    CaptureMode(640, 480, 30, "MJPG"),
+    CaptureMode(640, 360, 30, "YUYV"),
+    CaptureMode(640, 360, 30, "MJPG"),
+    CaptureMode(320, 180, 30, "MJPG"),
+]
+
+
+@pytest.mark.parametrize(
+    ("required_wh", "expected"),
+    [
+        ((1920, 1080), CaptureMode(1920, 1080, 30, "MJPG")),
+        ((1200, 600), CaptureMode(1920, 1080, 30, "MJPG")),  # 720p has no headroom
+        ((900, 500), CaptureMode(1280, 720, 60, "MJPG")),
+        ((400, 225), CaptureMode(640, 360, 30, "MJPG")),  # no 4:3, prefer MJPG
+        ((100, 50), CaptureMode(320, 180, 30, "MJPG")),
+        ((4000, 3000), CaptureMode(1920, 1080, 30, "MJPG")),  # largest
+    ],
+)
+def test_choose_mode(required_wh, expected):
+    mode = capture_modes.choose_mode(MODES, required_wh, aspect_ratio=16 / 9)
+    assert mode == expected
+
+
+def test_choose_mode_keeps_current_mode_within_headroom():
+    current = CaptureMode(1280, 720, 60, "MJPG")
+    # Would choose 1080p, if there was no current mode
+    assert capture_modes.choose_mode(MODES, (1200, 600), current=current) == current
+    # Upgrades, once the current one doesn't suffice anymore
+    mode = capture_modes.choose_mode(MODES, (1300, 600), current=current)
+    assert mode == CaptureMode(1920, 1080, 30, "MJPG")
+    # Downgrades, once a lower mode suffices including the headroom
+    mode = capture_modes.choose_mode(MODES, (500, 280), current=current)
+    assert mode == CaptureMode(640, 360, 30, "MJPG")
+
+
+def test_choose_mode_without_modes():
+    assert capture_modes.choose_mode([], (640, 360)) is None
+
+
+def test_choose_mode_falls_back_to_slow_modes():
+    modes = [CaptureMode(640, 480, 15, "YUYV"), CaptureMode(320, 240, 15, "YUYV")]
+    mode = capture_modes.choose_mode(modes, (300, 200), min_fps=30)
+    assert mode == CaptureMode(640, 480, 15, "YUYV")
+
+
+def test_mode_selector_delays_changes():
+    now = 0.0
+    selector = capture_modes.ModeSelector(
+        MODES, upgrade_delay=0.5, downgrade_delay=3, clock=lambda: now
+    )
+    current = CaptureMode(1280, 720, 60, "MJPG")
+
+    # Downgrade, after the lower mode was the choice for the downgrade delay
+    assert selector.update((200, 100), current=current) is None
+    now = 2.0
+    assert selector.update((200, 100), current=current) is None
+    now = 3.0
+    assert selector.update((200, 100), current=current) == MODES[-1]
+
+    # A changing requirement restarts the delay
+    current = MODES[-1]
+    assert selector.update((1500, 900), current=current) is None
+    now = 3.4
+    assert selector.update((100, 50), current=current) is None
+    assert selector.update((1500, 900), current=current) is None
+    now = 3.8
+    assert selector.update((1500, 900), current=current) is None
+    now = 3.9
+    assert selector.update((1500, 900), current=current) == MODES[0]
+
+
+def test_list_v4l2_modes(monkeypatch, tmp_path):
+    """Parse the structs of a fake driver, supporting MJPG in two sizes."""
+    mjpg = int.from_bytes(b"MJPG", "little")
+    sizes = [(1280, 720), (640, 360)]
+    fps_by_size = {(1280, 720): [30, 15], (640, 360): [60]}
+
+    def ioctl(_, request, buffer):
+        index = struct.unpack_from("I", buffer)[0]
+        if request == capture_modes._VIDIOC_ENUM_FMT and index < 1:
+            struct.pack_into("II I32sI", buffer, 0, index, 1, 0, b"Motion-JPEG", mjpg)
+        elif request == capture_modes._VIDIOC_ENUM_FRAMESIZES and index < len(sizes):
+            struct.pack_into("IIIII", buffer, 0, index, mjpg, 1, *sizes[index])
+        elif request == capture_modes._VIDIOC_ENUM_FRAMEINTERVALS:
+            _, _, width, height = struct.unpack_from("IIII", buffer)
+            rates = fps_by_size[(width, height)]
+            if index >= len(rates):
+                raise OSError("EINVAL")
+            struct.pack_into("III", buffer, 16, 1, 1, rates[index])
+        else:
+            raise OSError("EINVAL")
+
+    monkeypatch.setattr(capture_modes.fcntl, "ioctl", ioctl)
+    device = tmp_path / "video0"
+    device.touch()
+
+    assert capture_modes.list_v4l2_modes(device) == [
+        CaptureMode(1280, 720, 30, "MJPG"),
+        CaptureMode(1280, 720, 15, "MJPG"),
+        CaptureMode(640, 360, 60, "MJPG"),
+    ]
+
+
+def test_list_v4l2_modes_of_missing_device(tmp_path):
+    assert capture_modes.list_v4l2_modes(tmp_path / "video0") == []
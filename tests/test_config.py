@@ -0,0 +1,105 @@
+import threading
+import time
+from configparser import ConfigParser
+
+from myhumbleself import config
+
+
+def create_config(tmp_path, write_delay=0.1):
+    parser = config.WritingConfigParser(
+        defaults={"zoom_factor": "1", "offset_x": "0"},
+        path=tmp_path / "sub" / "myhumbleself.ini",
+        write_delay=write_delay,
+    )
+    parser.add_section("main")
+    return parser
+
+
+def read_back(parser):
+    written = ConfigParser()
+    written.read(parser.path)
+    return written
+
+
+def test_changes_are_coalesced_into_one_delayed_write(tmp_path, monkeypatch):
+    parser = create_config(tmp_path)
+    writes = []
+    original_write = parser._write_atomic
+    monkeypatch.setattr(
+        parser, "_write_atomic", lambda c: writes.append(c) or original_write(c)
+    )
+
+    for offset in range(10):
+        parser.set_persistent("offset_x", offset)
+    assert not parser.path.exists()
+
+    time.sleep(0.5)
+    assert len(writes) == 1
+    assert read_back(parser).get("main", "offset_x") == "9"
+
+
+def test_unchanged_value_is_not_written(tmp_path):
+    parser = create_config(tmp_path)
+    parser.set_persistent("zoom_factor", 1)
+    parser.flush()
+    assert not parser.path.exists()
+
+
+def test_flush_writes_pending_changes_immediately(tmp_path):
+    parser = create_config(tmp_path, write_delay=60)
+    parser.set_persistent("zoom_factor", 2.5)
+    parser.set_persistent("offset_x", -3)
+
+    parser.flush()
+
+    written = read_back(parser)
+    assert written.get("main", "zoom_factor") == "2.5"
+    assert written.get("main", "offset_x") == "-3"
+    assert parser._timer is None
+
+
+def test_write_is_atomic(tmp_path, monkeypatch):
+    parser = create_config(tmp_path, write_delay=60)
+    parser.set_persistent("offset_x", 1)
+    parser.flush()
+
+    def fail(*_):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(config.os, "fsync", fail)
+    parser.set_persistent("offset_x", 2)
+    parser.flush()
+
+    # Old file is intact, no temporary files are left behind, change is still pending
+    assert read_back(parser).get("main", "offset_x") == "1"
+    assert [p.name for p in parser.path.parent.iterdir()] == [parser.path.name]
+    monkeypatch.undo()
+    parser.flush()
+    assert read_back(parser).get("main", "offset_x") == "2"
+
+
+def test_changes_dont_wait_for_the_disk(tmp_path, monkeypatch):
+    parser = create_config(tmp_path, write_delay=60)
+    writing, release = threading.Event(), threading.Event()
+    original_write = parser._write_atomic
+
+    def slow_write(content):
+        writing.set()
+        release.wait(timeout=5)
+        original_write(content)
+
+    monkeypatch.setattr(parser, "_write_atomic", slow_write)
+    parser.set_persistent("offset_x", 1)
+    flushing = threading.Thread(target=parser.flush)
+    flushing.start()
+    assert writing.wait(timeout=5)
+
+    started = time.perf_counter()
+    parser.set_persistent("offset_x", 2)
+    assert time.perf_counter() - started < 0.5
+
+    release.set()
+    flushing.join()
+    monkeypatch.undo()
+    parser.flush()
+    assert read_back(parser).get("main", "offset_x") == "2"
@@ -0,0 +1,125 @@
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from myhumbleself import cli, evaluate
+
+GOLDEN_BASELINES = Path(__file__).parent / "golden_baselines.json"
+
+FPS = 10
+
+
+def _boxes(centers_x: list[float], height: float = 100) -> np.ndarray:
+    return np.array([[200, x - height / 2, height, height] for x in centers_x])
+
+
+def test_evaluate_convergence_and_jitter():
+    # Still, then a jump by 200 px, which the tracking follows within 3 frames
+    truth = _boxes([300] * 10 + [500] * 10)
+    tracked = _boxes([*[300, 301] * 5, 350, 420, 480, 495, *[500] * 6])
+
+    metrics = evaluate.evaluate(truth, tracked, np.full(20, 0.01), fps=FPS)
+
+    # Within 10% of the face height from the first frame, and 3 frames after the jump
+    assert metrics["converge_seconds_mean"] == pytest.approx(1.5 / FPS)
+    assert metrics["converge_seconds_max"] == pytest.approx(3 / FPS)
+    assert metrics["unconverged"] == 0
+    # Changes between settled still frames: 9 x 1 px before, and 5 px after the jump
+    assert metrics["jitter_px"] == pytest.approx((9 + 5) / 15)
+    assert metrics["cost_ms_mean"] == pytest.approx(10)
+
+
+def test_evaluate_lag_of_delayed_tracking():
+    truth = _boxes([300] * 5 + list(range(300, 400, 4)) + [396] * 5)
+    tracked = np.roll(truth, 3, axis=0)
+    tracked[:3] = truth[0]
+
+    metrics = evaluate.evaluate(truth, tracked, np.zeros(len(truth)), fps=FPS)
+
+    assert metrics["lag_seconds"] == pytest.approx(3 / FPS)
+
+
+def test_evaluate_counts_misses_and_unconverged_jumps():
+    truth = _boxes([300] * 5 + [600] * 5)
+    tracked = _boxes([300] * 10)
+    tracked[2] = np.nan
+
+    metrics = evaluate.evaluate(truth, tracked, np.zeros(10), fps=FPS)
+
+    assert metrics["misses"] == 1
+    assert metrics["unconverged"] == 1
+
+
+def test_compare_allows_tolerance_and_slack():
+    baseline = {"error_px": 10, "jitter_px": 1, "lag_seconds": 0.5}
+
+    assert not evaluate.compare(
+        {"error_px": 12.5, "jitter_px": 1.3, "lag_seconds": 0.6}, baseline
+    )
+    regressions = evaluate.compare(
+        {"error_px": 13.5, "jitter_px": 1.3, "lag_seconds": 0.6}, baseline
+    )
+    assert [r.split(":")[0] for r in regressions] == ["error_px"]
+
+
+def test_load_clip_reads_annotations(tmp_path):
+    writer = cv2.VideoWriter(
+        str(tmp_path / "clip.avi"), cv2.VideoWriter_fourcc(*"MJPG"), FPS, (64, 48)
+    )
+    for value in range(3):
+        writer.write(np.full((48, 64, 3), value * 100, dtype=np.uint8))
+    writer.release()
+    annotation = tmp_path / "clip.json"
+    annotation.write_text(
+        json.dumps(
+            {
+                "video": "clip.avi",
+                "fps": FPS,
+                "boxes": [[1, 2, 3, 4], None, [1, 2, 3, 4]],
+            }
+        )
+    )
+
+    clip = evaluate.load_clip(annotation)
+
+    assert clip.name == "clip"
+    assert np.isnan(clip.truth[1]).all()
+    assert [frame.shape for frame in clip.frames()] == [(48, 64, 3)] * 3
+
+
+def test_motion_clip_moves_face_as_annotated():
+    clip = evaluate.motion_clip(fps=2)
+    frames = list(clip.frames())
+
+    assert len(frames) == len(clip.truth) == 18
+    # The detector finds the face where the ground truth expects it
+    for index in (0, 4, 8):
+        face = evaluate._detect_largest_face(frames[index])
+        assert np.abs(face - clip.truth[index]).max() < 0.1 * clip.truth[index, 2]
+
+
+def test_golden_metrics_match_baseline():
+    # Fails, if changes of detection or smoothing make tracking worse. If the change
+    # is intended, update the baseline:
+    # `myhumbleself evaluate --baseline tests/golden_baselines.json --update`
+    cli.main(["evaluate", f"--baseline={GOLDEN_BASELINES}"])
+
+
+def test_update_baseline(tmp_path, monkeypatch, capsys):
+    short_clip = evaluate.motion_clip(fps=2)
+    monkeypatch.setattr(evaluate, "motion_clip", lambda: short_clip)
+    baseline = tmp_path / "baseline.json"
+
+    evaluate.main([f"--baseline={baseline}", "--update", "--json"])
+
+    printed = json.loads(capsys.readouterr().out)
+    stored = json.loads(baseline.read_text())
+    assert "cost_ms_mean" in printed["motion"]
+    assert set(stored["motion"]) == set(evaluate.QUALITY_METRICS)
+    # Unchanged settings pass, worse ones fail
+    evaluate.main([f"--baseline={baseline}"])
+    with pytest.raises(SystemExit, match="Regressions"):
+        evaluate.main([f"--baseline={baseline}", "--follow-face-speed-factor=0.01"])
@@ -1 +1,150 @@
-# image = cv2.imread(str((Path(__file__).parent / "image.jpg").resolve()))
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import cv2
+import pytest
+
+from myhumbleself import face_detection
+
+DEMO_VIDEO = Path(face_detection.__file__).parent / "resources" / "demo.mp4"
+
+
+@pytest.fixture(scope="module")
+def demo_frames():
+    capture = cv2.VideoCapture(str(DEMO_VIDEO))
+    frames = [capture.read()[1] for _ in range(5)]
+    capture.release()
+    return frames
+
+
+@pytest.fixture()
+def detection_process():
+    detection = face_detection.FaceDetectionProcess()
+    yield detection
+    detection.close()
+
+
+def test_get_faces_finds_face(demo_frames):
+    detection = face_detection.FaceDetection()
+    faces = detection.get_faces(demo_frames[0])
+    # Has moved away from the initial full image area
+    assert faces.shape == (1, 4)
+    assert faces[0, 3] < demo_frames[0].shape[1] - 1
+
+
+def test_detection_process_matches_in_process_detection(demo_frames, detection_process):
+    detection = face_detection.FaceDetection()
+    for frame in demo_frames:
+        expected = detection.get_faces(frame)
+        faces = detection_process.get_faces(frame)
+        assert faces.tolist() == expected.tolist()
+
+
+def test_detection_process_restarts_after_crash(demo_frames, detection_process):
+    detection_process.get_faces(demo_frames[0])
+    crashed_process = detection_process._process
+    crashed_process.kill()
+    crashed_process.join()
+
+    detection_process.get_faces(demo_frames[1])  # Detects crash & restarts
+    faces = detection_process.get_faces(demo_frames[2])
+
+    assert detection_process._process is not crashed_process
+    assert detection_process._process.is_alive()
+    assert faces[0, 3] < demo_frames[0].shape[1] - 1
+
+
+def test_batcher_detects_faces_per_frame(demo_frames):
+    batcher = face_detection.FaceDetectionBatcher()
+    try:
+        detection = face_detection.FaceDetection()
+        small = detection._downscale(demo_frames[0], detection.detection_width)
+        size_hw = demo_frames[0].shape[:2]
+        expected = detection._detect_faces_cnn(small, size_hw=size_hw)
+
+        faces, no_faces, more_faces = batcher._detect_batch(
+            [(small, size_hw), (small[:, :, :] * 0, size_hw), (small, size_hw)]
+        )
+    finally:
+        batcher.close()
+
+    assert len(expected) == len(faces) == len(more_faces) == 1
+    assert no_faces == []
+    # Frames are stacked, so results are mapped back from different offsets
+    for face in (faces[0], more_faces[0]):
+        assert abs(face.top - expected[0].top) < 20
+        assert abs(face.left - expected[0].left) < 20
+
+
+def test_batcher_serves_several_sources(demo_frames):
+    batcher = face_detection.FaceDetectionBatcher()
+    clients = [batcher.client(), batcher.client()]
+    results: dict[int, list] = {0: [], 1: []}
+
+    def detect(idx):
+        for frame in demo_frames:
+            results[idx].append(clients[idx].get_faces(frame))
+
+    threads = [threading.Thread(target=detect, args=(idx,)) for idx in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for client in clients:
+        client.close()
+    batcher.close()
+
+    for faces in results.values():
+        assert len(faces) == len(demo_frames)
+        assert faces[-1][0, 3] < demo_frames[0].shape[1] - 1
+    assert not batcher._thread.is_alive()
+
+
+def test_group_framing_tracks_faces(demo_frames, detection_process):
+    detection = face_detection.FaceDetection()
+    detection.group_framing = True
+    detection_process.group_framing = True
+
+    for frame in demo_frames:
+        faces = detection.get_faces(frame)
+        assert detection_process.get_faces(frame).tolist() == faces.tolist()
+
+    # The demo video shows a single person
+    assert faces.shape == (1, 4)
+    assert faces[0, 3] < demo_frames[0].shape[1] / 2
+
+
+def test_detection_process_startup_is_not_limited_by_request_timeout(demo_frames):
+    # Starting the worker takes much longer than the request timeout
+    detection = face_detection.FaceDetectionProcess(timeout=0.05)
+    try:
+        started_process = detection._process
+        faces = detection.get_faces(demo_frames[0])
+
+        assert detection._process is started_process
+        assert faces[0, 3] < demo_frames[0].shape[1] - 1
+    finally:
+        detection.close()
+
+
+def test_detection_process_frees_shared_memory_cleanly():
+    # The resource tracker runs in a process of its own, so check its output in a
+    # fresh interpreter
+    script = (
+        "from myhumbleself import face_detection\n"
+        "if __name__ == '__main__':\n"
+        "    face_detection.FaceDetectionProcess().close()\n"
+    )
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        timeout=60,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+    )
+
+    assert "KeyError" not in result.stderr
+    assert "leaked" not in result.stderr
@@ -0,0 +1,77 @@
+import pytest
+
+from myhumbleself import governor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture()
+def quality_governor(clock):
+    return governor.QualityGovernor(target_fps=25, patience=2, clock=clock)
+
+
+def run_updates(quality_governor, clock, stage_times, count):
+    levels = []
+    for _ in range(count):
+        clock.now += quality_governor.interval
+        levels.append(quality_governor.update(stage_times))
+    return levels
+
+
+def test_steps_down_only_after_sustained_overload(quality_governor, clock):
+    overloaded = {"detection": [0.05, 0.06], "composition": [0.01]}
+
+    levels = run_updates(quality_governor, clock, overloaded, count=2)
+
+    assert levels[0] is None
+    assert levels[1] == governor.QUALITY_LEVELS[1]
+    assert quality_governor.load == pytest.approx(0.055 * 25)
+
+
+def test_keeps_level_within_thresholds(quality_governor, clock):
+    busy = {"detection": [0.03]}  # load 0.75
+
+    levels = run_updates(quality_governor, clock, busy, count=10)
+
+    assert levels == [None] * 10
+    assert quality_governor.level_index == 0
+
+
+def test_steps_up_with_backoff_after_overload(quality_governor, clock):
+    overloaded = {"detection": [0.06]}
+    idle = {"detection": [0.001]}
+
+    run_updates(quality_governor, clock, overloaded, count=2)
+    assert quality_governor.level_index == 1
+
+    # Too early to retry the level, which just was overloaded
+    run_updates(quality_governor, clock, idle, count=2)
+    assert quality_governor.level_index == 1
+
+    clock.now += quality_governor.backoff
+    run_updates(quality_governor, clock, idle, count=2)
+    assert quality_governor.level_index == 0
+
+
+def test_cpu_budget_sums_up_stages(clock):
+    quality_governor = governor.QualityGovernor(
+        target_fps=25, cpu_budget=0.5, patience=1, clock=clock
+    )
+    # Each stage alone fits into the frame budget, but not all together on half a core
+    stage_times = {"decode": [0.01], "detection": [0.01], "composition": [0.01]}
+
+    run_updates(quality_governor, clock, stage_times, count=1)
+
+    assert quality_governor.load == pytest.approx(0.75 / 0.5)
+    assert quality_governor.level_index == 1
@@ -0,0 +1,56 @@
+import threading
+import uuid
+from pathlib import Path
+
+import pytest
+
+from myhumbleself import camera, cli, headless, sinks, video_handler
+
+DEMO_VIDEO = Path(__file__).parent.parent / "myhumbleself" / "resources" / "demo.mp4"
+
+
+def test_serve_feeds_sinks_without_window():
+    name = f"myhumbleself-test-{uuid.uuid4().hex[:8]}"
+    handler = video_handler.VideoHandler(
+        cam_id=camera.DEMO_CAM_ID,
+        shape_png_buffer=video_handler.default_shape_png(),
+        zoom_factor=1,
+        offset_x=0,
+        offset_y=0,
+        follow_face=False,
+    )
+    handler.add_sink(sinks.SharedMemoryRing(name=name, max_size_wh=(640, 640)))
+    reader = sinks.RingReader(name)
+    try:
+        requests = headless.serve(handler, fps=30, stop=threading.Event(), duration=1)
+        assert requests > 10
+        assert reader.seq > 0
+        latest = reader.latest()
+        assert latest is not None
+        assert latest[2].shape[2] == 4
+        del latest
+    finally:
+        reader.close()
+        handler.stop()
+
+
+def test_headless_requires_a_sink():
+    with pytest.raises(SystemExit):
+        headless.main([])
+
+
+def test_cli_dispatches_headless(tmp_path):
+    output = tmp_path / "frames"
+    cli.main(
+        [
+            "headless",
+            f"--video={DEMO_VIDEO}",
+            "--no-follow-face",
+            "--width=64",
+            "--fps=10",
+            "--duration=1",
+            f"--record={output}",
+        ]
+    )
+
+    assert len(list(output.glob("*.png"))) >= 5
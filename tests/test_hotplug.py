@@ -0,0 +1,55 @@
+import queue
+
+import pytest
+
+from myhumbleself import hotplug
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_device_watcher_reports_added_and_removed_devices(tmp_path, use_inotify):
+    (tmp_path / "video0").touch()
+    (tmp_path / "tty0").touch()
+    changes = queue.Queue()
+    watcher = hotplug.DeviceWatcher(
+        changes.put, directory=tmp_path, interval=0.05, use_inotify=use_inotify
+    )
+    assert watcher.scan() == {0}
+
+    watcher.start()
+    try:
+        (tmp_path / "video2").touch()
+        assert changes.get(timeout=5) == {0, 2}
+        # Repeated once, for devices which weren't accessible immediately
+        assert changes.get(timeout=5) == {0, 2}
+
+        (tmp_path / "video0").unlink()
+        (tmp_path / "tty1").touch()
+        assert changes.get(timeout=5) == {2}
+    finally:
+        watcher.stop()
+
+
+def test_device_watcher_survives_failing_callback(tmp_path):
+    calls = queue.Queue()
+
+    def on_change(present):
+        calls.put(present)
+        raise RuntimeError("Broken")
+
+    watcher = hotplug.DeviceWatcher(on_change, directory=tmp_path, interval=0.05)
+    watcher.start()
+    try:
+        (tmp_path / "video1").touch()
+        assert calls.get(timeout=5) == {1}
+        (tmp_path / "video3").touch()
+        while calls.get(timeout=5) != {1, 3}:
+            pass
+    finally:
+        watcher.stop()
+
+
+def test_device_watcher_of_missing_directory(tmp_path):
+    watcher = hotplug.DeviceWatcher(print, directory=tmp_path / "missing")
+    assert watcher.scan() == set()
+    watcher.start()
+    watcher.stop()
@@ -0,0 +1,29 @@
+import numpy as np
+
+from myhumbleself import insets
+
+
+def test_overlay_blends_by_alpha():
+    base = np.zeros((100, 200, 4), dtype=np.uint8)
+    base[:, :, 3] = 255
+    image = np.zeros((50, 50, 4), dtype=np.uint8)
+    image[:, :25] = (255, 0, 0, 255)  # Opaque left half
+    image[:, 25:] = (255, 0, 0, 0)  # Transparent right half
+
+    insets.overlay(base, image, center=(0.5, 0.5), width=0.25)
+
+    # Drawn 50px wide around the center
+    assert base[50, 76].tolist() == [255, 0, 0, 255]
+    assert base[50, 124].tolist() == [0, 0, 0, 255]
+    assert base[10, 100].tolist() == [0, 0, 0, 255]
+
+
+def test_overlay_cuts_off_outside_parts():
+    base = np.zeros((100, 100, 4), dtype=np.uint8)
+    image = np.full((40, 40, 4), 255, dtype=np.uint8)
+
+    insets.overlay(base, image, center=(1, 1), width=0.4)
+    insets.overlay(base, image, center=(-1, -1), width=0.4)
+
+    assert base[90:, 90:].min() == 255
+    assert base[:75, :75].max() == 0
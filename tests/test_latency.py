@@ -0,0 +1,28 @@
+import cv2
+import numpy as np
+import pytest
+
+from myhumbleself import latency, metrics
+
+
+@pytest.mark.parametrize("counter", [0, 1, 4711, 2**latency.COUNTER_BITS - 1])
+def test_frame_counter_survives_downscaling(counter):
+    image = np.random.randint(0, 255, size=(720, 1280, 3), dtype=np.uint8)
+    latency.stamp_frame_counter(image, counter)
+
+    small = cv2.resize(image, (320, 180), interpolation=cv2.INTER_AREA)
+    rgba = cv2.cvtColor(small, cv2.COLOR_BGR2RGBA)
+
+    assert latency.read_frame_counter(rgba) == counter
+
+
+def test_read_frame_counter_without_stamp():
+    image = np.zeros((720, 1280, 3), dtype=np.uint8)
+    assert latency.read_frame_counter(image) is None
+
+
+def test_describe_reports_milliseconds():
+    histogram = metrics.Histogram()
+    for value in (0.01, 0.02, 0.03):
+        histogram.observe(value)
+    assert latency.describe(histogram) == "latency p50/p90/p99: 20/28/30 ms"
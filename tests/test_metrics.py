@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from myhumbleself import metrics
+
+
+def test_histogram_keeps_most_recent_values():
+    histogram = metrics.Histogram(size=3)
+    for value in [1, 2, 3, 4, 5]:
+        histogram.observe(value)
+
+    assert histogram.values().tolist() == [3, 4, 5]
+    assert histogram.values(last=2).tolist() == [4, 5]
+    assert histogram.count == 5
+    assert histogram.sum == 15
+    assert histogram.mean() == 4
+
+
+def test_histogram_rate_and_reset():
+    histogram = metrics.Histogram()
+    for _ in range(10):
+        histogram.observe(0.04)
+    assert histogram.rate() == pytest.approx(25)
+
+    histogram.reset()
+    assert not len(histogram.values())
+    assert histogram.rate() == 0
+
+
+def test_disabled_registry_ignores_everything():
+    registry = metrics.Registry(enabled=False)
+    registry.histogram("stage_seconds").observe(1)
+    registry.counter("hits").inc()
+    with registry.timer("other_seconds"):
+        pass
+
+    snapshot = registry.snapshot()
+    assert snapshot["histograms"] == {}
+    assert snapshot["counters"] == {}
+
+
+def test_registry_json_export():
+    registry = metrics.Registry()
+    with registry.timer("stage_seconds"):
+        pass
+    registry.counter("hits").inc(2)
+    registry.gauge("queue_dropped", lambda: 7)
+
+    snapshot = json.loads(registry.to_json())
+    assert snapshot["histograms"]["stage_seconds"]["count"] == 1
+    assert snapshot["counters"] == {"hits": 2}
+    assert snapshot["gauges"] == {"queue_dropped": 7}
+
+
+def test_prefixed_registry_stores_metrics_in_parent():
+    registry = metrics.Registry()
+    registry.counter("hits").inc()
+    inset = registry.prefixed("inset2_")
+    inset.counter("hits").inc(2)
+    inset.histogram("stage_seconds").observe(0.5)
+    inset.gauge("queue_dropped", lambda: 7)
+
+    assert registry.snapshot()["counters"] == {"hits": 1, "inset2_hits": 2}
+    assert registry.snapshot()["histograms"]["inset2_stage_seconds"]["count"] == 1
+    assert registry.snapshot()["gauges"] == {"inset2_queue_dropped": 7}
+    assert inset.snapshot()["counters"] == {"inset2_hits": 2}
+    assert not metrics.Registry(enabled=False).prefixed("inset2_").enabled
+
+
+def test_registry_prometheus_export(tmp_path):
+    registry = metrics.Registry()
+    registry.histogram("stage_seconds").observe(0.5)
+    registry.counter("hits").inc()
+
+    path = tmp_path / "metrics.prom"
+    registry.write(path)
+    text = path.read_text()
+
+    assert "# TYPE myhumbleself_stage_seconds summary" in text
+    assert 'myhumbleself_stage_seconds{quantile="0.5"} 0.5' in text
+    assert "myhumbleself_stage_seconds_count 1" in text
+    assert "myhumbleself_hits_total 1" in text
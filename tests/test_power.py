@@ -0,0 +1,126 @@
+import logging
+
+import pytest
+
+from myhumbleself import metrics, power
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.capture_fps = None
+        self.detection_enabled = True
+        self.camera_released = False
+
+    def set_capture_fps(self, fps):
+        self.capture_fps = fps
+
+    def set_detection_enabled(self, enabled):
+        self.detection_enabled = enabled
+
+    def release_camera(self):
+        self.camera_released = True
+
+    def resume_camera(self):
+        self.camera_released = False
+
+
+@pytest.fixture()
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture()
+def handler():
+    return RecordingHandler()
+
+
+@pytest.fixture()
+def policy(handler, clock):
+    return power.PowerPolicy(
+        handler, idle_after=10, release_after=20, clock=clock, cpu_clock=clock
+    )
+
+
+def test_idle_after_inactivity_with_hidden_controls(policy, handler, clock):
+    policy.set_window_state(visible=True, controls_hidden=True)
+    clock.now = 5
+    policy.notify_frame()
+    assert policy.update() is power.PowerState.ACTIVE
+
+    clock.now = 11
+    policy.notify_frame()
+    assert policy.update() is power.PowerState.IDLE
+    assert handler.capture_fps == policy.idle_fps
+    assert handler.detection_enabled
+
+    policy.notify_activity()
+    assert policy.state is power.PowerState.ACTIVE
+    assert handler.capture_fps is None
+
+
+def test_hidden_window_suspends_detection_then_releases_camera(policy, handler, clock):
+    policy.set_window_state(visible=False, controls_hidden=False)
+    assert policy.state is power.PowerState.HIDDEN
+    assert handler.capture_fps == policy.hidden_fps
+    assert not handler.detection_enabled
+    assert not handler.camera_released
+
+    clock.now = 21
+    assert policy.update() is power.PowerState.RELEASED
+    assert handler.camera_released
+
+    policy.set_window_state(visible=True, controls_hidden=False)
+    policy.notify_frame()
+    assert policy.state is power.PowerState.ACTIVE
+    assert not handler.camera_released
+    assert handler.detection_enabled
+    assert handler.capture_fps is None
+
+
+def test_stopped_frame_clock_counts_as_hidden(policy, clock):
+    clock.now = policy.frame_timeout + 1
+    assert policy.update() is power.PowerState.HIDDEN
+
+    policy.notify_frame()
+    assert policy.state is power.PowerState.ACTIVE
+
+
+def test_cpu_usage_is_accounted_per_state(policy, clock):
+    clock.now = 10
+    policy.set_window_state(visible=False, controls_hidden=False)
+    # Fake cpu clock advances with the wall clock, resulting in 100% usage
+    assert policy.cpu_usage() == {power.PowerState.ACTIVE: 100}
+
+
+def test_time_per_state_is_exported_as_gauges(handler, clock):
+    registry = metrics.Registry()
+    policy = power.PowerPolicy(
+        handler, clock=clock, cpu_clock=lambda: clock.now / 2, metrics_registry=registry
+    )
+    clock.now = 10
+    policy.set_window_state(visible=False, controls_hidden=False)
+    clock.now = 14
+
+    gauges = registry.snapshot()["gauges"]
+
+    assert gauges["power_active_seconds"] == 10
+    assert gauges["power_active_cpu_seconds"] == 5
+    # Includes the time in the current state
+    assert gauges["power_hidden_seconds"] == 4
+    assert gauges["power_released_seconds"] == 0
+
+
+def test_log_summary(policy, clock, caplog):
+    clock.now = 10
+    with caplog.at_level(logging.INFO, logger=power.__name__):
+        policy.log_summary()
+
+    assert "Power state active: 10.0s, CPU 100%." in caplog.text
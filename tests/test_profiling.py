@@ -0,0 +1,45 @@
+import pstats
+import threading
+
+import numpy as np
+
+from myhumbleself import profiling
+
+
+def busy_worker_function():
+    for _ in range(50):
+        np.sort(np.random.random(10_000))
+
+
+def test_profiler_covers_threads_started_afterwards(tmp_path):
+    profiler = profiling.Profiler(output_dir=tmp_path, cpu=True, memory=True)
+    profiler.start()
+    assert profiler.running
+
+    thread = threading.Thread(target=busy_worker_function, name="worker")
+    thread.start()
+    thread.join()
+    report_path = profiler.stop()
+
+    assert not profiler.running
+    report = report_path.read_text()
+    assert "busy_worker_function" in report
+    assert "=== Memory: Top allocating lines ===" in report
+    if not profiling.PROFILES_ALL_THREADS:
+        assert "Thread 'worker'" in report
+
+    prof_path = report_path.with_suffix(".prof")
+    stats = pstats.Stats(str(prof_path))
+    assert any(func[2] == "busy_worker_function" for func in stats.stats)
+
+
+def test_profiler_memory_only(tmp_path):
+    profiler = profiling.Profiler(output_dir=tmp_path, cpu=False, memory=True)
+    profiler.start()
+    data = [bytearray(1000) for _ in range(100)]
+    report = profiler.stop().read_text()
+
+    assert data
+    assert "=== CPU" not in report
+    assert "Top growing lines since start" in report
+    assert not list(tmp_path.glob("*.prof"))
@@ -0,0 +1,130 @@
+import shutil
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from myhumbleself import cli, render
+
+DEMO_VIDEO = Path(__file__).parent.parent / "myhumbleself" / "resources" / "demo.mp4"
+
+
+def _read_pngs(directory: Path) -> list[np.ndarray]:
+    return [
+        cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+        for path in sorted(directory.glob("*.png"))
+    ]
+
+
+def test_plan_chunks_covers_all_frames_with_warmup():
+    settings = render.RenderSettings(
+        input=DEMO_VIDEO, output=Path(), chunk_seconds=1, warmup_seconds=0.5
+    )
+    chunks = render.plan_chunks(250, fps=50, settings=settings, workers=2)
+
+    assert [(c.start, c.stop, c.warmup) for c in chunks] == [
+        (0, 50, 0),
+        (50, 100, 25),
+        (100, 150, 25),
+        (150, 200, 25),
+        (200, None, 25),
+    ]
+
+
+def test_plan_chunks_keeps_all_workers_busy():
+    settings = render.RenderSettings(input=DEMO_VIDEO, output=Path(), max_frames=30)
+    chunks = render.plan_chunks(30, fps=50, settings=settings, workers=4)
+
+    assert [(c.start, c.stop) for c in chunks] == [
+        (0, 8),
+        (8, 16),
+        (16, 24),
+        (24, 30),
+    ]
+
+
+def test_chunked_rendering_matches_sequential_rendering(tmp_path):
+    settings = render.RenderSettings(
+        input=DEMO_VIDEO,
+        output=tmp_path / "sequential",
+        width=120,
+        workers=1,
+        chunk_seconds=10,
+        warmup_seconds=0.8,
+        max_frames=90,
+    )
+    render.run(settings)
+    settings.output = tmp_path / "chunked"
+    settings.workers = 2
+    settings.chunk_seconds = 0.6
+    result = render.run(settings)
+
+    sequential = _read_pngs(tmp_path / "sequential")
+    chunked = _read_pngs(tmp_path / "chunked")
+    assert result["chunks"] == 3
+    assert len(sequential) == len(chunked) == 90
+    for expected, image in zip(sequential, chunked, strict=True):
+        assert image.shape == (120, 120, 4)
+        # The warm-up lets the smoothing settle, so chunk borders hardly differ
+        assert np.abs(expected.astype(int) - image).mean() < 2
+
+
+def test_output_keeps_alpha_of_shape(tmp_path):
+    settings = render.RenderSettings(
+        input=DEMO_VIDEO, output=tmp_path, width=64, workers=1, max_frames=2
+    )
+    render.run(settings)
+
+    image = _read_pngs(tmp_path)[0]
+    assert image[0, 0, 3] == 0
+    assert image[32, 32, 3] == 255
+
+
+def test_unsupported_output_is_rejected(tmp_path):
+    settings = render.RenderSettings(input=DEMO_VIDEO, output=tmp_path / "out.gif")
+    with pytest.raises(ValueError, match="Unsupported output"):
+        render.run(settings)
+
+
+def test_empty_input_is_rejected(tmp_path):
+    empty_video = tmp_path / "empty.avi"
+    writer = cv2.VideoWriter(
+        str(empty_video), cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48)
+    )
+    writer.release()
+
+    with pytest.raises(SystemExit, match="No frames were rendered"):
+        cli.main(["render", str(empty_video), str(tmp_path / "out"), "--workers=1"])
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="requires ffmpeg")
+def test_render_video_file_with_alpha(tmp_path):
+    output = tmp_path / "out.mkv"
+    settings = render.RenderSettings(
+        input=DEMO_VIDEO, output=output, width=64, workers=2, max_frames=20
+    )
+    settings.chunk_seconds = 0.2
+    result = render.run(settings)
+
+    assert result["chunks"] == 2
+    capture = cv2.VideoCapture(str(output))
+    assert capture.get(cv2.CAP_PROP_FRAME_COUNT) == 20
+    capture.release()
+
+
+def test_cli_dispatches_render_without_gui(capsys, tmp_path):
+    cli.main(
+        [
+            "render",
+            str(DEMO_VIDEO),
+            str(tmp_path),
+            "--width=32",
+            "--workers=1",
+            "--frames=3",
+            "--no-follow-face",
+        ]
+    )
+
+    assert len(_read_pngs(tmp_path)) == 3
+    assert "Rendered 3 frames" in capsys.readouterr().out
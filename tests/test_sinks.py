@@ -0,0 +1,255 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from myhumbleself import metrics, sinks, structures
+
+
+def _frame(value: int, size_hw: tuple[int, int] = (40, 40)) -> structures.Frame:
+    image = np.full((*size_hw, 4), value, dtype=np.uint8)
+    return structures.Frame(image=image, seq=value, timestamp=time.monotonic())
+
+
+class SlowSink(sinks.QueuedSink):
+    def __init__(self, **kwargs):
+        super().__init__(name="slow", **kwargs)
+        self.processed = []
+
+    def _process(self, frame, put_at):
+        time.sleep(0.02)
+        self.processed.append(frame.seq)
+
+
+def test_fit_keeps_aspect_ratio_with_transparent_borders():
+    image = np.full((20, 40, 4), 255, dtype=np.uint8)
+
+    fitted = sinks.fit(image, (40, 40))
+
+    assert fitted.shape == (40, 40, 4)
+    assert fitted[0, 20, 3] == 0
+    assert fitted[20, 20, 3] == 255
+    assert sinks.fit(image, (40, 20)) is image
+
+
+def test_unsupported_output_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported output"):
+        sinks.Recorder(tmp_path / "out.gif")
+
+
+def test_sink_without_process_cant_be_created():
+    class IncompleteSink(sinks.QueuedSink):
+        pass
+
+    with pytest.raises(TypeError, match="_process"):
+        IncompleteSink(name="incomplete")  # type: ignore[abstract]
+
+
+def test_drop_policy_keeps_producer_fast():
+    sink = SlowSink(queue_size=2, drop_policy=structures.DropPolicy.DROP_NEWEST)
+    sink.start()
+
+    started = time.perf_counter()
+    accepted = [sink.put(_frame(i)) for i in range(20)]
+    elapsed = time.perf_counter() - started
+    sink.close()
+
+    assert elapsed < 0.1
+    assert sink.dropped == accepted.count(False) > 0
+    assert sink.processed == [i for i, ok in enumerate(accepted) if ok]
+
+
+def test_block_policy_keeps_all_frames():
+    sink = SlowSink(queue_size=2, drop_policy=structures.DropPolicy.BLOCK)
+    sink.start()
+
+    assert all(sink.put(_frame(i)) for i in range(10))
+    sink.close()
+
+    assert sink.dropped == 0
+    assert sink.processed == list(range(10))
+
+
+def test_failing_sink_stops_accepting_frames():
+    sink = SlowSink()
+    sink._process = lambda frame, put_at: 1 / 0
+    sink.start()
+
+    sink.put(_frame(0))
+    sink._thread.join(timeout=5)
+
+    assert not sink.put(_frame(1))
+    sink.close()
+
+
+def test_recorder_writes_constant_frame_rate(tmp_path):
+    recorder = sinks.Recorder(tmp_path, fps=10)
+
+    recorder._process(_frame(1), put_at=100.0)
+    # Replaced within the same frame interval, so only the latter is recorded
+    recorder._process(_frame(2), put_at=100.01)
+    # Displayed for three frame intervals
+    recorder._process(_frame(3), put_at=100.3)
+    recorder._process(_frame(4, size_hw=(80, 80)), put_at=100.4)
+    recorder._finish()
+
+    images = [
+        cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+        for path in sorted(tmp_path.glob("*.png"))
+    ]
+    assert [int(image[0, 0, 3]) for image in images] == [2, 2, 2, 3, 4]
+    # Later frames are scaled to the size of the first one
+    assert {image.shape for image in images} == {(40, 40, 4)}
+    assert recorder.written == 5
+
+
+def test_recorder_reports_lag(tmp_path):
+    registry = metrics.Registry()
+    recorder = sinks.Recorder(tmp_path, metrics_registry=registry)
+    recorder.start()
+    for i in range(5):
+        recorder.put(_frame(i))
+    recorder.close()
+
+    snapshot = registry.snapshot()
+    assert snapshot["histograms"]["recording_lag_seconds"]["count"] == 5
+    assert snapshot["gauges"]["recording_dropped_frames"] == 0
+    assert recorder.lag > 0
+
+
+def test_pipe_sink_writes_y4m_with_alpha(tmp_path):
+    output = tmp_path / "out.y4m"
+    sink = sinks.PipeSink(target=output, fmt="y4m", fps=25)
+    sink.start()
+    image = np.zeros((4, 6, 4), dtype=np.uint8)
+    image[:, :, 0] = 255
+    image[:, :3, 3] = 255
+    sink.put(structures.Frame(image=image, seq=1, timestamp=0))
+    sink.put(structures.Frame(image=image, seq=2, timestamp=0))
+    sink.close()
+
+    header, data = output.read_bytes().split(b"\n", 1)
+    assert header.split()[:4] == [b"YUV4MPEG2", b"W6", b"H4", b"F25:1"]
+    assert b"C444alpha" in header
+    frame_size = len(b"FRAME\n") + 4 * 6 * 4
+    assert len(data) == 2 * frame_size
+    planes = np.frombuffer(data[6:frame_size], dtype=np.uint8).reshape(4, 4, 6)
+    y, cb, cr, alpha = planes
+    assert y[0, 0] == 76  # full range luma of pure red
+    assert cr[0, 0] == 255
+    assert alpha[0].tolist() == [255, 255, 255, 0, 0, 0]
+
+
+def test_pipe_sink_writes_raw_rgba_of_fixed_size(tmp_path):
+    output = tmp_path / "out.rgba"
+    sink = sinks.PipeSink(target=output, fmt="rgba", size_wh=(8, 8))
+    sink.start()
+    sink.put(_frame(10, size_hw=(16, 16)))
+    sink.close()
+
+    assert output.read_bytes() == bytes([10]) * 8 * 8 * 4
+
+
+def test_pipe_sink_stops_when_reader_is_gone():
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd)
+    sink = sinks.PipeSink(target=Path(f"/dev/fd/{write_fd}"), fmt="rgba")
+    sink.start()
+    try:
+        sink.put(_frame(1))
+        sink._thread.join(timeout=5)
+        assert not sink.put(_frame(2))
+    finally:
+        sink.close()
+        os.close(write_fd)
+
+
+def test_shared_memory_ring_publishes_frames():
+    name = f"myhumbleself-test-{uuid.uuid4().hex[:8]}"
+    ring = sinks.SharedMemoryRing(name=name, slots=3, max_size_wh=(32, 32))
+    reader = sinks.RingReader(name)
+    try:
+        assert reader.latest() is None
+        assert reader.max_size_wh == (32, 32)
+
+        ring._process(_frame(1), put_at=0)
+        seq, timestamp, image = reader.latest()
+        assert seq == 1
+        assert image.shape == (32, 32, 4)  # scaled down to the max size
+        assert image[0, 0, 0] == 1
+        assert reader.is_valid(seq)
+
+        for value in range(2, 5):
+            ring._process(_frame(value, size_hw=(10, 20)), put_at=0)
+        assert not reader.is_valid(seq)
+        seq, timestamp, image = reader.latest()
+        assert (seq, image.shape) == (4, (10, 20, 4))
+        assert image[0, 0, 0] == 4
+        del image
+
+        with pytest.raises(ValueError, match="already in use"):
+            sinks.SharedMemoryRing(name=name)
+    finally:
+        reader.close()
+        ring.close()
+
+
+def test_pipe_sink_closes_without_fifo_reader(tmp_path):
+    fifo = tmp_path / "fifo"
+    os.mkfifo(fifo)
+    sink = sinks.PipeSink(target=fifo, fmt="rgba")
+    sink.start()
+    sink.put(_frame(1))
+    time.sleep(0.2)
+
+    closing = threading.Thread(target=sink.close, daemon=True)
+    closing.start()
+    closing.join(timeout=5)
+
+    assert not closing.is_alive()
+
+
+def test_pipe_sink_writes_to_fifo_reader(tmp_path):
+    fifo = tmp_path / "fifo"
+    os.mkfifo(fifo)
+    sink = sinks.PipeSink(target=fifo, fmt="rgba", size_wh=(2, 2))
+    sink.start()
+    sink.put(_frame(1))
+    with fifo.open("rb") as reader:
+        sink.put(_frame(7))
+        sink.close()
+        data = reader.read()
+
+    assert data.endswith(bytes([7]) * 2 * 2 * 4)
+
+
+def test_ring_reader_keeps_registration_of_writer_in_same_process():
+    # The resource tracker runs in a process of its own, so check its output in a
+    # fresh interpreter
+    name = f"myhumbleself-test-{uuid.uuid4().hex[:8]}"
+    script = (
+        "import time\n"
+        "from myhumbleself import sinks\n"
+        f"ring = sinks.SharedMemoryRing(name={name!r}, max_size_wh=(8, 8))\n"
+        f"sinks.RingReader({name!r}).close()\n"
+        "ring.close()\n"
+        "time.sleep(0.5)  # Let the tracker process the unlink\n"
+    )
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        timeout=60,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+    )
+
+    assert "KeyError" not in result.stderr
+    assert "leaked" not in result.stderr
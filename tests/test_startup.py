@@ -0,0 +1,53 @@
+import importlib.util
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SHAPE_PATH = Path(__file__).parent.parent / "resources" / "shapes" / "01-circle.png"
+
+# Generous budgets, measured in a fresh interpreter. They should catch regressions like
+# importing OpenCV before the window is shown, not benchmark the machine.
+IMPORT_BUDGET_SECONDS = 1.0
+FIRST_FRAME_BUDGET_SECONDS = 5.0
+
+
+def run_python(code: str) -> str:
+    result = subprocess.run(  # noqa: S603 # the test's own code
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return result.stdout
+
+
+@pytest.mark.skipif(importlib.util.find_spec("gi") is None, reason="needs PyGObject")
+def test_app_import_is_fast_and_defers_opencv():
+    output = run_python(
+        "import sys, time\n"
+        "started = time.perf_counter()\n"
+        "import myhumbleself.app\n"
+        "print(time.perf_counter() - started, 'cv2' in sys.modules)\n"
+    )
+    seconds, is_cv2_imported = output.split()
+    assert is_cv2_imported == "False"
+    assert float(seconds) < IMPORT_BUDGET_SECONDS
+
+
+def test_time_to_first_frame():
+    output = run_python(
+        "import time\n"
+        "started = time.perf_counter()\n"
+        "from pathlib import Path\n"
+        "from myhumbleself import video_handler\n"
+        "handler = video_handler.VideoHandler(\n"
+        f"    cam_id=98, shape_png_buffer=Path({str(SHAPE_PATH)!r}).read_bytes(),\n"
+        "    zoom_factor=1, offset_x=0, offset_y=0, follow_face=True,\n"
+        ")\n"
+        f"deadline = started + {FIRST_FRAME_BUDGET_SECONDS * 2}\n"
+        "while handler.last_composed_seq == 0 and time.perf_counter() < deadline:\n"
+        "    handler.get_processed_frame()\n"
+        "    time.sleep(0.005)\n"
+        "print(time.perf_counter() - started)\n"
+        "handler.stop()\n"
+    )
+    assert float(output) < FIRST_FRAME_BUDGET_SECONDS
@@ -1,3 +1,6 @@
+import threading
+
+import numpy as np
 import pytest
 
 from myhumbleself import structures
@@ -118,6 +121,20 @@ def test_rect_copy():
     assert rect is not rect_copy
 
 
+@pytest.mark.parametrize(
+    ("yxhw", "source_hw", "target_hw", "expected_yxhw"),
+    [
+        ((10, 20, 30, 40), (100, 200), (100, 200), (10, 20, 30, 40)),
+        ((10, 20, 30, 40), (100, 200), (50, 100), (5, 10, 15, 20)),
+        ((10, 20, 30, 40), (100, 200), (200, 200), (20, 20, 60, 40)),
+    ],
+)
+def test_rect_map_between(yxhw, source_hw, target_hw, expected_yxhw):
+    rect = structures.Rect(top=yxhw[0], left=yxhw[1], height=yxhw[2], width=yxhw[3])
+    rect.map_between(source_size_hw=source_hw, target_size_hw=target_hw)
+    assert rect.geometry == expected_yxhw
+
+
 def test_rect_move_by():
     y, x, h, w = (5, 10, 20, 40)
     delta_y, delta_x = -10, 5
@@ -146,3 +163,104 @@ def test_rect_stay_within(yxhw, max_height, max_width, expected_yxhw):
     assert rect.left == expected_yxhw[1]
     assert rect.height == expected_yxhw[2]
     assert rect.width == expected_yxhw[3]
+
+
+def test_rect_is_slotted():
+    rect = structures.Rect(top=0, left=0, height=10, width=10)
+    assert not hasattr(rect, "__dict__")
+
+
+@pytest.fixture()
+def rects():
+    rng = np.random.default_rng(seed=7)
+    positions = rng.integers(-300, 1500, size=(50, 2))
+    sizes = rng.integers(1, 900, size=(50, 2))
+    return [
+        structures.Rect(top=top, left=left, height=height, width=width)
+        for (top, left), (height, width) in zip(
+            positions.tolist(), sizes.tolist(), strict=True
+        )
+    ]
+
+
+@pytest.mark.parametrize(
+    ("method", "kwargs"),
+    [
+        ("scale", {"factor": 0.37}),
+        ("scale", {"factor": 1.9}),
+        ("pad", {"padding": 17}),
+        ("pad", {"padding": -3}),
+        ("move_by", {"y": -12, "x": 33}),
+        ("map_between", {"source_size_hw": (720, 1280), "target_size_hw": (480, 640)}),
+        ("stay_within", {"height": 720, "width": 1280}),
+    ],
+)
+def test_rect_array_matches_rect(rects, method, kwargs):
+    rect_array = structures.RectArray.from_rects(rects)
+
+    getattr(rect_array, method)(**kwargs)
+    for rect in rects:
+        getattr(rect, method)(**kwargs)
+
+    assert list(rect_array) == rects
+
+
+def test_rect_array_per_rect_arguments():
+    rect_array = structures.RectArray([[0, 0, 10, 10], [100, 100, 20, 20]])
+    rect_array.pad(np.array([1, 2]))
+    rect_array.move_by(y=np.array([0, 5]), x=1)
+    rect_array.scale(np.array([1, 0.5]))
+
+    assert rect_array.geometry.tolist() == [[-1, 0, 12, 12], [109, 105, 12, 12]]
+
+
+def test_rect_from_geometry():
+    rect = structures.Rect.from_geometry(np.array([5.7, 10, 20, 40]))
+    assert rect == structures.Rect(top=5, left=10, height=20, width=40)
+    assert type(rect.top) is int
+
+
+def test_rect_array_indexing_returns_copies():
+    rect_array = structures.RectArray([5, 10, 20, 40])
+    copy = rect_array.copy()
+    rect_array.move_by(y=1, x=1)
+
+    assert len(rect_array) == 1
+    assert rect_array[0] == structures.Rect(top=6, left=11, height=20, width=40)
+    assert copy[0].geometry == (5, 10, 20, 40)
+    # Changing the returned Rect doesn't affect the array
+    rect_array[0].move_by(y=1, x=1)
+    next(iter(rect_array)).move_by(y=1, x=1)
+    assert rect_array.geometry.tolist() == [[6, 11, 20, 40]]
+    assert rect_array.right.tolist() == [51]
+    assert rect_array.bottom.tolist() == [26]
+    assert rect_array.area.tolist() == [800]
+
+
+@pytest.mark.parametrize(
+    ("drop_policy", "expected_items"),
+    [
+        (structures.DropPolicy.DROP_OLDEST, [2, 3]),
+        (structures.DropPolicy.DROP_NEWEST, [1, 2]),
+        (structures.DropPolicy.BLOCK, [1, 2]),
+    ],
+)
+def test_latest_value_queue_drop_policy(drop_policy, expected_items):
+    queue = structures.LatestValueQueue(maxsize=2, drop_policy=drop_policy)
+    for item in [1, 2, 3]:
+        queue.put(item, timeout=0.01)
+    assert queue.dropped == 1
+    assert [queue.get(timeout=0), queue.get(timeout=0)] == expected_items
+    assert queue.get(timeout=0) is None
+
+
+def test_latest_value_queue_close_wakes_consumer():
+    queue = structures.LatestValueQueue()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(queue.get()))
+    thread.start()
+    queue.close()
+    thread.join(timeout=1)
+    assert not thread.is_alive()
+    assert result == [None]
+    assert not queue.put(1)
@@ -0,0 +1,221 @@
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from myhumbleself import camera, capture_modes, governor, metrics, video_handler
+
+SHAPES_PATH = Path(__file__).parent.parent / "resources" / "shapes"
+
+THREADS = 8
+
+
+def _run_concurrently(func, threads: int = THREADS) -> None:
+    """Start func in several threads at once and re-raise their first exception."""
+    barrier = threading.Barrier(threads)
+    errors: list[BaseException] = []
+
+    def run(index: int) -> None:
+        barrier.wait()
+        try:
+            func(index)
+        except BaseException as exc:
+            errors.append(exc)
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if errors:
+        raise errors[0]
+
+
+@pytest.fixture()
+def thread_errors(monkeypatch):
+    """Exceptions raised in any thread, e.g. in the pipeline stages."""
+    errors: list[threading.ExceptHookArgs] = []
+    monkeypatch.setattr(threading, "excepthook", errors.append)
+    return errors
+
+
+def test_metrics_are_exact_under_concurrent_updates():
+    registry = metrics.Registry(histogram_size=16)
+    iterations = 5000
+
+    def update(_: int) -> None:
+        for _ in range(iterations):
+            registry.counter("frames").inc()
+            registry.histogram("seconds").observe(1.0)
+            registry.snapshot()
+
+    _run_concurrently(update)
+
+    snapshot = registry.snapshot()
+    assert snapshot["counters"]["frames"] == THREADS * iterations
+    assert snapshot["histograms"]["seconds"]["count"] == THREADS * iterations
+    assert snapshot["histograms"]["seconds"]["sum"] == THREADS * iterations
+    assert snapshot["histograms"]["seconds"]["mean"] == 1.0
+
+
+def test_metrics_are_created_once_per_name():
+    registry = metrics.Registry()
+    created: list[metrics.Histogram] = []
+
+    def create(index: int) -> None:
+        for name in range(200):
+            created.append(registry.histogram(f"h{name}"))
+            registry.counter(f"c{index}-{name}")
+            registry.to_prometheus()
+
+    _run_concurrently(create)
+
+    assert len({id(h) for h in created}) == 200
+
+
+def test_process_frame_cache_is_per_handler():
+    handlers = [
+        video_handler.VideoHandler(
+            cam_id=None,
+            shape_png_buffer=(SHAPES_PATH / "01-circle.png").read_bytes(),
+            zoom_factor=zoom_factor,
+            offset_x=0,
+            offset_y=0,
+            follow_face=False,
+        )
+        for zoom_factor in (1, 2)
+    ]
+    frame = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), np.uint8)
+    try:
+        for handler in handlers:
+            handler._input_size_hw = (720, 1280)
+        # Same frame, but different settings, so results of one must not leak into
+        # the other
+        expected = [h._compose(frame, h._detect(frame)).shape for h in handlers]
+
+        def process(index: int) -> None:
+            handler = handlers[index % 2]
+            for _ in range(20):
+                assert handler._process_frame(frame).shape == expected[index % 2]
+
+        _run_concurrently(process)
+    finally:
+        for handler in handlers:
+            handler.stop()
+
+
+def test_capture_mode_requests_during_capture(thread_errors):
+    cam = camera.Camera(available_cameras={camera.DEMO_CAM_ID: np.zeros((1, 1, 3))})
+    modes = [
+        capture_modes.CaptureMode(width=w, height=w * 9 // 16, fps=30, fourcc="MJPG")
+        for w in (640, 1280, 1920)
+    ]
+    cam.start(camera.DEMO_CAM_ID)
+    try:
+
+        def request(index: int) -> None:
+            for i in range(500):
+                cam.set_capture_mode(modes[(index + i) % len(modes)])
+
+        _run_concurrently(request)
+        cam.set_capture_mode(modes[0])
+        deadline = time.monotonic() + 5
+        while cam._capture_mode_changed and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        cam.stop()
+
+    assert not cam._capture_mode_changed
+    assert cam.capture_mode == modes[0]
+    assert not thread_errors
+
+
+def test_pipeline_survives_concurrent_parameter_changes(thread_errors):
+    shapes = [path.read_bytes() for path in sorted(SHAPES_PATH.glob("*.png"))[:3]]
+    handler = video_handler.VideoHandler(
+        cam_id=camera.DEMO_CAM_ID,
+        shape_png_buffer=shapes[0],
+        zoom_factor=1,
+        offset_x=0,
+        offset_y=0,
+        follow_face=True,
+    )
+    stop_at = time.monotonic() + 2
+    changes = [
+        lambda i: handler.move_view(x=(-1) ** i * 20, y=(-1) ** (i // 2) * 20),
+        lambda i: handler.set_view(zoom_factor=0.5 + i % 10 / 5),
+        lambda i: handler.set_view(offset_x=i % 50, offset_y=-(i % 50)),
+        lambda i: handler.reset_view(),
+        lambda i: handler.set_group_framing(i % 2 == 0),
+        lambda i: handler.set_debug_mode(i % 7 == 0),
+        lambda i: handler.set_shape(shapes[i % len(shapes)]),
+        lambda i: handler.apply_quality_level(
+            governor.QUALITY_LEVELS[i % len(governor.QUALITY_LEVELS)]
+        ),
+        lambda i: handler.set_output_size(200 + i % 400, 200 + i % 300),
+    ]
+
+    def hammer(index: int) -> None:
+        if index == 0:
+            # Like the GUI's frame clock
+            while time.monotonic() < stop_at:
+                handler.request_render()
+                handler.get_processed_frame()
+                time.sleep(0.001)
+            return
+        i = 0
+        while time.monotonic() < stop_at:
+            changes[index % len(changes)](i)
+            i += 1
+            time.sleep(0.0005)
+
+    try:
+        _run_concurrently(hammer, threads=len(changes) + 1)
+
+        # The pipeline still delivers frames
+        handler.set_debug_mode(False)
+        seq = handler.last_composed_seq
+        deadline = time.monotonic() + 5
+        while handler.last_composed_seq == seq and time.monotonic() < deadline:
+            handler.request_render()
+            handler.get_processed_frame()
+            time.sleep(0.01)
+        assert handler.last_composed_seq > seq
+        assert all(thread.is_alive() for thread in handler._stage_threads)
+    finally:
+        handler.stop()
+
+    assert not thread_errors
+
+
+def test_view_is_changed_and_read_consistently():
+    handler = video_handler.VideoHandler(
+        cam_id=None,
+        shape_png_buffer=(SHAPES_PATH / "01-circle.png").read_bytes(),
+        zoom_factor=0,
+        offset_x=0,
+        offset_y=0,
+        follow_face=False,
+    )
+    stop_at = time.monotonic() + 1
+
+    def change_or_read(index: int) -> None:
+        i = 0
+        while time.monotonic() < stop_at:
+            i += 1
+            if index % 2:
+                # Zoom and offsets always change together
+                handler.set_view(zoom_factor=i, offset_x=i, offset_y=-i)
+            else:
+                zoom_factor, offset_x, offset_y = handler._get_view()
+                assert zoom_factor == offset_x == -offset_y
+
+    try:
+        _run_concurrently(change_or_read, threads=4)
+    finally:
+        handler.stop()
+
+    with pytest.raises(AttributeError):
+        handler.zoom_factor = 2  # type: ignore[misc]
@@ -0,0 +1,60 @@
+import threading
+
+import numpy as np
+
+from myhumbleself import thumbnails
+
+
+def test_create_thumbnail_keeps_aspect_ratio():
+    image = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    image[..., 0] = 255  # blue in BGR
+
+    thumbnail = thumbnails.create_thumbnail(image, width=192)
+
+    assert thumbnail.shape == (108, 192, 4)
+    assert tuple(thumbnail[0, 0]) == (0, 0, 255, 255)
+
+
+def test_cache_creates_thumbnails_in_background():
+    updated = []
+    done = threading.Event()
+
+    def on_update(cam_id, texture):
+        updated.append((cam_id, threading.current_thread().name, texture.shape))
+        done.set()
+
+    cache = thumbnails.ThumbnailCache(to_texture=lambda t: t, on_update=on_update)
+    assert cache.get(0) is None
+
+    assert cache.request(0, np.zeros((480, 640, 3), dtype=np.uint8))
+    assert done.wait(timeout=5)
+    cache.close()
+
+    assert updated == [(0, "thumbnails_0", (144, 192, 4))]
+    assert cache.get(0).shape == (144, 192, 4)
+
+
+def test_cache_drops_requests_while_pending():
+    unblock = threading.Event()
+    calls = []
+
+    def slow_to_texture(thumbnail):
+        calls.append(thumbnail)
+        unblock.wait(timeout=5)
+        return "texture"
+
+    updated = threading.Semaphore(0)
+    cache = thumbnails.ThumbnailCache(
+        to_texture=slow_to_texture, on_update=lambda *_: updated.release()
+    )
+    image = np.zeros((48, 64, 3), dtype=np.uint8)
+    assert cache.request(0, image)
+    assert not cache.request(0, image)
+    assert cache.request(1, image)
+    unblock.set()
+    assert updated.acquire(timeout=5)
+    assert updated.acquire(timeout=5)
+    cache.close()
+
+    assert len(calls) == 2
+    assert cache.get(0) == cache.get(1) == "texture"
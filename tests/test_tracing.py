@@ -0,0 +1,75 @@
+import json
+import threading
+
+from myhumbleself import tracing
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = tracing.Tracer()
+    with tracer.span("decode", seq=1):
+        pass
+    tracer.close()
+    assert not tracer.enabled
+    assert not tracer._events
+
+
+def test_tracer_writes_chrome_trace_events(tmp_path):
+    path = tmp_path / "trace.json"
+    tracer = tracing.Tracer(path=path, flush_interval=0.01)
+    barrier = threading.Barrier(2)
+
+    def work(name: str) -> None:
+        barrier.wait()
+        for seq in range(1, 4):
+            with tracer.span(name, seq=seq):
+                pass
+
+    threads = [
+        threading.Thread(target=work, args=(name,), name=f"{name}-thread")
+        for name in ("detection", "composition")
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    tracer.close()
+
+    events = json.loads(path.read_text())
+    spans = [e for e in events if e["ph"] == "X"]
+    assert len(spans) == 6
+    assert {e["name"] for e in spans} == {"detection", "composition"}
+    assert sorted(e["args"]["seq"] for e in spans) == [1, 1, 2, 2, 3, 3]
+    assert all(e["dur"] >= 0 for e in spans)
+
+    thread_names = {e["args"]["name"] for e in events if e["ph"] == "M"}
+    assert thread_names == {"detection-thread", "composition-thread"}
+    assert len({e["tid"] for e in spans}) == 2
+
+
+def test_prefixed_tracer_records_in_parent(tmp_path):
+    path = tmp_path / "trace.json"
+    tracer = tracing.Tracer(path=path)
+    inset = tracer.prefixed("inset2_")
+    with inset.span("detection", seq=1):
+        pass
+    # Only the owner of the trace finishes it
+    inset.close()
+    with tracer.span("detection", seq=1):
+        pass
+    tracer.close()
+
+    events = json.loads(path.read_text())
+    spans = [e["name"] for e in events if e["ph"] == "X"]
+    assert spans == ["inset2_detection", "detection"]
+    assert not tracing.Tracer().prefixed("inset2_").enabled
+
+
+def test_tracer_memory_is_bounded(tmp_path):
+    tracer = tracing.Tracer(path=tmp_path / "trace.json", max_events=10)
+    tracer._stop.set()  # Prevent flushing, to check the buffer
+    tracer._writer.join()  # type: ignore[union-attr]
+    for seq in range(100):
+        with tracer.span("grab", seq=seq):
+            pass
+    assert len(tracer._events) == 10
+    assert tracer._events[-1]["args"]["seq"] == 99
@@ -0,0 +1,61 @@
+import numpy as np
+
+from myhumbleself import tracking
+
+
+def test_iou():
+    boxes_a = np.array([[0, 0, 10, 10], [100, 100, 10, 10]])
+    boxes_b = np.array([[0, 5, 10, 10], [0, 0, 10, 10], [50, 50, 5, 5]])
+
+    overlaps = tracking.iou(boxes_a, boxes_b)
+
+    assert overlaps.shape == (2, 3)
+    assert overlaps[0].tolist() == [50 / 150, 1, 0]
+    assert overlaps[1].tolist() == [0, 0, 0]
+
+
+def test_union():
+    boxes = np.array([[10, 20, 30, 40], [0, 50, 100, 10]])
+    assert tracking.union(boxes).tolist() == [0, 20, 100, 40]
+
+
+def test_stabilize_ignores_fluctuations_and_follows_changes():
+    last = np.array([100, 100, 100, 100])
+    new = np.array([102, 150, 50, 100])
+
+    stabilized = tracking.stabilize(last, new, threshold_factor=0.03, speed_factor=0.2)
+
+    assert stabilized.tolist() == [100, 110, 90, 100]
+    assert tracking.stabilize(last, new, threshold_factor=0.03).tolist() == [
+        100,
+        150,
+        50,
+        100,
+    ]
+
+
+def test_tracks_follow_several_faces():
+    tracks = tracking.FaceTracks(smoothing=0.5, max_misses=1)
+    left_face = [100, 100, 50, 50]
+    right_face = [100, 300, 50, 50]
+
+    assert tracks.update(np.array([left_face, right_face])).tolist() == [
+        left_face,
+        right_face,
+    ]
+    # Detections in different order are matched to their tracks and smoothed
+    boxes = tracks.update(np.array([[100, 310, 50, 50], [110, 100, 50, 50]]))
+    assert boxes.tolist() == [[105, 100, 50, 50], [100, 305, 50, 50]]
+
+    # A new face starts a new track, a missed one is kept for max_misses updates
+    boxes = tracks.update(np.array([[110, 100, 50, 50], [400, 600, 50, 50]]))
+    assert len(boxes) == 3
+    boxes = tracks.update(np.array([[110, 100, 50, 50], [400, 600, 50, 50]]))
+    assert boxes[:, 1].tolist() == [100, 600]
+
+
+def test_tracks_without_detections():
+    tracks = tracking.FaceTracks(max_misses=0)
+    assert tracks.update(np.empty((0, 4))).shape == (0, 4)
+    tracks.update(np.array([[0, 0, 10, 10]]))
+    assert tracks.update(np.empty((0, 4))).shape == (0, 4)
@@ -0,0 +1,369 @@
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from myhumbleself import (
+    capture_modes,
+    governor,
+    latency,
+    sinks,
+    structures,
+    video_handler,
+)
+
+SHAPES_PATH = Path(__file__).parent.parent / "resources" / "shapes"
+
+
+@pytest.fixture()
+def handler():
+    handler = video_handler.VideoHandler(
+        cam_id=98,
+        shape_png_buffer=(SHAPES_PATH / "01-circle.png").read_bytes(),
+        zoom_factor=1,
+        offset_x=0,
+        offset_y=0,
+        follow_face=True,
+    )
+    yield handler
+    handler.stop()
+
+
+def test_pipeline_delivers_composed_frames(handler):
+    first_frame = handler.get_processed_frame()
+
+    deadline = time.perf_counter() + 5
+    frame = first_frame
+    while frame is first_frame and time.perf_counter() < deadline:
+        time.sleep(0.05)
+        frame = handler.get_processed_frame()
+
+    assert frame is not first_frame
+    assert frame.shape[2] == 4
+
+
+def test_stop_joins_stage_threads(handler):
+    threads = list(handler._stage_threads)
+    handler.stop()
+    assert threads
+    assert not any(t.is_alive() for t in threads)
+    assert handler._camera.video_thread is None
+
+
+def test_interpolate_mask_area(handler):
+    image_size_hw = (1080, 1920)
+    start = structures.Rect(top=100, left=100, height=400, width=400)
+    target = structures.Rect(top=300, left=500, height=600, width=600)
+
+    # Jumps to the first area
+    assert handler._interpolate_mask_area(start, image_size_hw, elapsed=0) == start
+
+    # Moves towards the target, but doesn't reach it yet
+    step = handler._interpolate_mask_area(target, image_size_hw, elapsed=0.01)
+    assert start.left < step.left < target.left
+    assert start.width < step.width < target.width
+
+    # Eventually reaches the target
+    assert handler._interpolate_mask_area(target, image_size_hw, elapsed=5) == target
+
+
+def test_interpolate_mask_area_jumps_on_shape_change(handler):
+    image_size_hw = (1080, 1920)
+    square = structures.Rect(top=100, left=100, height=400, width=400)
+    wide = structures.Rect(top=100, left=100, height=400, width=800)
+
+    handler._interpolate_mask_area(square, image_size_hw, elapsed=0)
+    assert handler._interpolate_mask_area(wide, image_size_hw, elapsed=0.01) == wide
+
+
+def test_set_capture_fps_limits_decoded_frames(handler):
+    handler.set_capture_fps(5)
+    start_seq = handler._camera.frame_seq
+    time.sleep(1)
+    assert handler._camera.frame_seq - start_seq <= 6
+
+
+def _wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_release_and_resume_camera_in_background(handler, monkeypatch):
+    camera = handler._camera
+    start = camera.start
+
+    def slow_start(cam_id):
+        time.sleep(0.5)
+        start(cam_id)
+
+    monkeypatch.setattr(camera, "start", slow_start)
+
+    handler.release_camera()
+    assert _wait_for(lambda: camera.video_thread is None)
+    last_frame = handler.get_processed_frame()
+
+    before = time.perf_counter()
+    handler.resume_camera()
+    # Doesn't block the caller, e.g. the GTK main loop, while the camera opens
+    assert time.perf_counter() - before < 0.1
+    assert handler.get_processed_frame() is last_frame
+    assert _wait_for(lambda: camera.video_thread is not None)
+
+    # A release while resuming is applied afterwards
+    handler.release_camera()
+    handler.resume_camera()
+    handler.release_camera()
+    assert _wait_for(lambda: camera.video_thread is None)
+    time.sleep(0.6)
+    assert camera.video_thread is None
+
+
+def test_block_policy_keeps_composing_without_reader():
+    handler = video_handler.VideoHandler(
+        cam_id=98,
+        shape_png_buffer=(SHAPES_PATH / "01-circle.png").read_bytes(),
+        zoom_factor=1,
+        offset_x=0,
+        offset_y=0,
+        follow_face=False,
+        drop_policy=structures.DropPolicy.BLOCK,
+    )
+    composition_seconds = handler.metrics.histogram("composition_seconds")
+    try:
+        # Nobody calls get_processed_frame(), so the composed frames queue fills up
+        assert _wait_for(lambda: composition_seconds.count >= 3)
+        count = composition_seconds.count
+        assert _wait_for(lambda: composition_seconds.count > count)
+        assert handler._composed_frames.dropped > 0
+    finally:
+        handler.stop()
+
+
+def test_apply_quality_level_limits_output_width(handler):
+    level = governor.QUALITY_LEVELS[-1]
+    handler.apply_quality_level(level)
+
+    deadline = time.perf_counter() + 5
+    frame = handler.get_processed_frame()
+    while frame.shape[1] != level.max_output_width and time.perf_counter() < deadline:
+        time.sleep(0.05)
+        frame = handler.get_processed_frame()
+
+    assert frame.shape[1] == level.max_output_width
+    assert handler.detect_every_n_frames == level.detect_every_n_frames
+    assert handler._face_detection.detection_width == level.detection_width
+
+
+def test_capture_mode_follows_required_resolution(handler):
+    handler.stop()  # Avoid interference of the composition stage
+    modes = [
+        capture_modes.CaptureMode(1280, 720, 30, "MJPG"),
+        capture_modes.CaptureMode(640, 360, 30, "MJPG"),
+    ]
+    handler._camera._modes[handler._camera.cam_id] = modes
+    handler._mode_selector = capture_modes.ModeSelector(modes, downgrade_delay=0)
+    handler.MODE_UPDATE_INTERVAL = 0
+    mask_area = structures.Rect(top=0, left=0, width=1280, height=720)
+
+    # Displayed at full size, all pixels are needed
+    handler.set_output_size(1280, 720)
+    assert handler._get_required_capture_size(mask_area) == (1280, 720)
+
+    # Displayed small, a lower mode suffices
+    handler.set_output_size(400, 400)
+    assert handler._get_required_capture_size(mask_area) == (400, 225)
+    handler._update_capture_mode(mask_area)
+    assert handler._camera.capture_mode == modes[1]
+
+    # Zoomed in, the mask area needs to be magnified again
+    mask_area = structures.Rect(top=200, left=400, width=400, height=400)
+    assert handler._get_required_capture_size(mask_area) == (1280, 720)
+
+
+def test_composed_frames_carry_capture_timestamp():
+    handler = video_handler.VideoHandler(
+        cam_id=98,
+        shape_png_buffer=(SHAPES_PATH / "99-aspect-16-9.png").read_bytes(),
+        zoom_factor=10,
+        offset_x=0,
+        offset_y=0,
+        follow_face=False,
+        stamp_frames=True,
+    )
+    try:
+        deadline = time.perf_counter() + 5
+        while handler.last_composed_seq < 5 and time.perf_counter() < deadline:
+            time.sleep(0.05)
+            image = handler.get_processed_frame()
+            displayed = time.monotonic()
+    finally:
+        handler.stop()
+
+    assert latency.read_frame_counter(image) == handler.last_composed_seq
+    assert 0 < displayed - handler.last_composed_timestamp < 1
+
+
+def test_insets_are_composited_with_shared_detection(handler):
+    inset = handler.add_inset(
+        cam_id=98,
+        shape_png_buffer=(SHAPES_PATH / "03-square.png").read_bytes(),
+        center=(0.2, 0.2),
+        width=0.4,
+    )
+    assert handler._detection_batcher is not None
+    assert handler._face_detection._batcher is handler._detection_batcher
+    assert inset._face_detection._batcher is handler._detection_batcher
+    assert inset.available_cameras.keys() == handler.available_cameras.keys()
+
+    def inset_visible(image):
+        # The square inset is drawn into the corner, which the circle leaves empty
+        corner = round(image.shape[0] * 0.05)
+        return image.shape[0] > 1 and image[corner, corner, 3] == 255
+
+    deadline = time.perf_counter() + 5
+    image = handler.get_processed_frame()
+    while not inset_visible(image) and time.perf_counter() < deadline:
+        time.sleep(0.05)
+        handler.request_render()
+        image = handler.get_processed_frame()
+
+    assert inset_visible(image)
+    assert inset.inset_width == round(image.shape[1] * 0.4)
+    # The inset's pipeline reports to the same registry, under its own names
+    histograms = handler.metrics.snapshot()["histograms"]
+    assert histograms["inset1_composition_seconds"]["count"] > 0
+    assert histograms["composition_seconds"]["count"] > 0
+
+    handler.stop()
+    assert inset._stop_pipeline.is_set()
+    assert not handler._detection_batcher._thread.is_alive()
+
+
+def _reference_mask_area(handler, face_area, image_size_hw, shape_size_hw):
+    """Former per-Rect implementation of the focus & mask area."""
+    focus_area = face_area.copy()
+    focus_area.scale(handler.zoom_factor)
+    padding = int(max(face_area.width, face_area.height) / 1.5 * handler.zoom_factor)
+    focus_area.pad(padding=padding)
+    focus_area.move_by(x=handler.offset_x, y=handler.offset_y)
+
+    mask_area = focus_area.copy()
+    aspect_ratio = shape_size_hw[1] / shape_size_hw[0]
+    if mask_area.width / mask_area.height < aspect_ratio:
+        new_width = int(mask_area.height * aspect_ratio)
+        mask_area.left -= (new_width - mask_area.width) // 2
+        mask_area.width = new_width
+    else:
+        new_height = int(mask_area.width / aspect_ratio)
+        mask_area.top -= (new_height - mask_area.height) // 2
+        mask_area.height = new_height
+    mask_area.stay_within(height=image_size_hw[0], width=image_size_hw[1])
+    return focus_area, mask_area
+
+
+@pytest.mark.parametrize("zoom_factor", [0.3, 1, 1.7, 5])
+@pytest.mark.parametrize("offset", [(0, 0), (-45, 130)])
+@pytest.mark.parametrize(
+    "geometry", [(200, 500, 250, 250), (10, 1000, 271, 373), (600, 3, 95, 60)]
+)
+def test_mask_area_matches_reference_geometry(handler, zoom_factor, offset, geometry):
+    handler.set_view(zoom_factor=zoom_factor, offset_x=offset[0], offset_y=offset[1])
+    top, left, height, width = geometry
+    face_area = structures.Rect(top=top, left=left, height=height, width=width)
+
+    for shape_size_hw in [(1080, 1080), (1080, 1920), (1080, 600)]:
+        handler._shape_mask = np.zeros(shape_size_hw, dtype=np.uint8)
+        mask_area = handler._get_target_mask_area(
+            np.array([geometry]), image_size_hw=(720, 1280)
+        )
+        expected_focus, expected_mask = _reference_mask_area(
+            handler, face_area, (720, 1280), shape_size_hw
+        )
+        assert handler._focus_area == expected_focus
+        assert mask_area == expected_mask
+
+    # Several faces are transformed at once, the same way as single ones
+    face_areas = np.array([geometry, [300, 800, 100, 100]])
+    focus_areas = handler._get_focus_areas(face_areas, zoom_factor=zoom_factor)
+    assert list(focus_areas) == [
+        handler._get_focus_area(structures.Rect.from_geometry(f), zoom_factor)
+        for f in face_areas
+    ]
+
+
+def test_group_framing_covers_all_faces(handler):
+    left_face, right_face = [300, 100, 100, 100], [300, 800, 100, 100]
+    handler._shape_mask = np.zeros((1080, 1920), dtype=np.uint8)
+    handler.set_group_framing(True)
+    assert handler._face_detection.group_framing
+
+    mask_area = handler._get_target_mask_area(
+        np.array([left_face, right_face]), image_size_hw=(720, 1280)
+    )
+    assert mask_area.left <= 100
+    assert mask_area.right >= 900
+
+    # Small movements of single faces don't change the group's framing
+    moved = handler._get_target_mask_area(
+        np.array([left_face, [305, 810, 100, 100]]), image_size_hw=(720, 1280)
+    )
+    assert moved == mask_area
+
+
+def test_group_framing_is_kept_when_adding_insets(handler):
+    handler.set_group_framing(True)
+    handler.add_inset(
+        cam_id=98, shape_png_buffer=(SHAPES_PATH / "03-square.png").read_bytes()
+    )
+
+    # The main camera now uses the shared detection, which needs the same settings
+    assert handler._face_detection._batcher is handler._detection_batcher
+    assert handler._face_detection.group_framing
+
+
+def test_render_frame_without_camera():
+    handler = video_handler.VideoHandler(
+        cam_id=None,
+        shape_png_buffer=(SHAPES_PATH / "01-circle.png").read_bytes(),
+        zoom_factor=1,
+        offset_x=0,
+        offset_y=0,
+        follow_face=False,
+    )
+    try:
+        assert not handler._stage_threads
+        assert handler._camera.available_cameras == {}
+
+        frame = np.zeros((360, 640, 3), dtype=np.uint8)
+        image = handler.render_frame(frame, elapsed=1 / 30)
+        assert handler._frame_size_hw == (360, 640)
+        assert image.shape[2] == 4
+        assert image.shape[0] == image.shape[1] <= 360
+    finally:
+        handler.stop()
+
+
+def test_sinks_receive_composed_frames(handler):
+    class CollectingSink(sinks.QueuedSink):
+        def __init__(self):
+            super().__init__(name="collecting")
+            self.frames = []
+
+        def _process(self, frame, put_at):
+            self.frames.append(frame)
+
+    sink = CollectingSink()
+    handler.add_sink(sink)
+
+    deadline = time.perf_counter() + 5
+    while len(sink.frames) < 3 and time.perf_counter() < deadline:
+        handler.request_render()
+        time.sleep(0.02)
+    handler.stop()
+
+    assert len(sink.frames) >= 3
+    assert sink.frames[-1].image.shape[2] == 4
+    assert sink._thread is None